@@ -0,0 +1,182 @@
+"""
+Adaptive batching of notes for refine's apply step.
+
+An apply call regenerates the full op .md and global.md, so its output is
+roughly current docs + what the notes add. Batches are sized against the apply
+model's output budget instead of a fixed count:
+
+  - budget:     flush before a note would push the estimated output
+                (docs + notes, JSON-escaped) past FILL of max_tokens
+  - coalescing: note items (bullets / paragraphs / fenced blocks) already in the
+                batch, verbatim or near-identical (difflib ratio >= SIMILARITY),
+                are dropped, so a finding repeated by ten pairs is sent once
+  - op-local:   a batch whose items touch only the op's own schema (no $defs,
+                enums, $ref, global conventions) flushes as soon as pairs stop
+                adding new items (SATURATION notes in a row), so later notes
+                steps see the fix instead of re-raising it; batches touching
+                global.md keep accumulating evidence until the budget or op end
+
+A fixed size (refine --batch-size N) flushes at N notes instead (budget and
+coalescing still apply). A batch whose apply output is truncated even after the
+model cascade is split() in half and each half applied on its own.
+"""
+
+import difflib
+import json
+import re
+
+FILL = 0.75
+SIMILARITY = 0.9
+SATURATION = 2
+MAX_NOTES = 20
+
+_BULLET_RE = re.compile(r"^\s{0,3}(?:[-*•]|\d+[.)])\s+")
+_NORM_STRIP_RE = re.compile(r"^[\s\-*•\d.)]+|[\s.;:,]+$")
+_GLOBAL_RE = re.compile(r"\$defs|\$ref|global|enum|AspDate|convention", re.IGNORECASE)
+
+
+def _estimate_tokens(s: str) -> int:
+    # Same heuristic as refine._estimate_tokens (~3 chars per token).
+    return max(1, len(s) // 3)
+
+
+def split_items(notes: str) -> list[str]:
+    """Split notes into items: bullets/paragraphs with their continuation lines; fences stay whole."""
+    items: list[list[str]] = []
+    cur: list[str] = []
+    in_fence = False
+    for line in notes.strip().splitlines():
+        stripped = line.strip()
+        if in_fence:
+            cur.append(line)
+            in_fence = not stripped.startswith("```")
+            continue
+        if stripped.startswith("```"):
+            cur.append(line)  # a fence belongs to the item that introduces it
+            in_fence = True
+        elif not stripped:
+            if cur:
+                items.append(cur)
+                cur = []
+        else:
+            if _BULLET_RE.match(line) and cur:
+                items.append(cur)
+                cur = []
+            cur.append(line)
+    if cur:
+        items.append(cur)
+    return ["\n".join(lines) for lines in items]
+
+
+def _norm(item: str) -> str:
+    return " ".join(_NORM_STRIP_RE.sub("", item.lower()).split())
+
+
+def item_norms(notes: str) -> list[str]:
+    """Normalized items of notes, as novel_items() compares them."""
+    return [n for n in map(_norm, split_items(notes)) if n]
+
+
+def novel_items(notes: str, norms: list[str]) -> tuple[list[str], int]:
+    """Items of notes not in norms, verbatim or near-identical, and the number dropped.
+
+    norms (normalized items) is extended with the kept ones.
+    """
+    kept, dropped = [], 0
+    for item in split_items(notes):
+        n = _norm(item)
+        if not n:
+            continue
+        dup = n in norms or any(
+            difflib.SequenceMatcher(None, n, o).quick_ratio() >= SIMILARITY
+            and difflib.SequenceMatcher(None, n, o).ratio() >= SIMILARITY
+            for o in norms
+        )
+        if dup:
+            dropped += 1
+        else:
+            kept.append(item)
+            norms.append(n)
+    return kept, dropped
+
+
+def is_global(item: str) -> bool:
+    """True if the item touches global.md ($defs, enums, $ref targets, conventions)."""
+    return bool(_GLOBAL_RE.search(item))
+
+
+class ApplyBatcher:
+    """Notes pending apply for one operation."""
+
+    def __init__(self, max_tokens: int, fixed_size: int | None = None):
+        self.max_tokens = max_tokens
+        self.fixed_size = fixed_size
+        self.clear()
+
+    def clear(self):
+        self.keys: list[str] = []
+        self.items: list[list[str]] = []  # kept items per note
+        self.texts: list[str] = []  # note text to send (original unless items were dropped)
+        self._norms: list[str] = []
+        self.dropped = 0
+        self.dup_streak = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _kept(self, notes: str) -> tuple[list[str], int]:
+        return novel_items(notes, list(self._norms))
+
+    def estimate_output(self, op_md: str, global_md: str, extra: list[str] = ()) -> int:
+        """Estimated apply output tokens: both docs plus every kept item, as JSON strings."""
+        text = op_md + global_md + "\n".join(i for note in self.items for i in note) + "\n".join(extra)
+        return _estimate_tokens(json.dumps(text, ensure_ascii=False))
+
+    def would_overflow(self, notes: str, op_md: str, global_md: str) -> bool:
+        """True if adding `notes` to a non-empty batch would exceed the output budget."""
+        if not self.keys:
+            return False
+        kept, _ = self._kept(notes)
+        return self.estimate_output(op_md, global_md, kept) > self.max_tokens * FILL
+
+    def add(self, key: str, notes: str):
+        kept, dropped = self._kept(notes)
+        self.keys.append(key)
+        self.items.append(kept)
+        self.texts.append(notes if not dropped else "\n".join(kept))
+        self._norms.extend(_norm(i) for i in kept)
+        self.dropped += dropped
+        self.dup_streak = 0 if kept else self.dup_streak + 1
+
+    def split(self) -> tuple["ApplyBatcher", "ApplyBatcher"]:
+        """Two batchers with the first and second half of the notes (kept items as coalesced)."""
+        mid = len(self.keys) // 2
+        halves = []
+        for part in (slice(None, mid), slice(mid, None)):
+            b = ApplyBatcher(self.max_tokens, fixed_size=self.fixed_size)
+            b.keys, b.items, b.texts = self.keys[part], self.items[part], self.texts[part]
+            b._norms = [_norm(i) for note in b.items for i in note]
+            halves.append(b)
+        return halves[0], halves[1]
+
+    def op_local(self) -> bool:
+        return not any(is_global(i) for note in self.items for i in note)
+
+    def flush_reason(self, op_md: str, global_md: str) -> str | None:
+        """Why the batch should be applied now (None = keep accumulating)."""
+        if not self.keys:
+            return None
+        if self.estimate_output(op_md, global_md) > self.max_tokens * FILL:
+            return "budget"
+        if self.fixed_size:
+            return "size" if len(self.keys) >= self.fixed_size else None
+        if len(self.keys) >= MAX_NOTES:
+            return "max notes"
+        if self.dup_streak >= SATURATION and self.op_local():
+            return "op-local, saturated"
+        return None
+
+    def render(self) -> str:
+        """Notes text for the apply prompt (notes whose items were all duplicates are omitted)."""
+        notes = [t for t, items in zip(self.texts, self.items) if items]
+        return "\n\n".join(f"### Note {j+1}\n{n}" for j, n in enumerate(notes))
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for collect and refine.
+
+Runs against a local corpus (collected/) without touching www.sobranie.mk or the
+Anthropic API: collect talks to mock_api.py on a free local port, refine uses the
+fake LLM backend (LLM_BACKEND=fake). All writes go to a temp directory.
+
+Scenarios:
+  collect     End-to-end collect.py against the replay server (requests/s).
+  refine      End-to-end refine.py with the fake LLM (pairs/s, applies).
+  truncation  _truncate_values + _fit_response_to_budget over corpus responses.
+  cache       API response cache and LLM cache write/read round trips.
+  json        Decode and pretty encode of the largest corpus files: stdlib json vs
+              jsonio (orjson when installed), outputs checked identical.
+  startup     Fresh-interpreter wall time of short commands (sobranie.py --help,
+              collect/refine --help, cache stats, report) and of importing each
+              entry module, against STARTUP_BUDGET_MS / IMPORT_BUDGET_MS.
+
+Results are written to logs/bench/<run_id>.json. Pass --compare <file> to diff
+against an earlier result; exits 1 when a metric regresses beyond --tolerance.
+
+Usage:
+  python scripts/bench.py
+  python scripts/bench.py --scenario truncation --scenario cache
+  python scripts/bench.py --scenario json --max-files 20
+  python scripts/bench.py --scenario startup --repeat 5
+  python scripts/bench.py --latency-ms 20 --error-rate 0.05
+  python scripts/bench.py --compare logs/bench/2026-02-10_09-00-00.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "scripts"))
+
+COLLECTED = ROOT / "collected"
+ERRORS = ROOT / "errors"
+DOCS = ROOT / "docs"
+CONFIG = ROOT / "config"
+LOGS = ROOT / "logs" / "bench"
+
+SCENARIOS = ("collect", "refine", "truncation", "cache", "json", "startup")
+
+# Wall-clock budgets in ms, interpreter start included (a bare `python -c pass` is
+# reported as python_ms). Over-budget entries are listed in the startup result.
+STARTUP_BUDGET_MS = {"help": 300, "collect_help": 400, "refine_help": 400, "cache_stats": 300, "report": 500}
+STARTUP_COMMANDS = {
+    "help": ["--help"],
+    "collect_help": ["collect", "--help"],
+    "refine_help": ["refine", "--help"],
+    "cache_stats": ["cache", "stats"],
+    "report": ["report"],
+}
+# Module import time alone (in a fresh interpreter, after site).
+IMPORT_BUDGET_MS = {"sobranie": 20, "collect": 100, "refine": 150, "build_client": 50}
+
+
+# --- Helpers ---
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def _timing_stats(samples_s: list[float], prefix: str) -> dict:
+    ms = [s * 1000.0 for s in samples_s]
+    return {
+        f"{prefix}_mean_ms": round(statistics.fmean(ms), 4) if ms else 0.0,
+        f"{prefix}_p95_ms": round(_percentile(ms, 95), 4),
+        f"{prefix}_max_ms": round(max(ms), 4) if ms else 0.0,
+    }
+
+
+def _corpus_responses(corpus: Path, limit: int | None = None) -> list[Path]:
+    """Response files, largest first (the interesting end for truncation and I/O)."""
+    files = [p for p in corpus.glob("*/resp_*.json")]
+    files.sort(key=lambda p: p.stat().st_size, reverse=True)
+    return files[:limit] if limit else files
+
+
+@contextlib.contextmanager
+def _quiet(enabled: bool):
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def _patched(module, **attrs):
+    """Temporarily point module-level path constants at benchmark locations."""
+    old = {k: getattr(module, k) for k in attrs}
+    for k, v in attrs.items():
+        setattr(module, k, v)
+    try:
+        yield
+    finally:
+        for k, v in old.items():
+            setattr(module, k, v)
+
+
+@contextlib.contextmanager
+def _env(**values):
+    old = {k: os.environ.get(k) for k in values}
+    os.environ.update({k: str(v) for k, v in values.items()})
+    try:
+        yield
+    finally:
+        for k, v in old.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+# --- Scenarios ---
+
+
+def bench_collect(args, work: Path) -> dict:
+    import collect
+    import mock_api
+
+    corpus = mock_api.load_corpus(args.corpus, args.errors)
+    if not corpus["ops"]:
+        return {"skipped": f"no pairs in {args.corpus}"}
+    server = mock_api.make_server(
+        corpus, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, seed=args.seed,
+    )
+    base_url = mock_api.serve_in_thread(server)
+    out = work / "collect"
+    argv = ["--no-cache", "--base-url", base_url, "--delay", "0"]
+    if args.pipeline:
+        argv += ["--pipeline", args.pipeline]
+    try:
+        with _patched(collect, COLLECTED=out / "collected", ERRORS=out / "errors", LOGS=out / "logs"), \
+                _quiet(not args.verbose):
+            t0 = time.perf_counter()
+            rc = collect.main(argv)
+            elapsed = time.perf_counter() - t0
+    finally:
+        server.shutdown()
+        server.server_close()
+    sent = len(list((out / "collected").glob("*/req_*.json")))
+    pairs = len(list((out / "collected").glob("*/resp_*.json")))
+    return {
+        "exit_code": rc,
+        "elapsed_s": round(elapsed, 4),
+        "requests": sent,
+        "pairs": pairs,
+        "requests_per_s": round(sent / elapsed, 3) if elapsed > 0 else 0.0,
+        "server": dict(server.stats),
+    }
+
+
+def bench_refine(args, work: Path) -> dict:
+    import build_api_md
+    import doc_history
+    import refine
+
+    if not (args.corpus / "manifest.json").exists():
+        return {"skipped": f"no manifest.json in {args.corpus}"}
+    docs = work / "refine" / "docs"
+    shutil.copytree(DOCS, docs)
+    logs = work / "refine" / "logs"
+    # Real-API rate/cost limits would only throttle the fake backend.
+    config = work / "refine" / "config"
+    config.mkdir(parents=True)
+    cfg = json.loads((CONFIG / "refine.json").read_text(encoding="utf-8"))
+    cfg.pop("limits", None)
+    (config / "refine.json").write_text(json.dumps(cfg), encoding="utf-8")
+    argv = ["--no-llm-cache", "--collect-run", "all", "--resume", "bench"]
+    if args.refine_limit:
+        argv += ["--limit", str(args.refine_limit)]
+    if args.local_notes:
+        argv += ["--local-notes", args.local_notes]
+    with _patched(refine, DOCS=docs, GLOBAL_MD=docs / "global.md", OPS_DIR=docs / "ops",
+                  COLLECTED=args.corpus, LOGS=logs, LLM_CACHE_DIR=work / "refine" / "llm_cache",
+                  CONFIG=config), \
+            _patched(build_api_md, DOCS=docs, GLOBAL_MD=docs / "global.md",
+                     OPS_DIR=docs / "ops", API_MD=docs / "API.md"), \
+            _env(LLM_BACKEND="fake", FAKE_LLM_LATENCY_MS=args.llm_latency_ms,
+                 FAKE_LLM_CHANGE_RATE=args.llm_change_rate), \
+            _quiet(not args.verbose):
+        t0 = time.perf_counter()
+        rc = refine.main(argv)
+        elapsed = time.perf_counter() - t0
+    state = refine.load_state(logs / "bench" / "state.json")
+    done = len(state.get("processed", []))
+    history = doc_history.History(logs / "history.sqlite")
+    applies = history.count("bench", "apply")
+    local_applies = history.count("bench", "local")
+    history.close()
+    return {
+        "exit_code": rc,
+        "elapsed_s": round(elapsed, 4),
+        "pairs": done,
+        "applies": applies,
+        "local_applies": local_applies,
+        "pairs_per_s": round(done / elapsed, 3) if elapsed > 0 else 0.0,
+    }
+
+
+def bench_truncation(args, work: Path) -> dict:
+    import refine
+
+    files = _corpus_responses(args.corpus, args.max_files)
+    if not files:
+        return {"skipped": f"no responses in {args.corpus}"}
+    budget = args.budget_tokens
+    samples: list[float] = []
+    total_in = 0
+    total_out = 0
+    for path in files:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        total_in += path.stat().st_size
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            truncated = refine._fit_response_to_budget(refine._truncate_values(data), budget)
+            samples.append(time.perf_counter() - t0)
+        total_out += len(json.dumps(truncated, ensure_ascii=False, indent=2).encode("utf-8"))
+    return {
+        "files": len(files),
+        "budget_tokens": budget,
+        "input_bytes": total_in,
+        "output_bytes": total_out,
+        "calls": len(samples),
+        "calls_per_s": round(len(samples) / sum(samples), 3) if sum(samples) > 0 else 0.0,
+        **_timing_stats(samples, "fit"),
+    }
+
+
+def bench_cache(args, work: Path) -> dict:
+    import cache
+    import refine
+
+    files = _corpus_responses(args.corpus, args.max_files)
+    if not files:
+        return {"skipped": f"no responses in {args.corpus}"}
+    payloads = [json.loads(p.read_text(encoding="utf-8")) for p in files]
+    url = "http://bench.local/Routing/MakePostRequest"
+    result: dict = {"entries": len(payloads)}
+
+    with _patched(cache, CACHE_DIR=work / "api_cache"):
+        sets, gets = [], []
+        for i, resp in enumerate(payloads):
+            body = {"methodName": "Bench", "n": i}
+            t0 = time.perf_counter()
+            cache.set_(url, body, resp)
+            sets.append(time.perf_counter() - t0)
+        for i in range(len(payloads)):
+            body = {"methodName": "Bench", "n": i}
+            t0 = time.perf_counter()
+            cache.get(url, body)
+            gets.append(time.perf_counter() - t0)
+    result.update(_timing_stats(sets, "api_set"))
+    result.update(_timing_stats(gets, "api_get"))
+
+    llm_dir = work / "llm_cache"
+    llm_dir.mkdir(parents=True, exist_ok=True)
+    sets, gets = [], []
+    for i, resp in enumerate(payloads):
+        fake_result = {"notes": json.dumps(resp, ensure_ascii=False)[:4000]}
+        cache_file = llm_dir / f"{i:06d}.json"
+        t0 = time.perf_counter()
+        refine._write_llm_cache(cache_file, fake_result, model="bench", max_tokens=4096)
+        sets.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        refine._read_llm_cache(cache_file, model="bench", max_tokens=4096)
+        gets.append(time.perf_counter() - t0)
+    result.update(_timing_stats(sets, "llm_set"))
+    result.update(_timing_stats(gets, "llm_get"))
+    result["disk_bytes"] = sum(p.stat().st_size for p in work.rglob("*.json"))
+    return result
+
+
+def bench_json(args, work: Path) -> dict:
+    import jsonio
+
+    files = _corpus_responses(args.corpus, args.max_files)
+    if not files:
+        return {"skipped": f"no responses in {args.corpus}"}
+    raw = [p.read_bytes() for p in files]
+    stdlib = {"decode": [], "encode": []}
+    fast = {"decode": [], "encode": []}
+    identical = True
+    for data in raw:
+        for _ in range(max(1, args.repeat)):
+            t0 = time.perf_counter()
+            expected = json.loads(data)
+            t1 = time.perf_counter()
+            got = jsonio.loads(data)
+            t2 = time.perf_counter()
+            stdlib["decode"].append(t1 - t0)
+            fast["decode"].append(t2 - t1)
+
+            t0 = time.perf_counter()
+            text = json.dumps(expected, ensure_ascii=False, indent=2)
+            t1 = time.perf_counter()
+            fast_text = jsonio.dumps(got)
+            t2 = time.perf_counter()
+            stdlib["encode"].append(t1 - t0)
+            fast["encode"].append(t2 - t1)
+            identical = identical and got == expected and fast_text == text
+    result: dict = {"backend": jsonio.BACKEND, "files": len(raw), "bytes": sum(len(d) for d in raw),
+                    "identical": identical}
+    for op in stdlib:
+        result.update(_timing_stats(stdlib[op], f"stdlib_{op}"))
+        result.update(_timing_stats(fast[op], f"jsonio_{op}"))
+        base = sum(stdlib[op])
+        result[f"{op}_speedup"] = round(base / sum(fast[op]), 2) if sum(fast[op]) > 0 else 0.0
+    if not identical:
+        print("  jsonio output differs from stdlib json")
+    return result
+
+
+def bench_startup(args, work: Path) -> dict:
+    scripts = ROOT / "scripts"
+
+    def wall_ms(cmd: list[str]) -> float:
+        samples = []
+        for _ in range(max(1, args.repeat)):
+            t0 = time.perf_counter()
+            subprocess.run(cmd, cwd=work, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            samples.append((time.perf_counter() - t0) * 1000.0)
+        return round(statistics.median(samples), 1)
+
+    def import_ms(module: str) -> float:
+        code = (f"import sys, time; sys.path.insert(0, {str(scripts)!r}); t = time.perf_counter(); "
+                f"import {module}; print((time.perf_counter() - t) * 1000)")
+        samples = []
+        for _ in range(max(1, args.repeat)):
+            out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+            samples.append(float(out.stdout.strip() or "nan"))
+        return round(statistics.median(samples), 2)
+
+    result: dict = {"python_ms": wall_ms([sys.executable, "-c", "pass"])}
+    over = []
+    for name, argv in STARTUP_COMMANDS.items():
+        ms = result[f"{name}_ms"] = wall_ms([sys.executable, str(scripts / "sobranie.py"), *argv])
+        if ms > STARTUP_BUDGET_MS[name]:
+            over.append(f"{name} {ms}ms > {STARTUP_BUDGET_MS[name]}ms")
+    for module, budget in IMPORT_BUDGET_MS.items():
+        ms = result[f"import_{module}_ms"] = import_ms(module)
+        if not ms <= budget:
+            over.append(f"import {module} {ms}ms > {budget}ms")
+    if over:
+        print("  over budget: " + "; ".join(over))
+    result["over_budget"] = over
+    return result
+
+
+BENCHES = {
+    "collect": bench_collect,
+    "refine": bench_refine,
+    "truncation": bench_truncation,
+    "cache": bench_cache,
+    "json": bench_json,
+    "startup": bench_startup,
+}
+
+
+# --- Comparison ---
+
+
+def _lower_is_better(metric: str) -> bool | None:
+    if metric.endswith("_per_s"):
+        return False
+    if metric.endswith("_ms") or metric.endswith("_s"):
+        return True
+    return None
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return human-readable regression lines (empty when nothing regressed)."""
+    regressions = []
+    for name, metrics in current.get("scenarios", {}).items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not isinstance(base, dict) or not isinstance(metrics, dict):
+            continue
+        for metric, value in metrics.items():
+            direction = _lower_is_better(metric)
+            old = base.get(metric)
+            if direction is None or not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old <= 0:
+                continue
+            change = (value - old) / old
+            worse = change > tolerance if direction else change < -tolerance
+            line = f"{name}.{metric}: {old} -> {value} ({change:+.1%})"
+            print(("  REGRESSION " if worse else "  ") + line)
+            if worse:
+                regressions.append(line)
+    return regressions
+
+
+# --- Main ---
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for collect and refine.")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="Scenario to run (repeatable; default all)")
+    parser.add_argument("--corpus", type=Path, default=COLLECTED, help="Collected pairs directory")
+    parser.add_argument("--errors", type=Path, default=ERRORS, help="Recorded errors directory")
+    parser.add_argument("--pipeline", default=None, help="collect: run only this pipeline")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="collect: mock server latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="collect: mock server latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="collect: injected error fraction")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="refine: fake LLM latency per call")
+    parser.add_argument("--llm-change-rate", type=float, default=0.5,
+                        help="refine: fraction of pairs for which the fake LLM returns notes")
+    parser.add_argument("--local-notes", choices=("off", "replace", "hint"), default=None,
+                        help="refine: local schema diff mode (default: config)")
+    parser.add_argument("--refine-limit", type=int, default=None, help="refine: at most N pairs")
+    parser.add_argument("--budget-tokens", type=int, default=10_000, help="truncation: response budget")
+    parser.add_argument("--max-files", type=int, default=50, help="truncation/cache/json: largest N responses")
+    parser.add_argument("--repeat", type=int, default=3, help="truncation/json: repetitions per file; startup: runs per command")
+    parser.add_argument("--out", type=Path, default=None, help="Result file (default logs/bench/<run_id>.json)")
+    parser.add_argument("--compare", type=Path, default=None, help="Earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression")
+    parser.add_argument("--verbose", action="store_true", help="Show collect/refine output")
+    args = parser.parse_args(argv)
+
+    run_id = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    scenarios = args.scenario or list(SCENARIOS)
+    results = {
+        "run_id": run_id,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": str(args.corpus),
+        "scenarios": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="sobranie-bench-") as tmp:
+        for name in scenarios:
+            work = Path(tmp) / name
+            work.mkdir(parents=True, exist_ok=True)
+            print(f"[{name}] running...")
+            metrics = BENCHES[name](args, work)
+            results["scenarios"][name] = metrics
+            summary = ", ".join(f"{k}={v}" for k, v in metrics.items() if not isinstance(v, dict))
+            print(f"[{name}] {summary}")
+
+    out = args.out or (LOGS / f"{run_id}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Results: {out}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        print(f"Compare with {args.compare}:")
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Generate a typed Python client (client/sobranie_client.py) from docs/ops/*.md
+Request/Response Schemas and docs/global.md $defs.
+
+The generated module is self-contained (runtime from client_runtime.py, needs
+only `requests`):
+  - one async method per operation, keyword arguments in snake_case; the method
+    knows its methodName/MethodName key and casing, ASMX {"model": ...} wrapping
+    and "d" unwrapping, and its endpoint (global.md "Non-standard" table)
+  - responses decoded into __slots__ dataclasses (nested objects and array items
+    get their own classes), $defs enums as IntEnum / str Enum, AspDate values
+    parsed lazily; strict mode raises ValidationError on documented-type mismatches
+  - iter_<op>() async iterators for listing ops with Page/Rows, page/rows or
+    CurrentPage/ItemsPerPage plus a Total* count
+  - Client.batch() for concurrent calls over one pooled session; cache=
+    scripts/cache.py (or any get/set_ object) reuses collect's response cache
+
+    import asyncio, cache
+    from sobranie_client import Client
+    async def main():
+        async with Client(cache=cache) as api:
+            async for s in api.iter_get_all_sittings(language_id=1, page_size=50, max_pages=2):
+                print(s.id, s.sitting_date.datetime, s.status_id)
+
+Run after refine updates: python scripts/build_client.py [--out client/sobranie_client.py]
+"""
+
+import argparse
+import keyword
+import os
+import re
+from pathlib import Path
+
+import schema_diff
+
+ROOT = Path(__file__).parent.parent
+DOCS = ROOT / "docs"
+GLOBAL_MD = DOCS / "global.md"
+OPS_DIR = DOCS / "ops"
+RUNTIME = Path(__file__).parent / "client_runtime.py"
+OUT = ROOT / "client" / "sobranie_client.py"
+
+STANDARD_PATH = "/Routing/MakePostRequest"
+# Same styles as collect.PAGE_STYLES (first pair present in the request schema wins).
+PAGE_STYLES = (("Page", "Rows"), ("page", "rows"), ("CurrentPage", "ItemsPerPage"))
+SCALARS = {"integer": ("int", "_int"), "number": ("float", "_float"),
+           "string": ("str", "_str"), "boolean": ("bool", "_bool")}
+
+_ENDPOINT_ROW_RE = re.compile(r"^\|\s*(\w+)\s*\|\s*([\w./]+/[\w./]+)\s*\|", re.M)
+_ENUM_LABEL_RE = re.compile(r"(-?\d+|[A-Z]+)\s*=\s*([^,]+)")
+
+
+# --- Names ---
+
+def snake(name: str) -> str:
+    s = name.replace("MPs", "Mps")
+    s = re.sub(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])", "_", s).lower()
+    s = re.sub(r"\W", "_", s)
+    return s + "_" if keyword.iskeyword(s) or s in ("self", "extra") else s
+
+
+def pascal(name: str) -> str:
+    return "".join(p[:1].upper() + p[1:] for p in re.split(r"[_\W]+", name) if p)
+
+
+def singular(name: str) -> str:
+    if name.endswith("ies"):
+        return name[:-3] + "y"
+    if name.endswith("s") and not name.endswith("ss"):
+        return name[:-1]
+    return name + "Item"
+
+
+def enum_members(d: dict) -> list[tuple[str, object]]:
+    """[(NAME, value)] from a $defs enum; names from its "1=Label, 2=..." description."""
+    labels = {}
+    for key, label in _ENUM_LABEL_RE.findall(d.get("description", "")):
+        label = label.strip()
+        paren = re.search(r"\(([^)]*)\)", label)
+        words = re.sub(r"\([^)]*\)", "", label)
+        if not re.search(r"[A-Za-z]", words) and paren:
+            words = paren.group(1)  # "Друга институција (Other institution)"
+        ident = re.sub(r"[^A-Za-z0-9]+", "_", words.split("/")[0]).strip("_").upper()
+        labels[key] = ident
+    out, used = [], set()
+    for value in d["enum"]:
+        ident = labels.get(str(value)) or ""
+        if not ident or ident[0].isdigit() or ident in used:
+            ident = f"V_{value}" if isinstance(value, int) else (re.sub(r"\W", "_", str(value)).upper() or "EMPTY")
+        if not ident.isidentifier() or ident in used:
+            ident = f"V_{len(out)}"
+        used.add(ident)
+        out.append((ident, value))
+    return out
+
+
+# --- Schema -> Python ---
+
+class Generator:
+    def __init__(self, defs: dict):
+        self.defs = defs
+        self.enums = {k: v for k, v in defs.items() if isinstance(v, dict) and v.get("enum")}
+        self.used_enums: set[str] = set()
+        self.classes: list[str] = []
+        self.class_names: set[str] = set()
+        self.methods: list[str] = []
+        self.decoders: list[str] = []
+
+    def _class_name(self, *candidates: str) -> str:
+        for name in candidates:
+            if name not in self.class_names:
+                break
+        else:
+            base, i = candidates[-1], 2
+            while f"{base}{i}" in self.class_names:
+                i += 1
+            name = f"{base}{i}"
+        self.class_names.add(name)
+        return name
+
+    def resolve(self, schema, hint: tuple[str, ...], local: dict, where: str) -> tuple[str, str]:
+        """(annotation, converter expression) for a schema; registers classes for objects."""
+        if not isinstance(schema, dict):
+            return "object", "_raw"
+        ref = schema.get("$ref")
+        if isinstance(ref, str):
+            name = ref.rsplit("/", 1)[-1]
+            if name == "AspDate":
+                return "AspDate", "_aspdate"
+            if name in self.enums:
+                self.used_enums.add(name)
+                return f"{name} | {self._enum_base(name)}", f"_enum({name})"
+            target = local.get(name, self.defs.get(name))
+            return self.resolve(target, (name,), local, where)
+        variants = schema.get("anyOf") or schema.get("oneOf")
+        if variants:
+            kept = [v for v in variants if not _is_null(v) and not _is_marker(v)]
+            if len(kept) == 1:
+                return self.resolve(kept[0], hint, local, where)
+            return "object", "_raw"
+        t = schema.get("type")
+        if isinstance(t, list):
+            t = [x for x in t if x != "null"]
+            t = t[0] if len(t) == 1 else None
+        if t in SCALARS:
+            return SCALARS[t]
+        if t == "array":
+            ann, conv = self.resolve(schema.get("items"), hint[:-1] + (singular(hint[-1]),), local, where + "[]")
+            return f"list[{ann}]", f"_list({conv})"
+        if t == "object" or "properties" in schema:
+            props = schema.get("properties") or {}
+            if not props:
+                return "dict", "_raw"
+            return self.model(props, set(schema.get("required") or ()), hint, local, where)
+        return "object", "_raw"
+
+    def param_annotation(self, schema, local: dict) -> str:
+        """Request argument type; nested objects are passed as plain dicts (no classes)."""
+        if not isinstance(schema, dict):
+            return "object"
+        ref = schema.get("$ref")
+        if isinstance(ref, str):
+            name = ref.rsplit("/", 1)[-1]
+            if name == "AspDate":
+                return "AspDate | datetime | date | str"
+            if name in self.enums:
+                self.used_enums.add(name)
+                return f"{name} | {self._enum_base(name)}"
+            return self.param_annotation(local.get(name, self.defs.get(name)), local)
+        variants = [v for v in schema.get("anyOf") or schema.get("oneOf") or () if not _is_null(v)]
+        if len(variants) == 1:
+            return self.param_annotation(variants[0], local)
+        t = schema.get("type")
+        if isinstance(t, list):
+            t = [x for x in t if x != "null"]
+            t = t[0] if len(t) == 1 else None
+        if t in SCALARS:
+            return SCALARS[t][0]
+        if t == "array":
+            return f"list[{self.param_annotation(schema.get('items'), local)}]"
+        return "dict" if t == "object" else "object"
+
+    def _enum_base(self, name: str) -> str:
+        return "int" if all(isinstance(v, int) for v in self.enums[name]["enum"]) else "str"
+
+    def model(self, props: dict, required: set, hint: tuple[str, ...], local: dict, where: str) -> tuple[str, str]:
+        name = self._class_name(pascal(hint[0] + hint[-1]) if len(hint) > 1 else pascal(hint[0]),
+                                pascal("".join(hint)))
+        fields, specs, attrs = [], [], set()
+        for key, sub in props.items():
+            attr = snake(key)
+            while attr in attrs:
+                attr += "_"
+            attrs.add(attr)
+            ann, conv = self.resolve(sub, (hint[0], key), local, f"{where}.{key}")
+            fields.append(f"    {attr}: {ann} | None = None")
+            specs.append(f"    ({attr!r}, {key!r}, {conv}, {key in required}),")
+        self.classes.append(
+            f"@dataclass(slots=True)\nclass {name}(Model):\n    \"\"\"{where}\"\"\"\n\n"
+            + "\n".join(fields) + "\n    extra: dict | None = None\n\n\n"
+            + f"_fields(\n    {name},\n" + "\n".join(specs) + "\n)\n"
+        )
+        return name, f"_obj({name})"
+
+    # --- Operations ---
+
+    def operation(self, op: str, md: str, endpoints: dict):
+        request = schema_diff.section_json(md, "### Request Schema")
+        response = schema_diff.section_json(md, "### Response Schema")
+        if not isinstance(request, dict) or not isinstance(response, dict):
+            return
+        local = {**(request.get("$defs") or {}), **(response.get("$defs") or {})}
+        props = request.get("properties") or {}
+        required = set(request.get("required") or ())
+        path = "/" + endpoints[op] if op in endpoints else STANDARD_PATH
+
+        # Body shape: ASMX {"model": {...}} / {"model": value}, or flat params with a method key.
+        wrap = None
+        method_key = next((k for k in props if k.lower() == "methodname"), None)
+        if set(props) == {"model"}:
+            wrap = "model"
+            inner = props["model"]
+            if isinstance(inner, dict) and inner.get("properties"):
+                required = set(inner.get("required") or ())
+                props = inner["properties"]
+            else:
+                props = {"model": inner}
+                required = {"model"}
+        params = []  # (arg, key, annotation, required)
+        for key, sub in props.items():
+            if key == method_key:
+                continue
+            params.append((snake(key), key, self.param_annotation(sub, local), key in required))
+
+        unwrap = None
+        if response.get("type") == "object" and set(response.get("properties") or {}) == {"d"}:
+            unwrap = "d"
+            ann, conv = self.resolve(response["properties"]["d"], (op, "Result"), local, f"{op} $.d")
+        else:
+            ann, conv = self.resolve(response, (op, "Response"), local, f"{op} $")
+        decoder = f"_D_{op}"
+        self.decoders.append(f"{decoder} = {conv}")
+
+        args = ["self"] + ["*"] * bool(params) + [
+            f"{arg}: {a}" if req else f"{arg}: {a} | None = None" for arg, _, a, req in params
+        ]
+        body = ", ".join(
+            ([f"{method_key!r}: {_const(props.get(method_key), op)!r}"] if method_key else [])
+            + [f"{key!r}: {arg}" for arg, key, _, _ in params]
+        )
+        payload = f"{{{body}}}"
+        if wrap and list(props) == ["model"]:
+            payload = "{'model': model}"
+        elif wrap:
+            payload = f"{{'model': {payload}}}"
+        method = snake(op)
+        self.methods.append(
+            f"    async def {method}({', '.join(args)}) -> {ann}:\n"
+            f"        \"\"\"{op} ({path.lstrip('/')}).\"\"\"\n"
+            f"        payload = _to_json({payload})\n"
+            f"        return await self._call({op!r}, {path!r}, payload, {decoder}"
+            + (f", unwrap={unwrap!r}" if unwrap else "") + ")\n"
+        )
+
+        pages = next(((p, s) for p, s in PAGE_STYLES if p in props and s in props), None)
+        root_props = response.get("properties") or {}
+        items_key = next((k for k, v in root_props.items() if _is_array(v, local, self.defs)), None)
+        total_key = next((k for k, v in root_props.items() if k.startswith("Total") and k != items_key), None)
+        if pages and items_key and not unwrap:
+            page_arg, size_arg = snake(pages[0]), snake(pages[1])
+            rest = [(arg, a, req) for arg, _, a, req in params if arg not in (page_arg, size_arg)]
+            iter_args = ["self", "*"] + [
+                f"{arg}: {a}" if req else f"{arg}: {a} | None = None" for arg, a, req in rest
+            ] + ["page_size: int = 50", "max_pages: int | None = None"]
+            kwargs = ", ".join(f"{arg!r}: {arg}" for arg, _, _ in rest)
+            self.methods.append(
+                f"    def iter_{method}({', '.join(iter_args)}):\n"
+                f"        \"\"\"Items ({items_key}) of every {op} page, in order.\"\"\"\n"
+                f"        return self._paginate(self.{method}, {page_arg!r}, {size_arg!r}, {snake(items_key)!r}, "
+                f"{snake(total_key) if total_key else None!r}, page_size, max_pages, {{{kwargs}}})\n"
+            )
+
+    def enum_code(self) -> str:
+        out = []
+        for name in sorted(self.used_enums):
+            d = self.enums[name]
+            base = "IntEnum" if self._enum_base(name) == "int" else "str, Enum"
+            members = "\n".join(f"    {ident} = {value!r}" for ident, value in enum_members(d))
+            doc = d.get("description", name).replace('"""', "'")
+            out.append(f"class {name}({base}):\n    \"\"\"{doc}\"\"\"\n\n{members}\n")
+        return "\n\n".join(out)
+
+
+def _is_null(schema) -> bool:
+    return isinstance(schema, dict) and schema.get("type") == "null"
+
+
+def _is_marker(schema) -> bool:
+    props = schema.get("properties") if isinstance(schema, dict) else None
+    return isinstance(props, dict) and set(props) == {"_truncated"}
+
+
+def _is_array(schema, local: dict, defs: dict) -> bool:
+    if not isinstance(schema, dict):
+        return False
+    if "$ref" in schema:
+        return _is_array(local.get(schema["$ref"].rsplit("/", 1)[-1]) or defs.get(schema["$ref"].rsplit("/", 1)[-1]),
+                         local, defs)
+    t = schema.get("type")
+    if t == "array" or (isinstance(t, list) and "array" in t):
+        return True
+    return any(_is_array(v, local, defs) for v in schema.get("anyOf") or schema.get("oneOf") or ())
+
+
+def _const(schema, op: str) -> str:
+    return schema.get("const", op) if isinstance(schema, dict) else op
+
+
+def endpoints_from_global(global_md: str) -> dict[str, str]:
+    """Operation -> path for the non-standard (ASMX / Infrastructure) table rows."""
+    return {op: path for op, path in _ENDPOINT_ROW_RE.findall(global_md)}
+
+
+def build(out: Path = OUT) -> int:
+    global_md = GLOBAL_MD.read_text(encoding="utf-8")
+    gen = Generator(schema_diff.load_defs(global_md))
+    endpoints = endpoints_from_global(global_md)
+    ops = sorted(p for p in OPS_DIR.glob("*.md") if p.stem != "OPERATION_TEMPLATE")
+    for p in ops:
+        gen.operation(p.stem, p.read_text(encoding="utf-8"), endpoints)
+
+    runtime = RUNTIME.read_text(encoding="utf-8")
+    runtime = runtime.split('"""', 2)[2].lstrip()  # drop the runtime's own docstring
+    code = "\n".join([
+        '"""',
+        "Typed client for the sobranie.mk API.",
+        "",
+        "GENERATED by scripts/build_client.py from docs/ops/*.md and docs/global.md; do not edit.",
+        '"""',
+        "",
+        "from __future__ import annotations",
+        "",
+        "from dataclasses import dataclass",
+        "",
+        runtime.rstrip(),
+        "",
+        "",
+        "# --- Enums ($defs) ---",
+        "",
+        gen.enum_code(),
+        "",
+        "# --- Responses ---",
+        "",
+        "\n\n".join(gen.classes),
+        "",
+        "\n".join(gen.decoders),
+        "",
+        "",
+        "# --- Client ---",
+        "",
+        "class Client(BaseClient):",
+        '    """One async method per operation; see BaseClient for transport options."""',
+        "",
+        "\n".join(gen.methods),
+    ]).rstrip() + "\n"
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(".tmp")
+    tmp.write_text(code, encoding="utf-8")
+    os.replace(tmp, out)
+    print(f"Built {out} ({len(gen.methods)} methods, {len(gen.classes)} classes, {len(gen.used_enums)} enums)")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate the typed API client from the docs.")
+    parser.add_argument("--out", type=Path, default=OUT, help=f"Output module (default {OUT.relative_to(ROOT)})")
+    args = parser.parse_args(argv)
+    return build(args.out)
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -1,13 +1,22 @@
 """
 File-based cache for API requests. Keys by (url, payload JSON).
+
+Entries are compact JSON (jsonio.dump_bytes); older pretty-printed entries read the same.
+Large bodies streamed to disk by collect.py are kept as received in blobs/<sha256>.json
+and the entry only references them ("blob"); collect hardlinks the blob into
+collected/ instead of writing the response again.
 """
 
 import hashlib
 import json
+import os
 from pathlib import Path
 
+import jsonio
+
 ROOT = Path(__file__).parent.parent
 CACHE_DIR = ROOT / ".api_cache"
+BLOB_DIR = CACHE_DIR / "blobs"
 
 
 def _key(url: str, payload: dict) -> str:
@@ -16,25 +25,57 @@ def _key(url: str, payload: dict) -> str:
     return h[:16]
 
 
-def get(url: str, payload: dict) -> dict | None:
-    """Return cached response or None."""
-    k = _key(url, payload)
-    path = CACHE_DIR / f"{k}.json"
+def _entry(url: str, payload: dict) -> dict | None:
+    path = CACHE_DIR / f"{_key(url, payload)}.json"
     if not path.exists():
         return None
     try:
-        data = json.loads(path.read_text(encoding="utf-8"))
-        return data.get("response")
+        return jsonio.read(path)
     except (json.JSONDecodeError, OSError):
         return None
 
 
+def get(url: str, payload: dict) -> dict | None:
+    """Return cached response or None."""
+    data = _entry(url, payload)
+    if data is None:
+        return None
+    if "blob" in data:
+        try:
+            return jsonio.read(BLOB_DIR / f"{data['blob']}.json")
+        except (json.JSONDecodeError, OSError):
+            return None
+    return data.get("response")
+
+
+def blob_path(url: str, payload: dict) -> Path | None:
+    """Path of the cached body if it is stored as a blob, else None."""
+    data = _entry(url, payload)
+    if data is None or "blob" not in data:
+        return None
+    path = BLOB_DIR / f"{data['blob']}.json"
+    return path if path.exists() else None
+
+
 def set_(url: str, payload: dict, response) -> None:
     """Cache a response."""
     CACHE_DIR.mkdir(parents=True, exist_ok=True)
     k = _key(url, payload)
     path = CACHE_DIR / f"{k}.json"
-    path.write_text(
-        json.dumps({"url": url, "payload": payload, "response": response}, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
+    path.write_bytes(jsonio.dump_bytes({"url": url, "payload": payload, "response": response}))
+
+
+def set_blob(url: str, payload: dict, tmp: Path, sha256: str) -> Path:
+    """Adopt a body file written in BLOB_DIR as the blob sha256 and cache a reference to it.
+
+    A body already stored under that hash is kept and tmp removed. Returns the blob path.
+    """
+    blob = BLOB_DIR / f"{sha256}.json"
+    if blob.exists():
+        tmp.unlink(missing_ok=True)
+    else:
+        os.replace(tmp, blob)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    entry = {"url": url, "payload": payload, "blob": sha256, "bytes": blob.stat().st_size}
+    (CACHE_DIR / f"{_key(url, payload)}.json").write_bytes(jsonio.dump_bytes(entry))
+    return blob
@@ -0,0 +1,304 @@
+"""
+Runtime for the generated API client (build_client.py copies this file, minus
+this docstring, to the top of client/sobranie_client.py).
+
+  - AspDate:    "/Date(ms)/" kept as the raw string, parsed to datetime on first access
+  - decoding:   converters built once per field (_obj, _list, _enum, ...) turn JSON into
+                __slots__ dataclasses; unknown keys land in .extra, "_truncated"
+                markers are dropped from arrays
+  - Client:     async calls over one pooled requests.Session (run in worker threads,
+                bounded by a semaphore), optional cache (anything with get(url, payload)
+                and set_(url, payload, response), e.g. scripts/cache.py), batch()
+                and page-by-page iterators
+"""
+
+import asyncio
+import math
+import re
+from datetime import date, datetime, timezone
+from enum import Enum, IntEnum
+
+SITE = "https://www.sobranie.mk"
+DEFAULT_URL = f"{SITE}/Routing/MakePostRequest"
+
+_ASPDATE_RE = re.compile(r"^/Date\((-?\d+)(?:[+-]\d{4})?\)/$")
+
+
+class ApiError(Exception):
+    """Non-200 response or transport failure."""
+
+    def __init__(self, op: str, status, body: str = ""):
+        super().__init__(f"{op}: {status} {body[:200]}")
+        self.op = op
+        self.status = status
+        self.body = body
+
+
+class ValidationError(ValueError):
+    """A response did not match the documented schema (strict mode)."""
+
+    def __init__(self, path: str, message: str):
+        super().__init__(f"{path}: {message}")
+        self.path = path
+
+
+# --- Values ---
+
+class AspDate:
+    """ASP.NET "/Date(ms)/" value; .datetime is parsed on first access."""
+
+    __slots__ = ("raw", "_dt")
+
+    def __init__(self, raw: str):
+        self.raw = raw
+        self._dt = None
+
+    @classmethod
+    def of(cls, value: "AspDate | datetime | date | str") -> "AspDate":
+        if isinstance(value, AspDate):
+            return value
+        if isinstance(value, datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            return cls(f"/Date({int(value.timestamp() * 1000)})/")
+        if isinstance(value, date):
+            return cls.of(datetime(value.year, value.month, value.day, tzinfo=timezone.utc))
+        return cls(value)
+
+    @property
+    def ms(self) -> int | None:
+        m = _ASPDATE_RE.match(self.raw)
+        return int(m.group(1)) if m else None
+
+    @property
+    def datetime(self) -> datetime | None:
+        if self._dt is None:
+            ms = self.ms
+            if ms is not None:
+                self._dt = datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+        return self._dt
+
+    def __eq__(self, other):
+        return isinstance(other, AspDate) and other.raw == self.raw
+
+    def __hash__(self):
+        return hash(self.raw)
+
+    def __repr__(self):
+        return f"AspDate({self.raw!r})"
+
+    def __str__(self):
+        return self.raw
+
+
+def _to_json(value):
+    """Request argument -> JSON value (enums, dates, nested lists/dicts)."""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (AspDate, datetime, date)):
+        return AspDate.of(value).raw
+    if isinstance(value, list):
+        return [_to_json(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _to_json(v) for k, v in value.items()}
+    return value
+
+
+# --- Decoding ---
+
+_SCALARS = {"str": str, "int": int, "float": (int, float), "bool": bool}
+
+
+def _raw(value, path, strict):
+    return value
+
+
+def _scalar(kind: str):
+    expected = _SCALARS[kind]
+
+    def conv(value, path, strict):
+        if value is None or (isinstance(value, expected) and not (kind != "bool" and isinstance(value, bool))):
+            return value
+        if strict:
+            raise ValidationError(path, f"expected {kind}, got {type(value).__name__}")
+        return value
+    return conv
+
+
+_str, _int, _float, _bool = (_scalar(k) for k in ("str", "int", "float", "bool"))
+
+
+def _aspdate(value, path, strict):
+    if isinstance(value, str) and _ASPDATE_RE.match(value):
+        return AspDate(value)
+    if value is not None and strict:
+        raise ValidationError(path, f"expected AspDate, got {value!r}")
+    return value
+
+
+def _enum(cls):
+    # Documented enums are what has been observed; unknown codes are kept as plain values.
+    def conv(value, path, strict):
+        try:
+            return cls(value) if value is not None else None
+        except ValueError:
+            return value
+    return conv
+
+
+def _list(item):
+    def conv(value, path, strict):
+        if value is None:
+            return None
+        if not isinstance(value, list):
+            if strict:
+                raise ValidationError(path, f"expected array, got {type(value).__name__}")
+            return value
+        out = []
+        for i, v in enumerate(value):
+            if isinstance(v, dict) and "_truncated" in v and len(v) <= 2:
+                continue
+            out.append(item(v, f"{path}[{i}]", strict))
+        return out
+    return conv
+
+
+def _obj(cls):
+    def conv(value, path, strict):
+        if value is None:
+            return None
+        if not isinstance(value, dict):
+            if strict:
+                raise ValidationError(path, f"expected object, got {type(value).__name__}")
+            return value
+        return cls.from_json(value, path, strict)
+    return conv
+
+
+class Model:
+    """Base of generated response classes. _FIELDS: ((attr, key, converter, required), ...)."""
+
+    __slots__ = ()
+    _FIELDS: tuple = ()
+    _KEYS: frozenset = frozenset()
+
+    @classmethod
+    def from_json(cls, data: dict, path: str = "$", strict: bool = True):
+        values = {}
+        for attr, key, conv, required in cls._FIELDS:
+            if key in data:
+                values[attr] = conv(data[key], f"{path}.{key}", strict)
+            elif required and strict:
+                raise ValidationError(path, f"missing required {key!r}")
+        extra = {k: v for k, v in data.items() if k not in cls._KEYS}
+        if extra:
+            values["extra"] = extra
+        return cls(**values)
+
+    def to_json(self) -> dict:
+        out = {}
+        for attr, key, _, _ in self._FIELDS:
+            value = getattr(self, attr)
+            if value is not None:
+                out[key] = _dump(value)
+        if self.extra:
+            out.update(self.extra)
+        return out
+
+
+def _dump(value):
+    if isinstance(value, Model):
+        return value.to_json()
+    if isinstance(value, list):
+        return [_dump(v) for v in value]
+    return _to_json(value)
+
+
+def _fields(cls, *fields):
+    cls._FIELDS = fields
+    cls._KEYS = frozenset(f[1] for f in fields)
+
+
+# --- Client ---
+
+class BaseClient:
+    """Transport, caching, batching and pagination shared by the generated methods."""
+
+    def __init__(self, base_url: str = SITE, max_concurrency: int = 4, timeout: tuple = (5, 60),
+                 cache=None, strict: bool = True, session=None):
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache
+        self.strict = strict
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+
+    def close(self):
+        self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def _post(self, op: str, url: str, payload):
+        if self.cache is not None:
+            cached = self.cache.get(url, payload)
+            if cached is not None:
+                return cached
+        try:
+            r = self.session.post(url, json=payload, timeout=self.timeout)
+        except Exception as e:
+            raise ApiError(op, type(e).__name__, str(e)) from e
+        if r.status_code != 200:
+            raise ApiError(op, r.status_code, r.text or "")
+        data = r.json()
+        if self.cache is not None:
+            self.cache.set_(url, payload, data)
+        return data
+
+    async def _call(self, op: str, path: str, payload, decode, unwrap: str | None = None):
+        async with self._semaphore:
+            data = await asyncio.to_thread(self._post, op, self.base_url + path, payload)
+        if unwrap and isinstance(data, dict) and unwrap in data:
+            data = data[unwrap]
+        return decode(data, "$", self.strict)
+
+    async def batch(self, calls, return_exceptions: bool = False) -> list:
+        """Run many calls (coroutines from the generated methods) concurrently, results in order."""
+        return await asyncio.gather(*calls, return_exceptions=return_exceptions)
+
+    async def _paginate(self, method, page_arg: str, size_arg: str, items_attr: str, total_attr: str | None,
+                        page_size: int, max_pages: int | None, kwargs: dict):
+        first = await method(**kwargs, **{page_arg: 1, size_arg: page_size})
+        for item in getattr(first, items_attr) or []:
+            yield item
+        total = getattr(first, total_attr) if total_attr else None
+        if not total or page_size <= 0:
+            return
+        last = math.ceil(total / page_size)
+        if max_pages is not None:
+            last = min(last, max_pages)
+        # Pages are fetched a semaphore's worth at a time and yielded in order.
+        step = max(1, self.max_concurrency)
+        for start in range(2, last + 1, step):
+            pages = await self.batch(
+                method(**kwargs, **{page_arg: p, size_arg: page_size})
+                for p in range(start, min(start + step, last + 1))
+            )
+            for page in pages:
+                items = getattr(page, items_attr) or []
+                if not items:
+                    return
+                for item in items:
+                    yield item
@@ -6,50 +6,192 @@ Reads config/generators.json (pipeline format), sends requests to the Sobranie A
 saves req/res pairs to collected/. Pipelines chain stages: each stage can extract IDs
 from responses and pass them to later stages via a shared store.
 
-Run: python scripts/collect.py [--no-cache] [--pipeline NAME]
+Listing stages can set "paginate" instead of drawing random pages: page 1 is
+fetched first, TotalItems gives the page count, and up to `calls` pages (or
+"max_pages") are fetched concurrently — all of them, or a stratified sample
+spread evenly across the range. Both Page/Rows and CurrentPage/ItemsPerPage are
+detected from params; "rows" fixes the page size.
+
+  "paginate": {"rows": 50, "sample": "stratified", "concurrency": 4}
+
+Every outcome is journaled to collected/journal/<run_id>.jsonl as it lands and
+folded into manifest.json at pipeline boundaries, at run end, and at the start of
+the next run, so pairs from a crashed run are never orphaned. req_NNN numbers are
+claimed with exclusive file creation, so several collect processes (e.g. one per
+--pipeline) can share a corpus.
+
+--languages also sends every request in the other languages (LanguageId 2 =
+Albanian, 3 = Turkish by default), concurrently with the Macedonian one. Each
+variant is saved as its own pair linked to the primary ("lang"/"group" in the
+journal and manifest); the store is fed from the primary response only, so ID
+chaining is the same for all languages.
+
+Response bodies are streamed; ones over SPILL_BYTES go to disk chunk by chunk, are
+parsed once from the file and stored once (a cache blob hardlinked as resp_NNN.json).
+Downloads over --max-response-mb (or a stage's "max_bytes") are abandoned.
+
+Random parameter values (ranges, years, store sources) are drawn coverage-guided
+(coverage.py): values whose responses brought new shapes are favoured, ones that
+only gave empty listings or errors are rarely retried. --no-coverage draws uniformly.
+
+Run: python scripts/collect.py [--no-cache] [--pipeline NAME] [--base-url URL] [--delay SECONDS]
+     python scripts/collect.py --languages [1,2,3]
+     python scripts/collect.py --resume RUN_ID
 """
 
 import argparse
+import functools
 import hashlib
 import json
 import logging
+import os
 import random
 import re
+import shutil
 import sys
+import math
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
-from jsonpath_ng.ext import parse as jp_parse
-
 ROOT = Path(__file__).parent.parent
 CONFIG = ROOT / "config"
 COLLECTED = ROOT / "collected"
 ERRORS = ROOT / "errors"
 LOGS = ROOT / "logs" / "collect"
 
-DEFAULT_URL = "https://www.sobranie.mk/Routing/MakePostRequest"
+SITE = "https://www.sobranie.mk"
+DEFAULT_URL = f"{SITE}/Routing/MakePostRequest"
 DELAY = 0.6
+PAGINATE_CONCURRENCY = 4
+# Response bodies: read in CHUNK_BYTES; over SPILL_BYTES they go to disk instead of memory
+# and are stored once (cache blob hardlinked into collected/); over the cap the download
+# is abandoned. Stages can set their own "max_bytes".
+CHUNK_BYTES = 1 << 16
+SPILL_BYTES = 1 << 20
+MAX_RESPONSE_BYTES = 64 << 20
+INCOMING_DIR = ".incoming"
+REGENERATE_ATTEMPTS = 5
+PAGE_STYLES = (("Page", "Rows"), ("page", "rows"), ("CurrentPage", "ItemsPerPage"))
+# range / year generators with at most this many values are drawn through coverage.py.
+RANGE_CHOICES_MAX = 1000
+LANGUAGES = (1, 2, 3)  # Macedonian, Albanian, Turkish
+# Top-level body params --languages varies; ASMX bodies (nested "Language") stay Macedonian.
+LANGUAGE_PARAMS = ("languageId", "LanguageId")
 
 
 # --- HTTP ---
 
-def post(url: str, payload: dict, use_cache: bool, cache_get, cache_set):
-    if use_cache:
-        cached = cache_get(url, payload)
+class ResponseTooLarge(Exception):
+    pass
+
+
+def _download(r, max_bytes: int | None, spill_dir: Path) -> tuple[bytes | None, Path | None, str]:
+    """Read a streamed body in chunks: (bytes, None, sha256) up to SPILL_BYTES, else (None, temp file, sha256).
+
+    Raises ResponseTooLarge as soon as more than max_bytes have arrived.
+    """
+    declared = r.headers.get("Content-Length")
+    if max_bytes and declared and declared.isdigit() and int(declared) > max_bytes:
+        raise ResponseTooLarge(f"Content-Length {declared} > {max_bytes} bytes")
+    h = hashlib.sha256()
+    size = 0
+    chunks: list[bytes] = []
+    f = tmp = None
+    try:
+        for chunk in r.iter_content(CHUNK_BYTES):
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                raise ResponseTooLarge(f"over {max_bytes} bytes")
+            h.update(chunk)
+            if f is None and size <= SPILL_BYTES:
+                chunks.append(chunk)
+                continue
+            if f is None:
+                spill_dir.mkdir(parents=True, exist_ok=True)
+                tmp = spill_dir / f".incoming-{os.getpid()}-{threading.get_ident()}-{time.time_ns()}.json"
+                f = open(tmp, "wb")
+                f.writelines(chunks)
+                chunks = []
+            f.write(chunk)
+    except BaseException:
+        if f is not None:
+            f.close()
+            tmp.unlink(missing_ok=True)
+        raise
+    if f is not None:
+        f.close()
+        return None, tmp, h.hexdigest()
+    return b"".join(chunks), None, h.hexdigest()
+
+
+def post(url: str, payload: dict, cache=None, max_bytes: int | None = MAX_RESPONSE_BYTES,
+         spill_dir: Path | None = None) -> tuple[object, Path | None]:
+    """POST payload and return (response, blob).
+
+    The body is streamed: up to SPILL_BYTES it is parsed from memory and cached as
+    before; larger bodies go to a file chunk by chunk and are parsed once from
+    there. blob is that file (in the cache's blob store when cache is given, else
+    a temp file in spill_dir for the caller to move), or None. cache is the cache
+    module or None (--no-cache).
+    """
+    import jsonio
+
+    if cache is not None:
+        blob = cache.blob_path(url, payload)
+        if blob is not None:
+            try:
+                return jsonio.read(blob), blob
+            except (OSError, json.JSONDecodeError):
+                pass
+        cached = cache.get(url, payload)
         if cached is not None:
-            return cached
+            return cached, None
+    spill_dir = cache.BLOB_DIR if cache is not None else (spill_dir or COLLECTED / INCOMING_DIR)
     try:
         import requests
-        r = requests.post(url, json=payload, timeout=(5, 60))
-        if r.status_code == 200:
-            data = r.json()
-            if use_cache:
-                cache_set(url, payload, data)
-            return data
-        return {"_error": r.status_code, "_body": (r.text or "")[:300]}
+        with requests.post(url, json=payload, timeout=(5, 60), stream=True) as r:
+            if r.status_code != 200:
+                head = next(r.iter_content(300), b"")
+                return {"_error": r.status_code, "_body": head.decode("utf-8", errors="replace")[:300]}, None
+            body, tmp, sha = _download(r, max_bytes, spill_dir)
+    except ResponseTooLarge as e:
+        return {"_error": "too_large", "_body": str(e)}, None
     except Exception as e:
-        return {"_error": type(e).__name__, "_body": str(e)[:300]}
+        return {"_error": type(e).__name__, "_body": str(e)[:300]}, None
+    try:
+        data = jsonio.loads(body) if tmp is None else jsonio.read(tmp)
+    except json.JSONDecodeError as e:
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
+        return {"_error": type(e).__name__, "_body": str(e)[:300]}, None
+    if tmp is None:
+        if cache is not None:
+            cache.set_(url, payload, data)
+        return data, None
+    if cache is not None:
+        tmp = cache.set_blob(url, payload, tmp, sha)
+    return data, tmp
+
+
+def place_blob(blob: Path, dest: Path, shared: bool):
+    """Put a spilled body at dest: hardlink a shared (cache) blob, copying across filesystems; move a temp one."""
+    if not shared:
+        os.replace(blob, dest)
+        return
+    try:
+        os.link(blob, dest)
+    except OSError:
+        shutil.copyfile(blob, dest)
+
+
+def rebase_url(url: str, base_url: str | None) -> str:
+    """Point a sobranie.mk URL at another host (e.g. the local mock_api.py replay server)."""
+    if not base_url or not url.startswith(SITE):
+        return url
+    return base_url.rstrip("/") + url[len(SITE):]
 
 
 def is_error(resp) -> bool:
@@ -66,6 +208,18 @@ def is_permanent_client_error(resp) -> bool:
 
 # --- Jsonpath extraction ---
 
+@functools.lru_cache(maxsize=None)
+def jp_parse(path: str):
+    """Compiled jsonpath expression, once per path.
+
+    jsonpath_ng is imported on first use (not for --help), and every parse() call
+    builds a new PLY parser, so extract specs are compiled once instead of per response.
+    """
+    from jsonpath_ng.ext import parse
+
+    return parse(path)
+
+
 def jp_extract(data, path: str) -> list:
     """Extract values from data using a jsonpath expression."""
     expr = jp_parse(path)
@@ -86,11 +240,19 @@ def _aspdate_to_year(asp: str) -> int | None:
         return None
 
 
-def generate_value(gen: dict, store: dict, globals_: dict, picked: dict) -> object:
+def _randint(lo: int, hi: int, choose, name: str) -> int:
+    if choose is not None and hi - lo < RANGE_CHOICES_MAX:
+        return choose(name, list(range(lo, hi + 1)))
+    return random.randint(lo, hi)
+
+
+def generate_value(gen: dict, store: dict, globals_: dict, picked: dict, choose=None, name: str = "") -> object:
     """Generate a parameter value from a generator spec or a store source.
 
     `picked` tracks already-chosen items for paired sources (same dict used
     across all params in one body generation so paired fields stay matched).
+    `choose(name, candidates, key=None)` replaces the uniform random draws
+    (coverage.py); `name` is the parameter path, e.g. "model.Month".
     """
     if "source" in gen:
         src = gen["source"]
@@ -102,32 +264,121 @@ def generate_value(gen: dict, store: dict, globals_: dict, picked: dict) -> obje
             if not items:
                 return None
             if store_key not in picked:
-                picked[store_key] = random.choice(items)
+                picked[store_key] = (
+                    choose(name, items, lambda it: it.get(field)) if choose else random.choice(items)
+                )
             return picked[store_key].get(field)
         # Simple source: pick a random value from the list.
         vals = store.get(src, [])
-        return random.choice(vals) if vals else None
+        if not vals:
+            return None
+        return choose(name, vals) if choose else random.choice(vals)
     g = gen.get("generator", "constant")
     if g == "constant":
         return gen.get("value")
     if g == "range":
-        return random.randint(int(gen.get("min", 0)), int(gen.get("max", 10)))
+        return _randint(int(gen.get("min", 0)), int(gen.get("max", 10)), choose, name)
     if g == "current_structure":
         return globals_.get("current_structure")
     if g == "current_structure_year":
         years = globals_.get("current_structure_years")
         if years and len(years) == 2:
             lo, hi = years[0], min(years[1], datetime.now().year)
-            return random.randint(lo, hi) if lo <= hi else datetime.now().year
+            return _randint(lo, hi, choose, name) if lo <= hi else datetime.now().year
         return datetime.now().year
     if g == "object":
-        return {k: generate_value(v, store, globals_, picked) for k, v in (gen.get("properties") or {}).items()}
+        return {
+            k: generate_value(v, store, globals_, picked, choose, f"{name}.{k}")
+            for k, v in (gen.get("properties") or {}).items()
+        }
     return None
 
 
-def generate_body(params: dict, store: dict, globals_: dict) -> dict:
+def generate_body(params: dict, store: dict, globals_: dict, choose=None) -> dict:
     picked: dict = {}  # tracks paired source picks for this body
-    return {k: generate_value(v, store, globals_, picked) for k, v in params.items()}
+    return {k: generate_value(v, store, globals_, picked, choose, k) for k, v in params.items()}
+
+
+def pagination_params(params: dict, spec: dict) -> tuple[str, str] | None:
+    """Return (page_param, size_param) for a paginated stage.
+
+    Explicit `page_param`/`size_param` in the paginate spec win; otherwise the
+    first of Page/Rows, page/rows, CurrentPage/ItemsPerPage present in params.
+    """
+    if spec.get("page_param") and spec.get("size_param"):
+        return spec["page_param"], spec["size_param"]
+    for page_key, size_key in PAGE_STYLES:
+        if page_key in params and size_key in params:
+            return page_key, size_key
+    return None
+
+
+def plan_pages(total_items: int, page_size: int, max_pages: int | None, sample: str = "stratified") -> list[int]:
+    """Pages to fetch after page 1, given the total item count.
+
+    All pages when they fit in max_pages (page 1 included). Otherwise:
+    "stratified" splits pages 2..N into equal strata and picks one random page
+    per stratum (even spread, no duplicates); "first" takes the lowest pages.
+    """
+    n_pages = max(1, math.ceil(total_items / page_size)) if page_size > 0 else 1
+    rest = list(range(2, n_pages + 1))
+    budget = len(rest) if max_pages is None else max(0, max_pages - 1)
+    if budget >= len(rest):
+        return rest
+    if budget == 0:
+        return []
+    if sample == "first":
+        return rest[:budget]
+    picks = []
+    for k in range(budget):
+        lo = (k * len(rest)) // budget
+        hi = ((k + 1) * len(rest)) // budget
+        picks.append(rest[random.randrange(lo, max(lo + 1, hi))])
+    return picks
+
+
+def filter_known_sources(params: dict, store: dict, known) -> dict:
+    """Return a store view without source values already requested (incremental mode).
+
+    known(param) gives the values this op was already called with for a request
+    param. Simple sources drop known values; paired sources ("key.field") drop
+    rows whose fields are all known for their params.
+    """
+    view = dict(store)
+    paired: dict[str, list[tuple[str, str]]] = {}
+    for param, gen in params.items():
+        if not isinstance(gen, dict) or "source" not in gen:
+            continue
+        src = gen["source"]
+        if "." in src:
+            store_key, field = src.split(".", 1)
+            paired.setdefault(store_key, []).append((field, param))
+            continue
+        seen = known(param)
+        if seen:
+            view[src] = [v for v in view.get(src, []) if v not in seen]
+    for store_key, fields in paired.items():
+        seen_sets = [(field, known(param)) for field, param in fields]
+        view[store_key] = [
+            row for row in view.get(store_key, [])
+            if not all(row.get(field) in seen for field, seen in seen_sets)
+        ]
+    return view
+
+
+def language_param(body: dict) -> str | None:
+    """The body's language parameter name, if it has one --languages can vary."""
+    for name in LANGUAGE_PARAMS:
+        if isinstance(body.get(name), int):
+            return name
+    return None
+
+
+def parse_languages(value: str) -> list[int]:
+    langs = [int(v) for v in value.split(",") if v.strip()]
+    if not langs or any(lang not in LANGUAGES for lang in langs):
+        raise argparse.ArgumentTypeError(f"languages must be among {','.join(map(str, LANGUAGES))}")
+    return langs
 
 
 def body_hash(body: dict) -> str:
@@ -136,11 +387,13 @@ def body_hash(body: dict) -> str:
 
 # --- Bootstrap: get current structure ---
 
-def bootstrap_structure(use_cache, cache_get, cache_set, log) -> dict:
+def bootstrap_structure(cache, log, url: str = DEFAULT_URL) -> dict:
     """Call GetAllStructuresForFilter to get current structure ID and year range."""
     globals_ = {}
     body = {"methodName": "GetAllStructuresForFilter", "languageId": 1}
-    resp = post(DEFAULT_URL, body, use_cache, cache_get, cache_set)
+    resp, blob = post(url, body, cache)
+    if blob is not None and cache is None:
+        blob.unlink(missing_ok=True)
     if is_error(resp) or not isinstance(resp, list):
         log.warning("Bootstrap: GetAllStructuresForFilter failed or unexpected format")
         return globals_
@@ -163,15 +416,63 @@ def bootstrap_structure(use_cache, cache_get, cache_set, log) -> dict:
 
 # --- Main ---
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Pipeline-based request collection.")
     parser.add_argument("--no-cache", action="store_true", help="Skip API response cache")
     parser.add_argument("--pipeline", type=str, default=None, help="Run only this pipeline (by name)")
-    args = parser.parse_args()
-    use_cache = not args.no_cache
+    parser.add_argument("--base-url", type=str, default=None,
+                        help=f"Send requests to this host instead of {SITE} (e.g. mock_api.py)")
+    parser.add_argument("--delay", type=float, default=DELAY, help=f"Seconds between requests (default {DELAY})")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only fetch what collected/index.json does not already cover")
+    parser.add_argument("--resume", type=str, default=None, metavar="RUN_ID",
+                        help="Continue an interrupted run: only its remaining planned calls")
+    parser.add_argument("--reverify-days", type=float, default=None, metavar="N",
+                        help="Re-send requests finalized more than N days ago (default: never)")
+    parser.add_argument("--reverify-errors-days", type=float, default=None, metavar="N",
+                        help="Re-send requests that got a 4xx more than N days ago (default: --reverify-days)")
+    parser.add_argument("--seed-from-index", action="store_true",
+                        help="Fill listing stages' store keys from collected/ids.sqlite instead of calling them")
+    parser.add_argument("--languages", type=parse_languages, nargs="?", const=list(LANGUAGES), default=None,
+                        metavar="1,2,3",
+                        help="Also send each request in these languages, concurrently, as linked pairs")
+    parser.add_argument("--max-response-mb", type=float, default=MAX_RESPONSE_BYTES / (1 << 20), metavar="MB",
+                        help=f"Abandon responses larger than this (default {MAX_RESPONSE_BYTES >> 20}; "
+                             "stage \"max_bytes\" overrides per op; 0 = no cap)")
+    parser.add_argument("--no-coverage", action="store_true",
+                        help="Draw parameter values uniformly instead of coverage-guided (collected/coverage.json)")
+    parser.add_argument("--profile", action="store_true",
+                        help="cProfile the run into logs/<run_id>/profile.pstats, hot functions logged at the end")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="tracemalloc: top allocation sites and peak into logs/<run_id>/memory_*.txt")
+    parser.add_argument("--profile-interval", type=float, default=None, metavar="SECONDS",
+                        help="--profile/--trace-memory: also write a sample about every SECONDS")
+    args = parser.parse_args(argv)
 
     sys.path.insert(0, str(ROOT / "scripts"))
-    from cache import get as cache_get, set_ as cache_set
+    import profiling
+
+    import run_journal
+
+    run_id = args.resume or run_journal.new_run_id()
+    with profiling.RunProfiler(LOGS / run_id, profile=args.profile, trace_memory=args.trace_memory,
+                               interval=args.profile_interval, logger="collect") as prof:
+        return run(args, run_id, prof)
+
+
+def run(args, run_id: str, prof) -> int:
+    """One collect run; main() parses the arguments and wraps it in the profiler (profiling.py)."""
+    use_cache = not args.no_cache
+    max_response_bytes = int(args.max_response_mb * (1 << 20)) or None
+    bootstrap_url = rebase_url(DEFAULT_URL, args.base_url)
+
+    import cache as response_cache
+    import corpus_index
+    import coverage
+    import dedup_index
+    import id_index
+    import jsonio
+    import run_journal
 
     cfg_path = CONFIG / "generators.json"
     if not cfg_path.exists():
@@ -184,7 +485,6 @@ def main():
         print("ERROR: no pipelines in config")
         return 1
 
-    run_id = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     log_dir = LOGS / run_id
     log_dir.mkdir(parents=True, exist_ok=True)
     log = logging.getLogger("collect")
@@ -199,32 +499,46 @@ def main():
     ch.setFormatter(logging.Formatter("%(message)s"))
     log.addHandler(ch)
 
-    log.info(f"Collect run {run_id} | cache={'on' if use_cache else 'off'}")
+    log.info(f"Collect run {run_id} | cache={'on' if use_cache else 'off'}"
+             f"{' | incremental' if args.incremental else ''}"
+             f"{' | languages ' + ','.join(map(str, args.languages)) if args.languages else ''}")
 
     # Bootstrap: get current structure
-    globals_ = bootstrap_structure(use_cache, cache_get, cache_set, log)
+    http_cache = response_cache if use_cache else None
+    globals_ = bootstrap_structure(http_cache, log, bootstrap_url)
 
     # Ensure first-run directories exist before reading/iterating.
     COLLECTED.mkdir(parents=True, exist_ok=True)
     ERRORS.mkdir(parents=True, exist_ok=True)
 
-    # Load existing manifest and counters
-    manifest = {"runs": []}
-    if (COLLECTED / "manifest.json").exists():
-        manifest = json.loads((COLLECTED / "manifest.json").read_text(encoding="utf-8"))
-    errors_manifest = {"errors": []}
-    if (COLLECTED / "errors_manifest.json").exists():
-        errors_manifest = json.loads((COLLECTED / "errors_manifest.json").read_text(encoding="utf-8"))
+    # Fold journals of earlier (possibly crashed) runs into manifest.json
+    recovered = run_journal.compact(COLLECTED)
+    if recovered:
+        log.info(f"Journal: folded {recovered} entries from earlier runs into the manifests")
+
+    resume = None
+    if args.resume:
+        jpath = run_journal.journal_path(COLLECTED, run_id)
+        if not jpath.exists():
+            log.error(f"No active journal for run {run_id} (unknown or already finished)")
+            return 1
+        resume = run_journal.progress(run_journal.read_events(jpath))
+        log.info(f"Resuming {run_id}: {sum(resume['sent'].values())} request(s) already sent")
 
+    # Highest req_NNN this process has claimed per op. Numbers are claimed with
+    # exclusive create, so the corpus index's max_nnn is only a starting hint.
     op_counters: dict[str, int] = {}
-    for op_dir in (COLLECTED.iterdir() if COLLECTED.exists() else []):
-        if op_dir.is_dir():
-            for f in op_dir.glob("req_*.json"):
-                try:
-                    n = int(f.stem.split("_")[1])
-                    op_counters[op_dir.name] = max(op_counters.get(op_dir.name, 0), n)
-                except (ValueError, IndexError):
-                    pass
+
+    # Persistent per-op index (bodies, request IDs, listing item IDs, latest dates).
+    index_path = COLLECTED / "index.json"
+    index = corpus_index.load(index_path)
+    newly_indexed = corpus_index.update(index, COLLECTED)
+    if newly_indexed:
+        log.info(f"Index: added {newly_indexed} pair(s) from earlier runs")
+
+    # Entity ID -> (op, req_NNN, path) lookup; kept current as pairs land.
+    ids = id_index.connect(COLLECTED / "ids.sqlite")
+    id_index.update(ids, COLLECTED)
 
     # Global dedup of finalized outcomes:
     # - successful requests
@@ -232,13 +546,39 @@ def main():
     # Transient failures are intentionally NOT finalized so retries can re-send.
     finalized: set[str] = set()
 
+    # The same outcomes persisted across runs (collected/finalized.idx). Outcomes older
+    # than the re-verify age count as not finalized and are re-sent.
+    prior = dedup_index.DedupIndex(COLLECTED / "finalized.idx")
+    if len(prior) == 0:
+        for op_name, entry in index["ops"].items():
+            for h in entry["hashes"]:
+                prior.add(f"{op_name}:{h}")
+    reverify = {
+        dedup_index.OK: args.reverify_days,
+        dedup_index.CLIENT_ERROR: (
+            args.reverify_errors_days if args.reverify_errors_days is not None else args.reverify_days
+        ),
+    }
+    replayed: set[str] = set()
+    log.info(f"Dedup index: {len(prior)} finalized request(s) from earlier runs")
+
+    # Which parameter values produced new response shapes, empty listings or errors (coverage.py).
+    cov = None if args.no_coverage else coverage.Coverage(COLLECTED / "coverage.json")
+
+    def draw(op, params, store):
+        return generate_body(params, store, globals_, cov.chooser(op) if cov else None)
+
     run_pairs = []
+    current = {"pipeline": None, "stage": None}
     start_time = time.perf_counter()
     req_count = 0
     err_count = 0
 
     # Filter pipelines
-    if args.pipeline:
+    if resume is not None:
+        planned = [p["name"] for p in resume["plan"]]
+        pipelines = [p for p in pipelines if p.get("name", "unnamed") in planned]
+    elif args.pipeline:
         pipelines = [p for p in pipelines if p.get("name") == args.pipeline]
         if not pipelines:
             log.error(f"Pipeline '{args.pipeline}' not found")
@@ -249,25 +589,339 @@ def main():
     )
     log.info(f"Pipelines: {len(pipelines)}, total planned calls: {total_calls}")
 
-    def run_stage(stage, store):
-        """Execute a single pipeline stage. Returns (requests_made, errors_made)."""
+    try:
+        journal = run_journal.RunJournal(COLLECTED, run_id)
+    except run_journal.JournalBusy as e:
+        log.error(f"{e}; not resuming it")
+        return 1
+    if resume is None:
+        journal.write({
+            "t": "start", "run_id": run_id, "pid": os.getpid(),
+            "plan": [
+                {"name": p.get("name", "unnamed"), "calls": [s.get("calls", 1) for s in p.get("stages", [])]}
+                for p in pipelines
+            ],
+        })
+
+    def claim(op, body, corpus_dedup: bool = False, fresh: bool = False) -> str | None:
+        """Return the dedup key for body, or None if this outcome is already finalized.
+
+        Checks this run's outcomes, then the persistent index (unless fresh, for
+        requests that must hit the live API). corpus_dedup also skips bodies that
+        already have a pair in the corpus index.
+        """
+        dedup_key = f"{op}:{body_hash(body)}"
+        if dedup_key in finalized:
+            log.debug(f"    {op} skipped (duplicate)")
+            return None
+        if not fresh and prior.contains(dedup_key, reverify):
+            log.debug(f"    {op} skipped (finalized in an earlier run)")
+            return None
+        if corpus_dedup and corpus_index.has_hash(index, op, body):
+            log.debug(f"    {op} skipped (already in corpus)")
+            return None
+        return dedup_key
+
+    def replay(op, body, extract, store):
+        """Feed store from the saved pair of a skipped body. Returns the response or None."""
+        dedup_key = f"{op}:{body_hash(body)}"
+        if dedup_key in replayed:
+            return None
+        nnn = corpus_index.pair_for_body(index, op, body)
+        if nnn is None:
+            return None
+        try:
+            resp = jsonio.read(COLLECTED / op / f"resp_{nnn:03d}.json")
+        except (json.JSONDecodeError, OSError):
+            return None
+        replayed.add(dedup_key)
+        extract_into_store(extract, resp, body, store)
+        log.debug(f"    {op} replayed resp_{nnn:03d} from corpus")
+        return resp
+
+    # Per-op response size caps (stage "max_bytes"); spilled bodies without a cache wait in spill_dir.
+    size_caps = {
+        s["operation"]: int(s["max_bytes"]) for p in pipelines for s in p.get("stages", []) if s.get("max_bytes")
+    }
+    spill_dir = COLLECTED / INCOMING_DIR / run_id
+
+    def fetch(op, url, body):
+        """(response, blob) for one request; see post()."""
+        resp, blob = post(url, body, http_cache, size_caps.get(op, max_response_bytes), spill_dir)
+        if is_error(resp) and resp["_error"] == "too_large":
+            log.warning(f"    {op}: response {resp['_body']}, abandoned (raise --max-response-mb or max_bytes)")
+        if args.delay > 0:
+            time.sleep(args.delay)
+        return resp, blob
+
+    def language_variants(op, body) -> list[tuple[int, str, dict]]:
+        """(lang, dedup_key, body) for the other --languages variants of body not yet finalized."""
+        param = language_param(body) if args.languages else None
+        if param is None:
+            return []
+        variants = []
+        for lang in args.languages:
+            if lang == body[param]:
+                continue
+            variant = {**body, param: lang}
+            dedup_key = claim(op, variant)
+            if dedup_key is not None:
+                variants.append((lang, dedup_key, variant))
+        return variants
+
+    def send(op, url, planned, extract, store, workers: int = 1) -> list:
+        """Fetch and record planned (dedup_key, body) requests plus their language variants.
+
+        Without --languages (and with workers=1) this is a plain fetch + record per
+        body. Otherwise every body and its variants are fetched concurrently; the
+        primary is recorded (and extracted) first, then the variants linked to it.
+        Returns the primary responses in order.
+        """
+        if not planned:
+            return []
+        groups = [(key, body, language_variants(op, body)) for key, body in planned]
+        bodies = [b for _, body, variants in groups for b in [body] + [v[2] for v in variants]]
+        if len(bodies) == 1:
+            resps = [fetch(op, url, bodies[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=workers * math.ceil(len(bodies) / len(groups))) as pool:
+                resps = list(pool.map(lambda b: fetch(op, url, b), bodies))
+        out = []
+        it = iter(resps)
+        for key, body, variants in groups:
+            resp, blob = next(it)
+            param = language_param(body) if variants else None
+            req = record(op, key, body, resp, extract, store, lang=body[param] if param else None, blob=blob)
+            for lang, variant_key, variant in variants:
+                variant_resp, variant_blob = next(it)
+                record(op, variant_key, variant, variant_resp, {}, store, lang=lang, group=req, blob=variant_blob)
+            out.append(resp)
+        return out
+
+    def extract_into_store(extract, resp, body, store):
+        """Populate store from a successful response using the stage's extract spec."""
+        for store_key, extractor in extract.items():
+            if isinstance(extractor, str):
+                ids = jp_extract(resp, extractor)
+                store.setdefault(store_key, []).extend(ids)
+            elif isinstance(extractor, dict) and "from" in extractor:
+                parent_expr = jp_parse(extractor["from"])
+                pick = extractor.get("pick", {})
+                inject_req = extractor.get("inject_request", {})
+                for match in parent_expr.find(resp):
+                    obj = match.value
+                    row = {}
+                    for field_key, sub_path in pick.items():
+                        sub_expr = jp_parse(sub_path)
+                        sub_matches = sub_expr.find(obj)
+                        if sub_matches and sub_matches[0].value is not None and sub_matches[0].value != "":
+                            row[field_key] = sub_matches[0].value
+                    # Inject fields from the request body into extracted rows
+                    for field_key, req_param in inject_req.items():
+                        val = body.get(req_param)
+                        if val is not None:
+                            row[field_key] = val
+                    if len(row) == len(pick) + len(inject_req):
+                        store.setdefault(store_key, []).append(row)
+
+    def record(op, dedup_key, body, resp, extract, store, lang=None, group=None, blob=None) -> str:
+        """Save one request/response outcome and extract IDs from successes. Returns the req path.
+
+        lang/group link a --languages variant to its primary pair in the journal. blob is
+        the spilled body of a large response, linked or moved into place instead of
+        re-encoding resp.
+        """
         nonlocal req_count, err_count, globals_
+        prof.tick()
 
+        op_dir = COLLECTED / op
+        n = op_counters.get(op, index["ops"].get(op, {}).get("max_nnn", 0))
+        while True:
+            n += 1
+            try:
+                fd = os.open(op_dir / f"req_{n:03d}.json", os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+                break
+            except FileExistsError:
+                continue
+        op_counters[op] = n
+        nnn = f"{n:03d}"
+
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(jsonio.dumps(body))
+
+        req_count += 1
+        if cov is not None and group is None:
+            cov.observe(op, body, resp, error=is_error(resp))
+        if is_error(resp):
+            err_count += 1
+            log.warning(f"    {op} req_{nnn} -> ERR {resp.get('_error', '?')}")
+            log.debug(f"    {op} req_{nnn} error: {resp.get('_body', '')[:200]}")
+            if is_permanent_client_error(resp):
+                finalized.add(dedup_key)
+                prior.add(dedup_key, dedup_index.CLIENT_ERROR)
+            (ERRORS / op / f"err_{nnn}.json").write_text(
+                jsonio.dumps(resp), encoding="utf-8",
+            )
+            journal.write({
+                "t": "error", **current, "req": f"{op}/req_{nnn}.json", "error": f"{op}/err_{nnn}.json",
+            })
+            return f"{op}/req_{nnn}.json"
+
+        finalized.add(dedup_key)
+        prior.add(dedup_key, dedup_index.OK)
+        log.debug(f"    {op} req_{nnn} -> OK")
+        if blob is not None:
+            place_blob(blob, op_dir / f"resp_{nnn}.json", shared=http_cache is not None)
+        else:
+            (op_dir / f"resp_{nnn}.json").write_text(
+                jsonio.dumps(resp), encoding="utf-8",
+            )
+        run_pairs.append({
+            "req": f"{op}/req_{nnn}.json", "resp": f"{op}/resp_{nnn}.json",
+        })
+        if lang is not None:
+            run_pairs[-1]["lang"] = lang
+        if group is not None:
+            run_pairs[-1]["group"] = group
+        journal.write({"t": "pair", **current, **run_pairs[-1]})
+
+        corpus_index.add_pair(index, op, n, body, resp)
+        id_index.add_pair(ids, op, n, body, resp)
+
+        # Extract IDs into store for later stages
+        extract_into_store(extract, resp, body, store)
+
+        if op == "GetAllStructuresForFilter" and "current_structure" not in globals_:
+            globals_ = bootstrap_structure(http_cache, log, bootstrap_url)
+        return run_pairs[-1]["req"]
+
+    def run_paginated_stage(stage, store, url, max_pages):
+        """Fetch page 1, read the total count, then fetch the planned remaining pages concurrently."""
+        op = stage["operation"]
+        params = stage.get("params", {})
+        extract = stage.get("extract", {})
+        spec = stage["paginate"] if isinstance(stage["paginate"], dict) else {}
+
+        names = pagination_params(params, spec)
+        if names is None:
+            log.warning(f"  {op}: paginate needs Page/Rows or CurrentPage/ItemsPerPage params, skipping")
+            return
+        page_key, size_key = names
+
+        base = draw(op, params, store)
+        if spec.get("rows"):
+            base[size_key] = int(spec["rows"])
+        page_size = base.get(size_key)
+
+        # Snapshot before page 1 lands in the index, so this run's items don't count as seen.
+        known_ids = set(corpus_index.known_item_ids(index, op))
+        date_field = spec.get("date_field")
+        known_date = corpus_index.latest_date(index, op, date_field) if date_field else None
+
+        def page_already_seen(page_resp) -> bool:
+            items = corpus_index.listing_items(page_resp)
+            if any(corpus_index.item_id(it) in known_ids for it in items):
+                return True
+            if known_date is not None and items:
+                dates = [corpus_index.aspdate_ms(it.get(date_field)) for it in items]
+                dates = [d for d in dates if d is not None]
+                return bool(dates) and max(dates) <= known_date
+            return False
+
+        first = dict(base)
+        first[page_key] = 1
+        # Delta sync must see the live first page; otherwise a finalized page 1 is
+        # replayed from the corpus to get the total.
+        dedup_key = claim(op, first, fresh=args.incremental)
+        if dedup_key is None:
+            resp = replay(op, first, extract, store)
+            if resp is None:
+                return
+        else:
+            resp = send(op, url, [(dedup_key, first)], extract, store)[0]
+        if is_error(resp):
+            return
+
+        total_field = spec.get("total", "TotalItems")
+        total = resp.get(total_field) if isinstance(resp, dict) else None
+        if not isinstance(total, int) or not isinstance(page_size, int) or page_size <= 0:
+            log.warning(f"  {op}: no usable {total_field} on page 1, stopping there")
+            return
+
+        n_pages = max(1, math.ceil(total / page_size))
+        if args.incremental:
+            # Delta sync: walk pages in order until one contains already-collected items.
+            if page_already_seen(resp):
+                log.info(f"  {op}: page 1 reaches already-collected items, stopping")
+                return
+            last = min(n_pages, max_pages) if max_pages else n_pages
+            for page in range(2, last + 1):
+                body = dict(base)
+                body[page_key] = page
+                key = claim(op, body, fresh=True)
+                if key is None:
+                    continue
+                page_resp = send(op, url, [(key, body)], extract, store)[0]
+                if is_error(page_resp) or not corpus_index.listing_items(page_resp):
+                    return
+                if page_already_seen(page_resp):
+                    log.info(f"  {op}: page {page} reaches already-collected items, stopping")
+                    return
+            return
+
+        pages = plan_pages(total, page_size, max_pages, spec.get("sample", "stratified"))
+        log.info(f"  {op}: {total_field}={total}, {n_pages} page(s) of {page_size}; fetching {len(pages)} more")
+
+        planned = []
+        for page in pages:
+            body = dict(base)
+            body[page_key] = page
+            key = claim(op, body)
+            if key is not None:
+                planned.append((key, body))
+            else:
+                replay(op, body, extract, store)
+        if not planned:
+            return
+
+        workers = max(1, int(spec.get("concurrency", PAGINATE_CONCURRENCY)))
+        send(op, url, planned, extract, store, workers)
+
+    def run_stage(stage, store):
+        """Execute a single pipeline stage. Returns (requests_made, errors_made)."""
         op = stage["operation"]
         calls = stage.get("calls", 1)
         params = stage.get("params", {})
         extract = stage.get("extract", {})
-        url = stage.get("url", DEFAULT_URL)
+        url = rebase_url(stage.get("url", DEFAULT_URL), args.base_url)
 
         op_dir = COLLECTED / op
         op_dir.mkdir(parents=True, exist_ok=True)
         (ERRORS / op).mkdir(parents=True, exist_ok=True)
 
+        reqs_before, errs_before = req_count, err_count
+
+        if stage.get("paginate"):
+            max_pages = (stage["paginate"].get("max_pages") if isinstance(stage["paginate"], dict) else None) or calls
+            log.info(f"  {op} (paginate, max pages={max_pages})")
+            run_paginated_stage(stage, store, url, max_pages)
+            log.info(f"    Progress: {req_count} sent, {err_count} err")
+            return req_count - reqs_before, err_count - errs_before
+
+        # Incremental: drop source IDs this op already has pairs for; skip bodies already
+        # in the corpus unless the stage feeds later stages (those must re-run).
+        source_store = store
+        if args.incremental:
+            source_store = filter_known_sources(
+                params, store, lambda param: corpus_index.known_request_values(index, op, param),
+            )
+        corpus_dedup = args.incremental and not extract
+
         # Cap calls to available source IDs
         source_fields = [v["source"] for v in params.values() if isinstance(v, dict) and "source" in v]
         if source_fields:
             store_keys = set(sf.split(".")[0] for sf in source_fields)
-            available = min(len(store.get(sk, [])) for sk in store_keys)
+            available = min(len(source_store.get(sk, [])) for sk in store_keys)
             actual_calls = min(calls, available)
             if actual_calls == 0:
                 log.warning(f"  {op}: no IDs available, skipping")
@@ -278,82 +932,28 @@ def main():
             actual_calls = calls
 
         log.info(f"  {op} (n={actual_calls})")
-        stage_reqs = 0
-        stage_errs = 0
 
         for _ in range(actual_calls):
-            body = generate_body(params, store, globals_)
-
-            dedup_key = f"{op}:{body_hash(body)}"
-            if dedup_key in finalized:
-                log.debug(f"    {op} skipped (duplicate)")
+            # Draw a few bodies so an already-finalized one doesn't waste the call.
+            dedup_key = None
+            drawn: set[str] = set()
+            for _attempt in range(REGENERATE_ATTEMPTS):
+                body = draw(op, params, source_store)
+                h = body_hash(body)
+                if h in drawn:
+                    break
+                drawn.add(h)
+                dedup_key = claim(op, body, corpus_dedup)
+                if dedup_key is not None:
+                    break
+                if extract:
+                    replay(op, body, extract, store)
+            if dedup_key is None:
                 continue
-
-            op_counters[op] = op_counters.get(op, 0) + 1
-            nnn = f"{op_counters[op]:03d}"
-
-            resp = post(url, body, use_cache, cache_get, cache_set)
-            time.sleep(DELAY)
-
-            (op_dir / f"req_{nnn}.json").write_text(
-                json.dumps(body, ensure_ascii=False, indent=2), encoding="utf-8",
-            )
-
-            req_count += 1
-            stage_reqs += 1
-            if is_error(resp):
-                err_count += 1
-                stage_errs += 1
-                log.warning(f"    {op} req_{nnn} -> ERR {resp.get('_error', '?')}")
-                log.debug(f"    {op} req_{nnn} error: {resp.get('_body', '')[:200]}")
-                if is_permanent_client_error(resp):
-                    finalized.add(dedup_key)
-                (ERRORS / op / f"err_{nnn}.json").write_text(
-                    json.dumps(resp, ensure_ascii=False, indent=2), encoding="utf-8",
-                )
-                errors_manifest["errors"].append({
-                    "req": f"{op}/req_{nnn}.json", "error": f"{op}/err_{nnn}.json",
-                })
-            else:
-                finalized.add(dedup_key)
-                log.debug(f"    {op} req_{nnn} -> OK")
-                (op_dir / f"resp_{nnn}.json").write_text(
-                    json.dumps(resp, ensure_ascii=False, indent=2), encoding="utf-8",
-                )
-                run_pairs.append({
-                    "req": f"{op}/req_{nnn}.json", "resp": f"{op}/resp_{nnn}.json",
-                })
-
-                # Extract IDs into store for later stages
-                for store_key, extractor in extract.items():
-                    if isinstance(extractor, str):
-                        ids = jp_extract(resp, extractor)
-                        store.setdefault(store_key, []).extend(ids)
-                    elif isinstance(extractor, dict) and "from" in extractor:
-                        parent_expr = jp_parse(extractor["from"])
-                        pick = extractor.get("pick", {})
-                        inject_req = extractor.get("inject_request", {})
-                        for match in parent_expr.find(resp):
-                            obj = match.value
-                            row = {}
-                            for field_key, sub_path in pick.items():
-                                sub_expr = jp_parse(sub_path)
-                                sub_matches = sub_expr.find(obj)
-                                if sub_matches and sub_matches[0].value is not None and sub_matches[0].value != "":
-                                    row[field_key] = sub_matches[0].value
-                            # Inject fields from the request body into extracted rows
-                            for field_key, req_param in inject_req.items():
-                                val = body.get(req_param)
-                                if val is not None:
-                                    row[field_key] = val
-                            if len(row) == len(pick) + len(inject_req):
-                                store.setdefault(store_key, []).append(row)
-
-                if op == "GetAllStructuresForFilter" and "current_structure" not in globals_:
-                    globals_ = bootstrap_structure(use_cache, cache_get, cache_set, log)
+            send(op, url, [(dedup_key, body)], extract, store)
 
         log.info(f"    Progress: {req_count} sent, {err_count} err")
-        return stage_reqs, stage_errs
+        return req_count - reqs_before, err_count - errs_before
 
     def _needs_from_store(stage) -> set[str]:
         """Return store keys that a stage's downstream stages need."""
@@ -368,15 +968,71 @@ def main():
         """Return store keys that a stage's extract populates."""
         return set(stage.get("extract", {}).keys())
 
+    def restore_stage(name, i, stage, store):
+        """Re-extract a stage's journaled pairs into the store (resume)."""
+        for ev in resume["pairs"].get((name, i), []):
+            try:
+                body = jsonio.read(COLLECTED / ev["req"])
+                resp = jsonio.read(COLLECTED / ev["resp"])
+            except (json.JSONDecodeError, OSError):
+                continue
+            extract_into_store(stage.get("extract", {}), resp, body, store)
+
+    def seed_stage(stage, store) -> bool:
+        """Fill a stage's store keys from the ID index (--seed-from-index). True if all got values."""
+        op = stage["operation"]
+        extract = stage.get("extract", {})
+        seeded: dict[str, list] = {}
+        for store_key, extractor in extract.items():
+            path = id_index.index_path(extractor) if isinstance(extractor, str) else None
+            values = id_index.ids_at(ids, op, path) if path else []
+            if not values:
+                # Not an ID path (or a row extractor): replay the op's indexed pairs.
+                rows: dict[str, list] = {}
+                for nnn in id_index.pairs_of(ids, op):
+                    try:
+                        body = jsonio.read(COLLECTED / op / f"req_{nnn:03d}.json")
+                        resp = jsonio.read(COLLECTED / op / f"resp_{nnn:03d}.json")
+                    except (json.JSONDecodeError, OSError):
+                        continue
+                    extract_into_store({store_key: extractor}, resp, body, rows)
+                values = rows.get(store_key, [])
+            if not values:
+                return False
+            seeded[store_key] = values
+        for store_key, values in seeded.items():
+            store.setdefault(store_key, []).extend(values)
+        log.info(f"  {op}: seeded from ID index, skipped ("
+                 + ", ".join(f"{k}={len(v)}" for k, v in seeded.items()) + ")")
+        return True
+
     for pipeline in pipelines:
         name = pipeline.get("name", "unnamed")
         stages = pipeline.get("stages", [])
         store: dict[str, list] = {}
 
+        if resume is not None and name in resume["pipeline_done"]:
+            log.info(f"Pipeline: {name} finished before resume, skipping")
+            continue
         log.info(f"Pipeline: {name} ({len(stages)} stages)")
+        current["pipeline"] = name
 
         for i, stage in enumerate(stages):
+            current["stage"] = i
+            if resume is not None:
+                restore_stage(name, i, stage, store)
+                if (name, i) in resume["stage_done"]:
+                    continue
+                sent = resume["sent"].get((name, i), 0)
+                if sent:
+                    stage = {**stage, "calls": max(0, stage.get("calls", 1) - sent)}
+                    log.info(f"  {stage['operation']}: {sent} sent before resume, {stage['calls']} left")
+            # Not journaled as done: a resumed run seeds again rather than restoring nothing.
+            if args.seed_from_index and stage.get("extract") and seed_stage(stage, store):
+                continue
             run_stage(stage, store)
+            ids.commit()
+            journal.write({"t": "stage_done", "pipeline": name, "stage": i})
 
             # Check if any later stage needs store keys that this stage produces
             # but got nothing. If so, retry this stage and its feeder (x2, x2, x2).
@@ -401,9 +1057,11 @@ def main():
                 multiplier = 2 ** retry
                 log.info(f"  Retry {retry}/3: store keys {empty_keys} empty, re-running stages 0..{i} (x{multiplier})")
                 for j in range(i + 1):
+                    current["stage"] = j
                     retry_stage = dict(stages[j])
                     retry_stage["calls"] = stages[j].get("calls", 1) * multiplier
                     run_stage(retry_stage, store)
+                current["stage"] = i
                 empty_keys = [k for k in produced if not store.get(k)]
                 if not empty_keys:
                     log.info(f"  Retry {retry}/3: success, store keys populated")
@@ -412,13 +1070,33 @@ def main():
                 if empty_keys:
                     log.warning(f"  After 3 retries, store keys still empty: {empty_keys}")
 
+        journal.write({"t": "pipeline_done", "pipeline": name})
+        run_journal.compact(COLLECTED)
+        if cov is not None:
+            cov.save()
+
     elapsed = time.perf_counter() - start_time
     log.info(f"Done: {len(run_pairs)} pairs saved, {err_count} errors, {elapsed:.1f}s")
 
-    manifest["runs"].append({"run_id": run_id, "pairs": run_pairs})
-    COLLECTED.mkdir(parents=True, exist_ok=True)
-    (COLLECTED / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
-    (COLLECTED / "errors_manifest.json").write_text(json.dumps(errors_manifest, indent=2), encoding="utf-8")
+    if cov is not None:
+        for line in cov.summary():
+            log.info(f"  Coverage: {line}")
+        cov.end_run(run_id)
+        cov.save()
+
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    try:
+        spill_dir.parent.rmdir()  # unless another run is still spilling
+    except OSError:
+        pass
+    journal.write({"t": "end"})
+    journal.close()
+    run_journal.compact(COLLECTED)
+    corpus_index.save_merged(index, index_path)
+    ids.commit()
+    ids.close()
+    prior.compact()
+    prior.close()
 
     return 0
 
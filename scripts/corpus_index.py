@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Persistent per-operation index over collected/ (collected/index.json).
+
+Records, for every operation with saved pairs:
+  - hashes:       request body hash (same hash as collect.body_hash) -> req_NNN number
+  - request_ids:  scalar request param values already asked for (SittingId, MaterialId, ...)
+  - item_ids:     Id/UserId of listing items (elements of top-level response arrays)
+  - latest_dates: newest AspDate (ms) per item field (SittingDate, RegistrationDate, ...)
+  - max_nnn:      highest req_NNN indexed, so updates only scan new files
+
+collect.py --incremental uses it to skip detail IDs already in the corpus and to
+stop paginating listings at the first page containing already-seen items.
+
+Run: python scripts/corpus_index.py [--rebuild]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+import jsonio
+from filelock import locked
+
+ROOT = Path(__file__).parent.parent
+COLLECTED = ROOT / "collected"
+INDEX_PATH = COLLECTED / "index.json"
+
+INDEX_VERSION = 2
+ASPDATE_RE = re.compile(r"^/Date\((-?\d+)(?:[+-]\d{4})?\)/$")
+_SKIP_PARAMS = {"methodName", "MethodName"}
+
+
+def _body_hash(body) -> str:
+    # Must match collect.body_hash.
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def aspdate_ms(value) -> int | None:
+    """Milliseconds from an AspDate string (/Date(ms)/), else None."""
+    if not isinstance(value, str):
+        return None
+    m = ASPDATE_RE.match(value)
+    return int(m.group(1)) if m else None
+
+
+def listing_items(resp) -> list[dict]:
+    """Elements of top-level arrays: the response itself, or array-valued keys of a dict response."""
+    if isinstance(resp, list):
+        return [x for x in resp if isinstance(x, dict)]
+    out = []
+    if isinstance(resp, dict):
+        for v in resp.values():
+            if isinstance(v, list):
+                out.extend(x for x in v if isinstance(x, dict))
+    return out
+
+
+def item_id(item: dict):
+    for key in ("Id", "UserId"):
+        val = item.get(key)
+        if val not in (None, ""):
+            return val
+    return None
+
+
+def _empty_op() -> dict:
+    return {"max_nnn": 0, "hashes": {}, "request_ids": {}, "item_ids": set(), "latest_dates": {}}
+
+
+def empty_index() -> dict:
+    return {"version": INDEX_VERSION, "ops": {}}
+
+
+def load(path: Path = INDEX_PATH) -> dict:
+    """Load the index (sets in memory). Missing or unreadable file gives an empty index."""
+    if not path.exists():
+        return empty_index()
+    try:
+        raw = jsonio.read(path)
+    except (json.JSONDecodeError, OSError):
+        return empty_index()
+    if raw.get("version") != INDEX_VERSION:
+        return empty_index()
+    index = empty_index()
+    for op, entry in (raw.get("ops") or {}).items():
+        index["ops"][op] = {
+            "max_nnn": int(entry.get("max_nnn", 0)),
+            "hashes": dict(entry.get("hashes") or {}),
+            "request_ids": {k: set(v) for k, v in (entry.get("request_ids") or {}).items()},
+            "item_ids": set(entry.get("item_ids", [])),
+            "latest_dates": dict(entry.get("latest_dates") or {}),
+        }
+    return index
+
+
+def save(index: dict, path: Path = INDEX_PATH):
+    """Write the index atomically."""
+    out = {"version": INDEX_VERSION, "ops": {}}
+    for op, entry in sorted(index["ops"].items()):
+        out["ops"][op] = {
+            "max_nnn": entry["max_nnn"],
+            "hashes": dict(sorted(entry["hashes"].items())),
+            "request_ids": {k: sorted(v, key=str) for k, v in sorted(entry["request_ids"].items())},
+            "item_ids": sorted(entry["item_ids"], key=str),
+            "latest_dates": dict(sorted(entry["latest_dates"].items())),
+        }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.parent / f".{path.name}.tmp-{os.getpid()}-{time.time_ns()}"
+    tmp.write_bytes(jsonio.dump_bytes(out))
+    os.replace(tmp, path)
+
+
+def merge(index: dict, other: dict):
+    """Fold `other` into `index` (union of everything; used when another process saved first)."""
+    for op, theirs in other["ops"].items():
+        entry = index["ops"].setdefault(op, _empty_op())
+        entry["max_nnn"] = max(entry["max_nnn"], theirs["max_nnn"])
+        entry["hashes"].update(theirs["hashes"])
+        for k, vals in theirs["request_ids"].items():
+            entry["request_ids"].setdefault(k, set()).update(vals)
+        entry["item_ids"].update(theirs["item_ids"])
+        for k, ms in theirs["latest_dates"].items():
+            if ms > entry["latest_dates"].get(k, float("-inf")):
+                entry["latest_dates"][k] = ms
+
+
+def save_merged(index: dict, path: Path = INDEX_PATH):
+    """Merge with the index on disk and save, under a lock (safe for concurrent collect runs)."""
+    with locked(path.parent / f".{path.name}.lock"):
+        merge(index, load(path))
+        save(index, path)
+
+
+def add_pair(index: dict, op: str, nnn: int, body, resp):
+    """Record one successful pair."""
+    entry = index["ops"].setdefault(op, _empty_op())
+    entry["max_nnn"] = max(entry["max_nnn"], nnn)
+    entry["hashes"][_body_hash(body)] = nnn
+    if isinstance(body, dict):
+        for k, v in body.items():
+            if k not in _SKIP_PARAMS and isinstance(v, (str, int)) and not isinstance(v, bool):
+                entry["request_ids"].setdefault(k, set()).add(v)
+    for item in listing_items(resp):
+        iid = item_id(item)
+        if isinstance(iid, (str, int)):
+            entry["item_ids"].add(iid)
+        for k, v in item.items():
+            ms = aspdate_ms(v)
+            if ms is not None and ms > entry["latest_dates"].get(k, float("-inf")):
+                entry["latest_dates"][k] = ms
+
+
+def update(index: dict, collected_dir: Path = COLLECTED) -> int:
+    """Index pairs newer than each op's max_nnn. Returns the number of pairs added."""
+    added = 0
+    if not collected_dir.exists():
+        return 0
+    for op_dir in sorted(p for p in collected_dir.iterdir() if p.is_dir()):
+        since = index["ops"].get(op_dir.name, {}).get("max_nnn", 0)
+        for req_path in op_dir.glob("req_*.json"):
+            try:
+                nnn = int(req_path.stem.split("_")[1])
+            except (ValueError, IndexError):
+                continue
+            resp_path = op_dir / f"resp_{req_path.stem.split('_')[1]}.json"
+            if nnn <= since or not resp_path.exists():
+                continue
+            try:
+                body = jsonio.read(req_path)
+                resp = jsonio.read(resp_path)
+            except (json.JSONDecodeError, OSError):
+                continue
+            add_pair(index, op_dir.name, nnn, body, resp)
+            added += 1
+    return added
+
+
+def known_request_values(index: dict, op: str, param: str) -> set:
+    return index["ops"].get(op, {}).get("request_ids", {}).get(param, set())
+
+
+def known_item_ids(index: dict, op: str) -> set:
+    return index["ops"].get(op, {}).get("item_ids", set())
+
+
+def latest_date(index: dict, op: str, field: str) -> int | None:
+    return index["ops"].get(op, {}).get("latest_dates", {}).get(field)
+
+
+def has_hash(index: dict, op: str, body) -> bool:
+    return _body_hash(body) in index["ops"].get(op, {}).get("hashes", {})
+
+
+def pair_for_body(index: dict, op: str, body) -> int | None:
+    """req_NNN number of the saved pair for this exact body, if any."""
+    return index["ops"].get(op, {}).get("hashes", {}).get(_body_hash(body))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build or update collected/index.json.")
+    parser.add_argument("--rebuild", action="store_true", help="Re-index everything from scratch")
+    parser.add_argument("--collected", type=Path, default=COLLECTED)
+    args = parser.parse_args(argv)
+
+    path = args.collected / "index.json"
+    index = empty_index() if args.rebuild else load(path)
+    t0 = time.perf_counter()
+    added = update(index, args.collected)
+    save(index, path)
+    print(f"Indexed {added} new pair(s) in {time.perf_counter() - t0:.2f}s -> {path}")
+    for op, entry in sorted(index["ops"].items()):
+        print(f"  {op}: {len(entry['hashes'])} bodies, {len(entry['item_ids'])} item IDs, max req_{entry['max_nnn']:03d}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Coverage-guided parameter choice for collect.py (collected/coverage.json).
+
+Every randomly drawn parameter value (range, current_structure_year, store
+sources, properties of object params) is an arm, per operation and parameter
+path ("TypeId", "model.Month"). Each response scores the arms of the values
+that produced it:
+  - new:    response shape (scheduler.shape) not seen before for the op -> 1
+  - ok:     a shape already seen -> 0.5
+  - empty:  Items: [] / d: [] / TotalItems: 0 -> 0
+  - error:  any error response -> 0
+
+collect draws each value by Thompson sampling (Beta(1 + reward, 1 + misses)),
+so filters and years that keep producing new shapes come up more often, dead
+ones (always empty or failing) rarely, and untried values get explored.
+Parameters with more than MAX_VALUES candidates (detail IDs) are drawn
+uniformly and not tracked.
+
+The state and a per-run yield history (sent/new/empty/error per op) are kept
+across runs and merged under a lock, like index.json.
+
+Run: python scripts/coverage.py [--op GetAllSittings] [--runs 5]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import jsonio
+from filelock import locked
+from scheduler import shape
+
+ROOT = Path(__file__).parent.parent
+COLLECTED = ROOT / "collected"
+COVERAGE_PATH = COLLECTED / "coverage.json"
+
+COVERAGE_VERSION = 1
+MAX_VALUES = 256  # candidates per parameter (above: drawn uniformly) and values tracked per parameter
+MAX_SHAPES = 2000  # shape signatures remembered per op
+MAX_RUNS = 50  # run summaries kept
+DEAD_MIN_TRIES = 3
+
+REWARD = {"new": 1.0, "ok": 0.5, "empty": 0.0, "error": 0.0}
+# Per-run counts per op: [sent, new, empty, error]
+_RUN_COUNTS = {"new": 1, "empty": 2, "error": 3}
+# Arm stats: [tries, reward, new, empty, error]
+_TRIES, _REWARD, _NEW, _EMPTY, _ERROR = range(5)
+
+
+def _vkey(value) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _at(body, path: str):
+    for part in path.split("."):
+        if not isinstance(body, dict):
+            return None
+        body = body.get(part)
+    return body
+
+
+def _signature(resp) -> str:
+    return hashlib.sha1("\n".join(sorted(shape(resp))).encode("utf-8")).hexdigest()[:16]
+
+
+def is_empty(resp) -> bool:
+    """An empty listing: [], Items: [], d: [] or TotalItems: 0."""
+    if isinstance(resp, list):
+        return not resp
+    if not isinstance(resp, dict):
+        return resp is None
+    if resp.get("TotalItems") == 0:
+        return True
+    return any(resp.get(k) == [] for k in ("Items", "d")) and len(resp) <= 2
+
+
+def load(path: Path = COVERAGE_PATH) -> dict:
+    state = {"version": COVERAGE_VERSION, "ops": {}, "runs": []}
+    if path.exists():
+        try:
+            data = jsonio.read(path)
+        except (OSError, json.JSONDecodeError):
+            return state
+        if data.get("version") == COVERAGE_VERSION:
+            state.update(data)
+    return state
+
+
+def _merge(dst: dict, delta: dict):
+    """Add delta's arm stats, shapes and runs into dst (both in state form)."""
+    for op, entry in delta["ops"].items():
+        target = dst["ops"].setdefault(op, {"shapes": [], "arms": {}})
+        shapes = set(target["shapes"])
+        target["shapes"] += [s for s in entry["shapes"] if s not in shapes][:max(0, MAX_SHAPES - len(shapes))]
+        for name, values in entry["arms"].items():
+            arms = target["arms"].setdefault(name, {})
+            for v, stats in values.items():
+                if v not in arms and len(arms) >= MAX_VALUES:
+                    continue
+                have = arms.setdefault(v, [0, 0.0, 0, 0, 0])
+                for i, x in enumerate(stats):
+                    have[i] += x
+    dst["runs"] = (dst["runs"] + delta["runs"])[-MAX_RUNS:]
+
+
+class Coverage:
+    """Coverage state for one collect run: choose() values, observe() responses, save() deltas."""
+
+    def __init__(self, path: Path = COVERAGE_PATH):
+        self.path = path
+        self.state = load(path)
+        self.delta = {"ops": {}, "runs": []}
+        self.shapes = {op: set(e["shapes"]) for op, e in self.state["ops"].items()}
+        self.explored: dict[str, set[str]] = {}  # op -> parameter paths drawn through choose()
+        self.run: dict[str, list[int]] = {}  # op -> [sent, new, empty, error] this run
+
+    def chooser(self, op: str):
+        return lambda name, candidates, key=None: self.choose(op, name, candidates, key)
+
+    def choose(self, op: str, name: str, candidates: list, key=None):
+        """Thompson-sample one of candidates for parameter `name` (key(c) is the value sent)."""
+        if len(candidates) > MAX_VALUES:
+            return random.choice(candidates)
+        self.explored.setdefault(op, set()).add(name)
+        arms = self.state["ops"].get(op, {}).get("arms", {}).get(name, {})
+        best, best_theta = None, -1.0
+        for c in candidates:
+            stats = arms.get(_vkey(c if key is None else key(c)))
+            tries, reward = (stats[_TRIES], stats[_REWARD]) if stats else (0, 0.0)
+            theta = random.betavariate(1 + reward, 1 + tries - reward)
+            if theta > best_theta:
+                best, best_theta = c, theta
+        return best
+
+    def observe(self, op: str, body, resp, error: bool = False) -> str:
+        """Classify resp and credit it to the explored values in body. Returns the outcome."""
+        if error:
+            outcome = "error"
+        elif is_empty(resp):
+            outcome = "empty"
+        else:
+            sig = _signature(resp)
+            seen = self.shapes.setdefault(op, set())
+            outcome = "ok" if sig in seen else "new"
+            if outcome == "new" and len(seen) < MAX_SHAPES:
+                seen.add(sig)
+                self._entry(self.state, op)["shapes"].append(sig)
+                self._entry(self.delta, op)["shapes"].append(sig)
+        counts = self.run.setdefault(op, [0, 0, 0, 0])
+        counts[0] += 1
+        if outcome in _RUN_COUNTS:
+            counts[_RUN_COUNTS[outcome]] += 1
+        stat = [1, REWARD[outcome], outcome == "new", outcome == "empty", outcome == "error"]
+        for name in self.explored.get(op, ()):
+            value = _at(body, name)
+            if value is None:
+                continue
+            vkey = _vkey(value)
+            known = self._entry(self.state, op)["arms"].get(name, {})
+            if vkey not in known and len(known) >= MAX_VALUES:
+                continue  # e.g. detail IDs: each is asked for once, nothing to learn per value
+            for target in (self.state, self.delta):
+                arms = self._entry(target, op)["arms"].setdefault(name, {})
+                have = arms.setdefault(vkey, [0, 0.0, 0, 0, 0])
+                for i, x in enumerate(stat):
+                    have[i] += x
+        return outcome
+
+    @staticmethod
+    def _entry(state: dict, op: str) -> dict:
+        return state["ops"].setdefault(op, {"shapes": [], "arms": {}})
+
+    def end_run(self, run_id: str):
+        """Record this run's yield per op (kept in the state's run history)."""
+        run = {"run_id": run_id, "ops": {op: c for op, c in sorted(self.run.items())}}
+        self.state["runs"] = (self.state["runs"] + [run])[-MAX_RUNS:]
+        self.delta["runs"].append(run)
+
+    def save(self):
+        """Merge this run's observations into the file on disk (under a lock) and write it atomically."""
+        if not self.delta["ops"] and not self.delta["runs"]:
+            return
+        with locked(self.path.parent / f".{self.path.name}.lock"):
+            state = load(self.path)
+            _merge(state, self.delta)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.parent / f".{self.path.name}.tmp-{os.getpid()}-{time.time_ns()}"
+            tmp.write_bytes(jsonio.dump_bytes(state))
+            os.replace(tmp, self.path)
+        self.delta = {"ops": {}, "runs": []}
+
+    def summary(self) -> list[str]:
+        """One line per op of this run's yield."""
+        return [
+            f"{op}: {sent} sent, {new} new shapes, {empty} empty, {err} errors"
+            for op, (sent, new, empty, err) in sorted(self.run.items())
+        ]
+
+
+def report(state: dict, op: str | None = None, runs: int = 5, top: int = 3) -> str:
+    lines = []
+    recent = state["runs"][-runs:]
+    for name in sorted(state["ops"]):
+        if op and name != op:
+            continue
+        entry = state["ops"][name]
+        totals = [0, 0, 0, 0]
+        for run in recent:
+            for i, x in enumerate(run["ops"].get(name, ())):
+                totals[i] += x
+        lines.append(f"## {name}: {len(entry['shapes'])} shapes"
+                     f" | last {len(recent)} runs: {totals[0]} sent, {totals[1]} new, {totals[2]} empty, {totals[3]} errors")
+        for param, arms in sorted(entry["arms"].items()):
+            scored = sorted(arms.items(), key=lambda kv: -(1 + kv[1][_REWARD]) / (2 + kv[1][_TRIES]))
+            best = [f"{v} ({s[_NEW]} new/{s[_TRIES]})" for v, s in scored[:top] if s[_NEW]]
+            dead = [v for v, s in arms.items() if s[_TRIES] >= DEAD_MIN_TRIES and s[_REWARD] == 0]
+            parts = [f"  {param}: {len(arms)} values tried"]
+            if best:
+                parts.append("productive " + ", ".join(best))
+            if dead:
+                parts.append(f"dead {len(dead)} ({', '.join(sorted(dead)[:top])}{', ...' if len(dead) > top else ''})")
+            lines.append("; ".join(parts))
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Coverage of collect's parameter space per operation.")
+    parser.add_argument("--op", default=None, help="Only this operation")
+    parser.add_argument("--runs", type=int, default=5, help="Recent collect runs to total")
+    args = parser.parse_args(argv)
+
+    if not COVERAGE_PATH.exists():
+        print(f"No coverage yet ({COVERAGE_PATH.relative_to(ROOT)}); run collect.py first", file=sys.stderr)
+        return 1
+    print(report(load(COVERAGE_PATH), args.op, args.runs))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,192 @@
+"""
+Durable dedup index for collect's finalized outcomes (collected/finalized.idx).
+
+One 16-byte record per finalized request: 64-bit key (from "op:body_hash"),
+unix timestamp, outcome (OK or CLIENT_ERROR). Two files:
+
+  finalized.idx      sorted records behind a small header; memory-mapped, binary
+                     searched, so opening costs O(1) regardless of corpus size
+  finalized.idx.log  append-only journal of records added since the last
+                     compaction; one write per landed pair, torn tails ignored
+
+compact() merges the journal into the sorted file (temp file + os.replace)
+under an exclusive file lock, re-reading both from disk so concurrent collect
+processes don't drop each other's records, then removes the journal. add()
+appends under the same lock held shared and reopens the journal if a
+compaction removed it, so no record lands in a removed file.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+
+from filelock import locked
+
+MAGIC = b"SBDEDUP1"
+HEADER = struct.Struct("<8sQ")  # magic, record count
+RECORD = struct.Struct("<QIB3x")  # key, unix seconds, outcome
+
+OK = 0
+CLIENT_ERROR = 1
+
+
+def key64(key: str) -> int:
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "little")
+
+
+class DedupIndex:
+    """Finalized-request set that survives across runs."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.journal_path = path.parent / f"{path.name}.log"
+        self._file = None
+        self._mm = None
+        self._count = 0
+        self._journal: dict[int, tuple[int, int]] = {}
+        self._journal_fh = None
+        self._open_base()
+        self._load_journal()
+
+    # --- Loading ---
+
+    def _open_base(self):
+        if not self.path.exists() or self.path.stat().st_size < HEADER.size:
+            return
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or HEADER.size + count * RECORD.size > len(self._mm):
+            self._close_base()
+            return
+        self._count = count
+
+    def _read_journal_file(self) -> dict[int, tuple[int, int]]:
+        try:
+            data = self.journal_path.read_bytes()
+        except OSError:
+            return {}
+        usable = len(data) - len(data) % RECORD.size  # ignore a torn trailing write
+        out = {}
+        for off in range(0, usable, RECORD.size):
+            k, ts, outcome = RECORD.unpack_from(data, off)
+            out[k] = (ts, outcome)
+        return out
+
+    def _load_journal(self):
+        self._journal.update(self._read_journal_file())
+
+    def _close_base(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._count = 0
+
+    # --- Lookup ---
+
+    def _base_get(self, k: int) -> tuple[int, int] | None:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mk, ts, outcome = RECORD.unpack_from(self._mm, HEADER.size + mid * RECORD.size)
+            if mk == k:
+                return ts, outcome
+            if mk < k:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def get(self, key: str) -> tuple[int, int] | None:
+        """Return (timestamp, outcome) for a finalized key, else None."""
+        k = key64(key)
+        hit = self._journal.get(k)
+        if hit is not None:
+            return hit
+        return self._base_get(k) if self._count else None
+
+    def contains(self, key: str, max_age_days: dict[int, float | None] | None = None) -> bool:
+        """True if key is finalized and not older than the re-verify age for its outcome.
+
+        max_age_days maps outcome -> days (None = never expires).
+        """
+        hit = self.get(key)
+        if hit is None:
+            return False
+        ts, outcome = hit
+        days = (max_age_days or {}).get(outcome)
+        return days is None or time.time() - ts <= days * 86400
+
+    def __len__(self) -> int:
+        """Distinct keys (a key re-added since the last compaction counts once)."""
+        if not self._count:
+            return len(self._journal)
+        return self._count + sum(1 for k in self._journal if self._base_get(k) is None)
+
+    # --- Updates ---
+
+    def add(self, key: str, outcome: int = OK):
+        """Record a finalized key; appended to the journal immediately."""
+        k = key64(key)
+        ts = int(time.time())
+        self._journal[k] = (ts, outcome)
+        with locked(self._lock_path(), shared=True):
+            if self._journal_fh is not None and not self._journal_current():
+                self._journal_fh.close()  # compacted away by another process
+                self._journal_fh = None
+            if self._journal_fh is None:
+                self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+                self._journal_fh = open(self.journal_path, "ab", buffering=0)
+            self._journal_fh.write(RECORD.pack(k, ts, outcome))
+
+    def _lock_path(self) -> Path:
+        return self.path.parent / f".{self.path.name}.lock"
+
+    def _journal_current(self) -> bool:
+        """True if the open journal handle is still the file at journal_path."""
+        try:
+            return os.stat(self.journal_path).st_ino == os.fstat(self._journal_fh.fileno()).st_ino
+        except OSError:
+            return False
+
+    def compact(self):
+        """Merge the journal into the sorted base file and remove the journal."""
+        with locked(self._lock_path()):
+            on_disk = self._read_journal_file()
+            if not self._journal and not on_disk:
+                return
+            # Re-open the base: another process may have compacted since we opened it.
+            self._close_base()
+            self._open_base()
+            merged: dict[int, tuple[int, int]] = {}
+            for i in range(self._count):
+                k, ts, outcome = RECORD.unpack_from(self._mm, HEADER.size + i * RECORD.size)
+                merged[k] = (ts, outcome)
+            merged.update(on_disk)
+            merged.update(self._journal)
+            tmp = self.path.parent / f".{self.path.name}.tmp-{os.getpid()}-{time.time_ns()}"
+            with open(tmp, "wb") as f:
+                f.write(HEADER.pack(MAGIC, len(merged)))
+                f.write(b"".join(RECORD.pack(k, ts, o) for k, (ts, o) in sorted(merged.items())))
+                f.flush()
+                os.fsync(f.fileno())
+            self._close_base()
+            os.replace(tmp, self.path)
+            if self._journal_fh is not None:
+                self._journal_fh.close()
+                self._journal_fh = None
+            self.journal_path.unlink(missing_ok=True)
+            self._journal.clear()
+            self._open_base()
+
+    def close(self):
+        if self._journal_fh is not None:
+            self._journal_fh.close()
+            self._journal_fh = None
+        self._close_base()
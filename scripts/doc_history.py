@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Content-addressed history of doc writes (logs/refine/history.sqlite).
+
+Every refine apply (LLM or local) records one row with the sha256 of op.md and
+global.md before and after. Texts are stored once per distinct content
+(zlib-compressed blobs), so consecutive applies share almost all of their
+storage. Each row also gets structural schema changes between before and after
+(Request/Response Schema of the op, global $defs):
+  - added / removed:   property or $def
+  - nullable / type:   null or another type now allowed (narrowed: the reverse)
+  - enum:              new enum values (enum_removed: dropped values)
+  - optional / required: property left or joined "required"
+  - text:              prose changed (+/- line counts), one row per doc
+
+Replaces the per-apply full-copy backups under logs/refine/<run_id>/backups/;
+`compact` imports existing backup dirs and deletes them.
+
+Run:
+  python scripts/doc_history.py log [--op GetAllSittings] [--run RUN_ID]
+  python scripts/doc_history.py find Items[].Location --kind nullable   # when did it become nullable
+  python scripts/doc_history.py show 42                                   # changes of one apply
+  python scripts/doc_history.py cat 42 [--global] [--after]               # a stored version
+  python scripts/doc_history.py rollback 42                               # docs as they were before #42
+  python scripts/doc_history.py compact [--keep]                          # import old backup dirs
+"""
+
+import argparse
+import difflib
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+from schema_diff import section_json
+
+ROOT = Path(__file__).parent.parent
+DOCS = ROOT / "docs"
+GLOBAL_MD = DOCS / "global.md"
+OPS_DIR = DOCS / "ops"
+LOGS = ROOT / "logs" / "refine"
+HISTORY_PATH = LOGS / "history.sqlite"
+
+# (doc, heading, section name) of the JSON blocks diffed structurally.
+SCHEMA_SECTIONS = (
+    ("op", "### Request Schema", "request"),
+    ("op", "### Response Schema", "response"),
+    ("global", "## $defs", "$defs"),
+)
+MAX_DEPTH = 24
+_BACKUP_RE = re.compile(r"^(apply|local)_(\d+)_(.+)_(\d{8}_\d{6}_\d{6})$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (sha TEXT PRIMARY KEY, size INTEGER NOT NULL, data BLOB NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS applies (
+    id INTEGER PRIMARY KEY, ts TEXT NOT NULL, run_id TEXT NOT NULL, seq INTEGER NOT NULL,
+    kind TEXT NOT NULL, op TEXT NOT NULL,
+    op_before TEXT, op_after TEXT, global_before TEXT, global_after TEXT
+);
+CREATE TABLE IF NOT EXISTS changes (
+    apply_id INTEGER NOT NULL, doc TEXT NOT NULL, section TEXT NOT NULL,
+    path TEXT NOT NULL, kind TEXT NOT NULL, detail TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS applies_op ON applies (op, id);
+CREATE INDEX IF NOT EXISTS applies_run ON applies (run_id, seq);
+CREATE INDEX IF NOT EXISTS changes_apply ON changes (apply_id);
+CREATE INDEX IF NOT EXISTS changes_path ON changes (path);
+"""
+
+
+# --- Structural diff ---
+
+def _types(schema: dict) -> set[str]:
+    """Types a schema allows: "type" (str or list), anyOf/oneOf members, $ref names."""
+    out: set[str] = set()
+    t = schema.get("type")
+    if isinstance(t, str):
+        out.add(t)
+    elif isinstance(t, list):
+        out.update(x for x in t if isinstance(x, str))
+    if isinstance(schema.get("$ref"), str):
+        out.add(schema["$ref"].rsplit("/", 1)[-1])
+    for key in ("anyOf", "oneOf"):
+        for member in schema.get(key) or []:
+            if isinstance(member, dict):
+                out |= _types(member)
+    return out
+
+
+def _body(schema: dict) -> dict:
+    """The member of an anyOf/oneOf that carries properties or items (else the schema itself)."""
+    for key in ("anyOf", "oneOf"):
+        for member in schema.get(key) or []:
+            if isinstance(member, dict) and ("properties" in member or "items" in member):
+                return member
+    return schema
+
+
+def schema_changes(old, new, path: str = "$", depth: int = 0) -> list[tuple[str, str, str]]:
+    """(path, kind, detail) for every structural change from schema old to new."""
+    if not isinstance(old, dict) or not isinstance(new, dict) or depth > MAX_DEPTH:
+        return []
+    changes = []
+    old_t, new_t = _types(old), _types(new)
+    if old_t and new_t and old_t != new_t:
+        detail = f"{'|'.join(sorted(old_t))} -> {'|'.join(sorted(new_t))}"
+        if "null" in new_t - old_t:
+            changes.append((path, "nullable", detail))
+        elif new_t - old_t:
+            changes.append((path, "type", detail))
+        else:
+            changes.append((path, "narrowed", detail))
+    for key in ("enum", "const"):
+        old_v = old.get(key) if key == "enum" else [old[key]] if key in old else None
+        new_v = new.get(key) if key == "enum" else [new[key]] if key in new else None
+        if isinstance(old_v, list) and isinstance(new_v, list):
+            added = [v for v in new_v if v not in old_v]
+            removed = [v for v in old_v if v not in new_v]
+            if added:
+                changes.append((path, "enum", ", ".join(map(str, added))))
+            if removed:
+                changes.append((path, "enum_removed", ", ".join(map(str, removed))))
+
+    old_b, new_b = _body(old), _body(new)
+    old_p, new_p = old_b.get("properties"), new_b.get("properties")
+    if isinstance(old_p, dict) and isinstance(new_p, dict):
+        for k in new_p.keys() - old_p.keys():
+            types = _types(new_p[k]) if isinstance(new_p[k], dict) else set()
+            changes.append((f"{path}.{k}", "added", "|".join(sorted(types))))
+        for k in old_p.keys() - new_p.keys():
+            changes.append((f"{path}.{k}", "removed", ""))
+        for k in old_p.keys() & new_p.keys():
+            changes += schema_changes(old_p[k], new_p[k], f"{path}.{k}", depth + 1)
+    old_r, new_r = set(old_b.get("required") or ()), set(new_b.get("required") or ())
+    for k in old_r - new_r:
+        changes.append((f"{path}.{k}", "optional", ""))
+    for k in new_r - old_r:
+        changes.append((f"{path}.{k}", "required", ""))
+    if "items" in old_b and "items" in new_b:
+        changes += schema_changes(old_b["items"], new_b["items"], f"{path}[]", depth + 1)
+    return changes
+
+
+def defs_changes(old, new) -> list[tuple[str, str, str]]:
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return []
+    changes = [(f"$defs.{k}", "added", "") for k in new.keys() - old.keys()]
+    changes += [(f"$defs.{k}", "removed", "") for k in old.keys() - new.keys()]
+    for k in sorted(old.keys() & new.keys()):
+        changes += schema_changes(old[k], new[k], f"$defs.{k}")
+    return changes
+
+
+def _text_change(old: str, new: str) -> str | None:
+    if old == new:
+        return None
+    plus = minus = 0
+    for line in difflib.unified_diff(old.splitlines(), new.splitlines(), lineterm="", n=0):
+        if line.startswith("+") and not line.startswith("+++"):
+            plus += 1
+        elif line.startswith("-") and not line.startswith("---"):
+            minus += 1
+    return f"+{plus} -{minus} lines"
+
+
+def doc_changes(old_op: str, new_op: str, old_global: str, new_global: str) -> list[tuple[str, str, str, str, str]]:
+    """(doc, section, path, kind, detail) between two versions of an op doc and global.md."""
+    texts = {"op": (old_op, new_op), "global": (old_global, new_global)}
+    rows = []
+    for doc, heading, section in SCHEMA_SECTIONS:
+        old, new = texts[doc]
+        if old == new:
+            continue
+        old_s, new_s = section_json(old, heading), section_json(new, heading)
+        found = defs_changes(old_s, new_s) if section == "$defs" else schema_changes(old_s, new_s)
+        rows += [(doc, section, path, kind, detail) for path, kind, detail in sorted(found)]
+    for doc, (old, new) in texts.items():
+        text = _text_change(old, new)
+        if text:
+            rows.append((doc, "text", "", "text", text))
+    return rows
+
+
+# --- Store ---
+
+class History:
+    """Blobs, applies and their structural changes in one sqlite file (shared across runs)."""
+
+    def __init__(self, path: Path = HISTORY_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def put(self, text: str | None) -> str | None:
+        if text is None:
+            return None
+        raw = text.encode("utf-8")
+        sha = hashlib.sha256(raw).hexdigest()
+        self.conn.execute(
+            "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)", (sha, len(raw), zlib.compress(raw, 6))
+        )
+        return sha
+
+    def get(self, sha: str | None) -> str | None:
+        if sha is None:
+            return None
+        row = self.conn.execute("SELECT data FROM blobs WHERE sha = ?", (sha,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def record(self, *, run_id: str, seq: int, kind: str, op: str, old_op: str, new_op: str,
+               old_global: str, new_global: str, ts: str | None = None) -> int:
+        """Store both versions of both docs and their changes; returns the apply id. Committed."""
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO applies (ts, run_id, seq, kind, op, op_before, op_after, global_before, global_after) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (ts or datetime.now().isoformat(timespec="seconds"), run_id, seq, kind, op,
+                 self.put(old_op), self.put(new_op), self.put(old_global), self.put(new_global)),
+            )
+            apply_id = cur.lastrowid
+            self.conn.executemany(
+                "INSERT INTO changes VALUES (?, ?, ?, ?, ?, ?)",
+                [(apply_id, *row) for row in doc_changes(old_op or "", new_op or "", old_global or "", new_global or "")],
+            )
+        return apply_id
+
+    def discard(self, apply_id: int):
+        """Drop an apply whose write failed (its blobs stay; they are content-addressed)."""
+        with self.conn:
+            self.conn.execute("DELETE FROM changes WHERE apply_id = ?", (apply_id,))
+            self.conn.execute("DELETE FROM applies WHERE id = ?", (apply_id,))
+
+    def apply(self, apply_id: int) -> dict | None:
+        cur = self.conn.execute("SELECT * FROM applies WHERE id = ?", (apply_id,))
+        row = cur.fetchone()
+        return dict(zip([c[0] for c in cur.description], row)) if row else None
+
+    def has(self, run_id: str, seq: int, kind: str, op: str) -> bool:
+        """True if an apply with this run, sequence number, kind and op is already recorded."""
+        return self.conn.execute(
+            "SELECT 1 FROM applies WHERE run_id = ? AND seq = ? AND kind = ? AND op = ? LIMIT 1",
+            (run_id, seq, kind, op),
+        ).fetchone() is not None
+
+    def count(self, run_id: str | None = None, kind: str | None = None) -> int:
+        sql, params = "SELECT count(*) FROM applies WHERE 1", []
+        if run_id:
+            sql, params = sql + " AND run_id = ?", params + [run_id]
+        if kind:
+            sql, params = sql + " AND kind = ?", params + [kind]
+        return self.conn.execute(sql, params).fetchone()[0]
+
+    def log(self, op: str | None = None, run_id: str | None = None, limit: int = 50) -> list[tuple]:
+        """(id, ts, run_id, kind, op, structural changes) newest first."""
+        sql = ("SELECT a.id, a.ts, a.run_id, a.kind, a.op, "
+               "(SELECT count(*) FROM changes c WHERE c.apply_id = a.id AND c.kind != 'text') "
+               "FROM applies a WHERE 1")
+        params: list = []
+        if op:
+            sql, params = sql + " AND a.op = ?", params + [op]
+        if run_id:
+            sql, params = sql + " AND a.run_id = ?", params + [run_id]
+        return list(self.conn.execute(sql + " ORDER BY a.id DESC LIMIT ?", params + [limit]))
+
+    def changes(self, apply_id: int) -> list[tuple]:
+        return list(self.conn.execute(
+            "SELECT doc, section, path, kind, detail FROM changes WHERE apply_id = ? ORDER BY rowid", (apply_id,)
+        ))
+
+    def find(self, path: str, kind: str | None = None, op: str | None = None) -> list[tuple]:
+        """(apply id, ts, run_id, op, section, path, kind, detail) for changes whose path contains `path`."""
+        sql = ("SELECT a.id, a.ts, a.run_id, a.op, c.section, c.path, c.kind, c.detail "
+               "FROM changes c JOIN applies a ON a.id = c.apply_id WHERE c.path LIKE ? ESCAPE '\\'")
+        params: list = ["%" + path.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"]
+        if kind:
+            sql, params = sql + " AND c.kind = ?", params + [kind]
+        if op:
+            sql, params = sql + " AND a.op = ?", params + [op]
+        return list(self.conn.execute(sql + " ORDER BY a.id", params))
+
+    def stats(self) -> dict:
+        blobs, stored, raw = self.conn.execute("SELECT count(*), sum(length(data)), sum(size) FROM blobs").fetchone()
+        applies = self.count()
+        return {"applies": applies, "blobs": blobs, "stored_bytes": stored or 0, "raw_bytes": raw or 0,
+                "changes": self.conn.execute("SELECT count(*) FROM changes").fetchone()[0]}
+
+
+# --- Rollback / compaction ---
+
+def _atomic_write_text(path: Path, text: str):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def rollback(history: History, apply_id: int, run_id: str = "rollback") -> int:
+    """Restore op.md and global.md as they were before an apply; recorded as a new apply. Returns its id."""
+    row = history.apply(apply_id)
+    if row is None:
+        raise KeyError(f"No apply #{apply_id}")
+    op_path = OPS_DIR / f"{row['op']}.md"
+    cur_op = op_path.read_text(encoding="utf-8") if op_path.exists() else ""
+    cur_global = GLOBAL_MD.read_text(encoding="utf-8")
+    old_op, old_global = history.get(row["op_before"]), history.get(row["global_before"])
+    if old_op is None or old_global is None:
+        raise KeyError(f"Apply #{apply_id} has no stored before-version")
+    new_id = history.record(run_id=run_id, seq=apply_id, kind="rollback", op=row["op"],
+                            old_op=cur_op, new_op=old_op, old_global=cur_global, new_global=old_global)
+    _atomic_write_text(op_path, old_op)
+    _atomic_write_text(GLOBAL_MD, old_global)
+    return new_id
+
+
+def compact(history: History, logs: Path = LOGS, keep: bool = False) -> tuple[int, int]:
+    """Import full-copy backups (logs/refine/<run_id>/backups/*) oldest first. Returns (imported, bytes freed).
+
+    A backup holds the docs before its apply; the after-version is the next snapshot
+    of the same file (or the current docs for the last one). Backups already in the
+    history (an earlier compact --keep, or an interrupted one) are not imported again.
+    """
+    snapshots = []
+    for backup in logs.glob("*/backups/*"):
+        m = _BACKUP_RE.match(backup.name)
+        if m and backup.is_dir():
+            kind, seq, op, stamp = m.groups()
+            snapshots.append((stamp, backup.parent.parent.name, int(seq), kind, op, backup))
+    snapshots.sort()
+    freed = imported = 0
+    for i, (stamp, run_id, seq, kind, op, backup) in enumerate(snapshots):
+        old_op_path, old_global_path = backup / f"{op}.md", backup / "global.md"
+        if not old_op_path.exists() or not old_global_path.exists() or history.has(run_id, seq, kind, op):
+            continue
+        next_op = next((s for s in snapshots[i + 1:] if s[4] == op), None)
+        new_op_path = next_op[5] / f"{op}.md" if next_op else OPS_DIR / f"{op}.md"
+        new_global_path = snapshots[i + 1][5] / "global.md" if i + 1 < len(snapshots) else GLOBAL_MD
+        ts = datetime.strptime(stamp, "%Y%m%d_%H%M%S_%f").isoformat(timespec="seconds")
+        history.record(
+            run_id=run_id, seq=seq, kind=kind, op=op, ts=ts,
+            old_op=old_op_path.read_text(encoding="utf-8"),
+            new_op=new_op_path.read_text(encoding="utf-8") if new_op_path.exists() else "",
+            old_global=old_global_path.read_text(encoding="utf-8"),
+            new_global=new_global_path.read_text(encoding="utf-8") if new_global_path.exists() else "",
+        )
+        imported += 1
+    if not keep:
+        for *_, backup in snapshots:
+            freed += sum(f.stat().st_size for f in backup.iterdir() if f.is_file())
+            shutil.rmtree(backup, ignore_errors=True)
+        for backups in {s[5].parent for s in snapshots}:
+            try:
+                backups.rmdir()
+            except OSError:
+                pass
+    return imported, freed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Query, roll back or compact the docs history.")
+    parser.add_argument("command", nargs="?", default="log",
+                        choices=("log", "find", "show", "cat", "rollback", "compact", "stats"))
+    parser.add_argument("arg", nargs="?", help="find: path substring; show/cat/rollback: apply id")
+    parser.add_argument("--op", default=None)
+    parser.add_argument("--run", default=None, metavar="RUN_ID")
+    parser.add_argument("--kind", default=None, help="find: change kind (nullable, type, enum, added, ...)")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--global", dest="global_md", action="store_true", help="cat: global.md instead of op.md")
+    parser.add_argument("--after", action="store_true", help="cat: version after the apply (default: before)")
+    parser.add_argument("--keep", action="store_true", help="compact: import but keep the backup dirs")
+    parser.add_argument("--history", type=Path, default=HISTORY_PATH)
+    args = parser.parse_args(argv)
+
+    history = History(args.history)
+    if args.command in ("find", "show", "cat", "rollback") and not args.arg:
+        print(f"usage: doc_history.py {args.command} {'PATH' if args.command == 'find' else 'ID'}", file=sys.stderr)
+        return 2
+
+    if args.command == "log":
+        for apply_id, ts, run_id, kind, op, n in history.log(args.op, args.run, args.limit):
+            print(f"#{apply_id:<6} {ts}  {run_id:22} {kind:8} {op:40} {n} schema change(s)")
+    elif args.command == "find":
+        for apply_id, ts, run_id, op, section, path, kind, detail in history.find(args.arg, args.kind, args.op):
+            print(f"#{apply_id:<6} {ts}  {run_id:22} {op:32} {section:8} {kind:12} {path}"
+                  + (f"  ({detail})" if detail else ""))
+    elif args.command == "show":
+        row = history.apply(int(args.arg))
+        if row is None:
+            print(f"No apply #{args.arg}", file=sys.stderr)
+            return 1
+        print(f"#{row['id']} {row['ts']} {row['run_id']} {row['kind']} {row['op']}")
+        for doc, section, path, kind, detail in history.changes(row["id"]):
+            print(f"  {doc:6} {section:8} {kind:12} {path}" + (f"  ({detail})" if detail else ""))
+    elif args.command == "cat":
+        row = history.apply(int(args.arg))
+        if row is None:
+            print(f"No apply #{args.arg}", file=sys.stderr)
+            return 1
+        key = ("global" if args.global_md else "op") + ("_after" if args.after else "_before")
+        sys.stdout.write(history.get(row[key]) or "")
+    elif args.command == "rollback":
+        try:
+            new_id = rollback(history, int(args.arg))
+        except KeyError as e:
+            print(e.args[0], file=sys.stderr)
+            return 1
+        later = history.conn.execute(
+            "SELECT count(*) FROM applies WHERE id > ? AND id < ? AND kind != 'rollback'", (int(args.arg), new_id)
+        ).fetchone()[0]
+        print(f"Restored docs from before #{args.arg} (recorded as #{new_id})")
+        if later:
+            print(f"  {later} later apply(s) also wrote global.md and are undone with it")
+        print("  Rebuild API.md: python scripts/build_api_md.py")
+    elif args.command == "compact":
+        imported, freed = compact(history, keep=args.keep)
+        print(f"Imported {imported} backup(s)" + ("" if args.keep else f", freed {freed / 1e6:.1f} MB"))
+    else:
+        s = history.stats()
+        print(f"{s['applies']} applies, {s['changes']} changes, {s['blobs']} blobs: "
+              f"{s['stored_bytes'] / 1e6:.2f} MB stored ({s['raw_bytes'] / 1e6:.2f} MB uncompressed)")
+    history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,445 @@
+"""
+Local mechanical apply: patch docs for schema-only widenings without an LLM.
+
+Takes schema_diff.py findings and edits the ```json blocks in place:
+  - new_property:  add the property (observed type) to the Response Schema; never required
+  - nullable:      wrap the property in anyOf [..., {"type": "null"}] (description stays outside)
+  - type:          same, with a branch per observed type
+  - enum:          merge new values into the global $defs enum (only $defs; op-local
+                   enum/const changes are judgment calls and stay with the LLM)
+  - optional:      drop the property from its parent's "required"
+
+Changes are spliced into the original block text: unchanged values keep their
+exact text, a changed object or array keeps its layout (one-line stays one-line,
+multi-line keeps its members' lines and indent), and only new or changed values
+are serialized, styled like their siblings. Everything else in the file, prose
+included, is left byte-for-byte. A block patch that touches more than
+MAX_LINES_PER_FINDING lines per finding is dropped. Findings that cannot be
+applied safely (path through a $ref, op-local enum) are returned to the caller,
+which sends them to the LLM apply step as notes.
+
+Run: python scripts/doc_patch.py [docs/ops/GetAllSittings.md ...]
+     (applies one probe finding of each kind to each op doc and reports any
+     patch that touches more than a few lines)
+"""
+
+import argparse
+import copy
+import difflib
+import json
+import re
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+OPS_DIR = ROOT / "docs" / "ops"
+
+MAX_LINES_PER_FINDING = 8  # a patch touching more lines than this per finding is not applied
+
+_HEADING_RE = re.compile(r"^(#{1,6}) ", re.MULTILINE)
+_FENCE_RE = re.compile(r"```json[ \t]*\n(.*?)\n```", re.DOTALL)
+_PATH_RE = re.compile(r"\.([^.\[]+)|\[\]")
+
+
+# --- Markdown ---
+
+def sections(md: str) -> list[tuple[str, int, int]]:
+    """(heading line, start, end) per markdown heading; end is the next heading of the same or higher level."""
+    heads = [(m.start(), len(m.group(1))) for m in _HEADING_RE.finditer(md)]
+    out = []
+    for i, (start, level) in enumerate(heads):
+        end = next((s for s, lv in heads[i + 1:] if lv <= level), len(md))
+        nl = md.find("\n", start)
+        out.append((md[start:nl if nl >= 0 else len(md)], start, end))
+    return out
+
+
+def find_json_block(md: str, heading: str) -> tuple[int, int, object] | None:
+    """(start, end, parsed) of the first ```json block in the section titled `heading`.
+
+    start/end span the JSON text inside the fence. None if absent or not valid JSON.
+    """
+    for line, start, end in sections(md):
+        if line.strip() != heading:
+            continue
+        m = _FENCE_RE.search(md, start, end)
+        if not m:
+            return None
+        try:
+            return m.start(1), m.end(1), json.loads(m.group(1))
+        except json.JSONDecodeError:
+            return None
+    return None
+
+
+def _scalar(x) -> bool:
+    return not isinstance(x, (dict, list))
+
+
+def dumps(obj, indent: int = 0) -> str:
+    """JSON in the docs' style: 2-space indent, scalar lists and small scalar objects in arrays inline."""
+    pad, end = "  " * (indent + 1), "  " * indent
+    if isinstance(obj, dict):
+        if not obj:
+            return "{}"
+        body = ",\n".join(f"{pad}{json.dumps(k, ensure_ascii=False)}: {dumps(v, indent + 1)}" for k, v in obj.items())
+        return "{\n" + body + "\n" + end + "}"
+    if isinstance(obj, list):
+        if not obj:
+            return "[]"
+        if all(_scalar(x) for x in obj):
+            return "[" + ", ".join(json.dumps(x, ensure_ascii=False) for x in obj) + "]"
+        items = []
+        for x in obj:
+            if isinstance(x, dict) and 0 < len(x) <= 2 and all(_scalar(v) for v in x.values()):
+                items.append(pad + json.dumps(x, ensure_ascii=False))
+            else:
+                items.append(pad + dumps(x, indent + 1))
+        return "[\n" + ",\n".join(items) + "\n" + end + "]"
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _inline(obj, padded: bool) -> str:
+    """obj on one line; padded puts spaces inside object braces ({ "type": "string" })."""
+    if isinstance(obj, dict) and obj:
+        body = ", ".join(f"{json.dumps(k, ensure_ascii=False)}: {_inline(v, padded)}" for k, v in obj.items())
+        return "{ " + body + " }" if padded else "{" + body + "}"
+    if isinstance(obj, list):
+        return "[" + ", ".join(_inline(x, padded) for x in obj) + "]"
+    return json.dumps(obj, ensure_ascii=False)
+
+
+# --- Splicing into the original block text ---
+
+_WS_RE = re.compile(r"[ \t\r\n]*")
+_INDENT_RE = re.compile(r"[ \t]*")
+_SCALAR_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?|true|false|null")
+
+
+class _Node:
+    """A JSON value in the original block text: its span, and its members (object) or items (array)."""
+    __slots__ = ("value", "start", "end", "members", "items")
+
+    def __init__(self, value, start: int, end: int, members=None, items=None):
+        self.value, self.start, self.end = value, start, end
+        self.members = members  # [(key, key start, value node)]
+        self.items = items  # [value node]
+
+
+def _locate(text: str, i: int = 0) -> _Node:
+    """Parse already-valid JSON, keeping where every value sits in text."""
+    i = _WS_RE.match(text, i).end()
+    c = text[i]
+    if c == "{":
+        members, value = [], {}
+        j = _WS_RE.match(text, i + 1).end()
+        while text[j] != "}":
+            key, k = json.decoder.scanstring(text, j + 1)
+            child = _locate(text, _WS_RE.match(text, k).end() + 1)  # past ':'
+            members.append((key, j, child))
+            value[key] = child.value
+            j = _WS_RE.match(text, child.end).end()
+            if text[j] == ",":
+                j = _WS_RE.match(text, j + 1).end()
+        return _Node(value, i, j + 1, members=members)
+    if c == "[":
+        items = []
+        j = _WS_RE.match(text, i + 1).end()
+        while text[j] != "]":
+            child = _locate(text, j)
+            items.append(child)
+            j = _WS_RE.match(text, child.end).end()
+            if text[j] == ",":
+                j = _WS_RE.match(text, j + 1).end()
+        return _Node([x.value for x in items], i, j + 1, items=items)
+    if c == '"':
+        value, j = json.decoder.scanstring(text, i + 1)
+        return _Node(value, i, j)
+    m = _SCALAR_RE.match(text, i)
+    if not m:
+        raise ValueError(f"unexpected {c!r} at {i}")
+    return _Node(json.loads(m.group()), i, m.end())
+
+
+def _same(a, b) -> bool:
+    # json.dumps tells 1 from True and 1 from 1.0, and sees key order
+    return json.dumps(a) == json.dumps(b)
+
+
+def _line_indent(text: str, pos: int) -> str:
+    return _INDENT_RE.match(text, text.rfind("\n", 0, pos) + 1).group()
+
+
+def _one_line(text: str, node: _Node) -> bool:
+    return "\n" not in text[node.start:node.end]
+
+
+def _fresh(obj, container: _Node, text: str, pad: str) -> str:
+    """A new value inside container, styled like its siblings."""
+    if _one_line(text, container) and (container.members or container.items):
+        return _inline(obj, "{ " in text[container.start:container.end])
+    siblings = [c for _, _, c in container.members] if container.members is not None else container.items
+    if isinstance(obj, dict):
+        inline = [c for c in siblings if isinstance(c.value, dict) and c.value and _one_line(text, c)]
+        if inline and len(inline) * 2 >= len(siblings):
+            return _inline(obj, "{ " in text[inline[0].start:inline[0].end])
+    return dumps(obj, len(pad) // 2)
+
+
+def _splice(obj, node: _Node, text: str) -> str:
+    """obj as JSON text, reusing the original text of every unchanged value under node.
+
+    Changed objects and arrays keep their layout: one-line stays one-line, and
+    multi-line keeps each member's line and indent. Only new or changed values
+    are serialized.
+    """
+    original = text[node.start:node.end]
+    if _same(obj, node.value):
+        return original
+    pad = _line_indent(text, node.start)
+    if isinstance(obj, dict) and node.members is not None:
+        opener, closer = "{", "}"
+        old = {k: (ks, child) for k, ks, child in node.members}
+        inner = _line_indent(text, node.members[0][1]) if node.members else pad + "  "
+        parts = []
+        for k, v in obj.items():
+            if k in old:
+                ks, child = old[k]
+                parts.append((_line_indent(text, ks), text[ks:child.start] + _splice(v, child, text)))
+            else:
+                parts.append((inner, f"{json.dumps(k, ensure_ascii=False)}: {_fresh(v, node, text, inner)}"))
+    elif isinstance(obj, list) and node.items is not None:
+        opener, closer = "[", "]"
+        inner = _line_indent(text, node.items[0].start) if node.items else pad + "  "
+        unused = list(node.items)
+        parts = []
+        for i, v in enumerate(obj):
+            match = next((c for c in unused if _same(v, c.value)), None)
+            if match is None and i < len(node.items) and any(c is node.items[i] for c in unused) \
+                    and type(node.items[i].value) is type(v) and not _scalar(v):
+                match = node.items[i]
+            if match is None:
+                parts.append((inner, _fresh(v, node, text, inner)))
+            else:
+                unused = [c for c in unused if c is not match]
+                parts.append((_line_indent(text, match.start), _splice(v, match, text)))
+    elif _scalar(obj) or _one_line(text, node):
+        return _inline(obj, "{ " in original)
+    else:
+        return dumps(obj, len(pad) // 2)
+
+    if not parts:
+        return opener + closer
+    if "\n" not in original and (node.members or node.items):
+        space = " " if opener == "{" and original.startswith("{ ") else ""
+        return opener + space + ", ".join(p for _, p in parts) + space + closer
+    body = ",\n".join(indent + p for indent, p in parts)
+    return opener + "\n" + body + "\n" + _line_indent(text, node.end - 1) + closer
+
+
+def _replace_block(md: str, block: tuple[int, int, object], obj) -> str:
+    start, end, _ = block
+    text = md[start:end]
+    try:
+        new = _splice(obj, _locate(text), text)
+    except (ValueError, IndexError):
+        new = dumps(obj)
+    return md[:start] + new + md[end:]
+
+
+def changed_lines(old: str, new: str) -> int:
+    """Lines removed plus lines added between two texts."""
+    diff = difflib.unified_diff(old.splitlines(), new.splitlines(), lineterm="", n=0)
+    return sum(1 for line in diff if line[:1] in "+-" and not line.startswith(("+++", "---")))
+
+
+# --- Schema edits ---
+
+class Unapplicable(Exception):
+    pass
+
+
+def _branch(schema: dict, json_type: str) -> dict:
+    """The schema node holding `json_type` structure (itself, or its anyOf/oneOf branch of that type)."""
+    if "$ref" in schema:
+        raise Unapplicable("path goes through a $ref")
+    if schema.get("type") == json_type or (isinstance(schema.get("type"), list) and json_type in schema["type"]):
+        return schema
+    for b in schema.get("anyOf") or schema.get("oneOf") or []:
+        if isinstance(b, dict) and b.get("type") == json_type:
+            return b
+    if json_type == "object" and "properties" in schema:
+        return schema
+    if json_type == "array" and "items" in schema:
+        return schema
+    raise Unapplicable(f"no {json_type} schema on path")
+
+
+def _segments(path: str) -> list[str | None]:
+    """"$.Items[].Foo" -> ["Items", None, "Foo"] (None = array items)."""
+    if not path.startswith("$"):
+        raise Unapplicable(f"bad path {path}")
+    return [m.group(1) for m in _PATH_RE.finditer(path[1:])]
+
+
+def _parent(schema: dict, segments: list) -> tuple[dict, str]:
+    """(object schema that owns the last segment, property name)."""
+    if not segments or segments[-1] is None:
+        raise Unapplicable("not a property path")
+    node = schema
+    for seg in segments[:-1]:
+        if seg is None:
+            node = _branch(node, "array").get("items")
+        else:
+            node = _branch(node, "object").get("properties", {}).get(seg)
+        if not isinstance(node, dict):
+            raise Unapplicable("path not in schema")
+    return _branch(node, "object"), segments[-1]
+
+
+def _type_schema(types: list[str]) -> dict:
+    branches = [{"type": t} for t in types] or [{}]
+    return branches[0] if len(branches) == 1 else {"anyOf": branches}
+
+
+def _widen(prop: dict, add_types: list[str]) -> dict:
+    """prop with extra anyOf branches for add_types; description (if any) stays at the top level."""
+    if "anyOf" in prop:
+        out = dict(prop)
+        have = {b.get("type") for b in out["anyOf"] if isinstance(b, dict)}
+        out["anyOf"] = out["anyOf"] + [{"type": t} for t in add_types if t not in have]
+        return out
+    core = {k: v for k, v in prop.items() if k != "description"}
+    out = {"anyOf": [core] + [{"type": t} for t in add_types]}
+    if "description" in prop:
+        out["description"] = prop["description"]
+    return out
+
+
+def _apply_response(schema: dict, f: dict):
+    segs = _segments(f["path"])
+    parent, name = _parent(schema, segs)
+    props = parent.setdefault("properties", {})
+    kind = f["kind"]
+    if kind == "new_property":
+        if name in props:
+            return
+        props[name] = _type_schema([t for t in f["observed"] if t != "null"] or ["null"])
+    elif kind == "optional":
+        if name in parent.get("required", []):
+            parent["required"] = [k for k in parent["required"] if k != name]
+            if not parent["required"]:
+                del parent["required"]
+    elif kind in ("nullable", "type"):
+        if name not in props:
+            raise Unapplicable("property not in schema")
+        add = ["null"] if kind == "nullable" else [t for t in f["observed"] if t != "null"]
+        props[name] = _widen(props[name], add)
+    else:
+        raise Unapplicable(f"{kind} is not a response-schema edit")
+
+
+def _apply_enum(defs: dict, f: dict):
+    d = defs.get(f["def"])
+    if not isinstance(d, dict) or not isinstance(d.get("enum"), list):
+        raise Unapplicable(f"$defs {f['def']} has no enum")
+    new = [v for v in f["observed"] if v not in d["enum"]]
+    if not new:
+        return
+    values = d["enum"] + new
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in values) and d["enum"] == sorted(d["enum"]):
+        values = sorted(values)
+    d["enum"] = values
+
+
+def apply_findings(findings: list[dict], op_md: str, global_md: str) -> tuple[str, str, list[dict]]:
+    """Apply what can be applied mechanically. Returns (new_op_md, new_global_md, leftover findings).
+
+    A block whose patch touches more than MAX_LINES_PER_FINDING lines per applied
+    finding is left alone and its findings go back as leftover.
+    """
+    resp_block = find_json_block(op_md, "### Response Schema")
+    defs_block = find_json_block(global_md, "## $defs")
+    schema = copy.deepcopy(resp_block[2]) if resp_block and isinstance(resp_block[2], dict) else None
+    defs = copy.deepcopy(defs_block[2]) if defs_block and isinstance(defs_block[2], dict) else None
+
+    leftover, to_schema, to_defs = [], [], []
+    for f in findings:
+        try:
+            if f["kind"] == "enum":
+                if not f.get("def") or defs is None:
+                    raise Unapplicable("op-local enum/const")
+                _apply_enum(defs, f)
+                to_defs.append(f)
+            else:
+                if schema is None:
+                    raise Unapplicable("no Response Schema block")
+                _apply_response(schema, f)
+                to_schema.append(f)
+        except Unapplicable:
+            leftover.append(f)
+
+    if schema is not None and schema != resp_block[2]:
+        new_op = _replace_block(op_md, resp_block, schema)
+        if changed_lines(op_md, new_op) <= MAX_LINES_PER_FINDING * len(to_schema):
+            op_md = new_op
+        else:
+            leftover += to_schema
+    if defs is not None and defs != defs_block[2]:
+        new_global = _replace_block(global_md, defs_block, defs)
+        if changed_lines(global_md, new_global) <= MAX_LINES_PER_FINDING * len(to_defs):
+            global_md = new_global
+        else:
+            leftover += to_defs
+    return op_md, global_md, leftover
+
+
+# --- Self-check ---
+
+def _probe_findings(schema: dict) -> list[dict]:
+    """One finding per kind that this schema can take: a new root property, a nullable, an optional."""
+    props = schema.get("properties") if isinstance(schema.get("properties"), dict) else {}
+    out = [{"kind": "new_property", "path": "$.DocPatchProbe", "observed": ["string"]}]
+    plain = next((k for k, v in props.items() if isinstance(v, dict) and "type" in v and "anyOf" not in v), None)
+    if plain:
+        out.append({"kind": "nullable", "path": f"$.{plain}", "observed": ["null"]})
+    if schema.get("required"):
+        out.append({"kind": "optional", "path": f"$.{schema['required'][0]}"})
+    return out
+
+
+def check(paths: list[Path]) -> list[str]:
+    """Problems found applying each probe finding on its own to each op doc."""
+    problems = []
+    for path in paths:
+        md = path.read_text(encoding="utf-8")
+        block = find_json_block(md, "### Response Schema")
+        if not block or not isinstance(block[2], dict):
+            continue
+        for f in _probe_findings(block[2]):
+            new_md, _, leftover = apply_findings([f], md, "")
+            if leftover:
+                continue
+            n = changed_lines(md, new_md)
+            after = find_json_block(new_md, "### Response Schema")
+            if n > MAX_LINES_PER_FINDING:
+                problems.append(f"{path.name}: {f['kind']} {f['path']} changed {n} lines")
+            elif new_md == md or after is None:
+                problems.append(f"{path.name}: {f['kind']} {f['path']} left no valid Response Schema change")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check that one local patch changes only a few lines of each op doc.")
+    parser.add_argument("ops", nargs="*", type=Path, help="Op docs (default: all of docs/ops)")
+    args = parser.parse_args(argv)
+
+    paths = args.ops or sorted(OPS_DIR.glob("*.md"))
+    problems = check(paths)
+    for p in problems:
+        print(p)
+    print(f"{len(paths)} docs checked, {len(problems)} problems")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    exit(main())
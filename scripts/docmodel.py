@@ -0,0 +1,123 @@
+"""
+Versioned in-memory model of docs/global.md + docs/ops/*.md for refine.
+
+Docs are read once and kept with their parsed forms (sections, Response Schema,
+$defs) and rendered prompt prefixes. `version` is bumped when refine commits new
+docs (commit(), after _write_docs_transactional) or when a file changed on disk
+behind our back (mtime/size check on access), and everything derived is memoized
+per version, so caches can key on it.
+
+Template compiles a prompt template once: <<<key>>> placeholders are split out
+and render() joins the parts in one pass instead of a str.replace per key.
+Output equals refine._substitute as long as no value contains a placeholder.
+"""
+
+import re
+from pathlib import Path
+
+import doc_patch
+import schema_diff
+
+_PLACEHOLDER_RE = re.compile(r"<<<(\w+)>>>")
+
+
+class Template:
+    """Prompt template with <<<key>>> placeholders, split once."""
+
+    def __init__(self, text: str):
+        # Even indices are literal text, odd indices placeholder names.
+        self.parts = _PLACEHOLDER_RE.split(text)
+
+    def render(self, **values) -> str:
+        out = []
+        for i, part in enumerate(self.parts):
+            if i % 2 == 0:
+                out.append(part)
+            elif part in values:
+                out.append(str(values[part]))
+            else:
+                out.append(f"<<<{part}>>>")
+        return "".join(out)
+
+    def split_at(self, key: str) -> tuple["Template", "Template"]:
+        """(head, tail): tail starts at the first <<<key>>> placeholder."""
+        for i in range(1, len(self.parts), 2):
+            if self.parts[i] == key:
+                head, tail = Template(""), Template("")
+                head.parts = self.parts[:i]
+                tail.parts = [""] + self.parts[i:]
+                return head, tail
+        return self, Template("")
+
+
+class DocModel:
+    """global.md + op docs, loaded once, re-read only when they change."""
+
+    def __init__(self, global_path: Path, ops_dir: Path):
+        self.global_path = global_path
+        self.ops_dir = ops_dir
+        self.version = 0
+        self._texts: dict[Path, tuple[tuple[int, int], str]] = {}
+        self._memo: dict[tuple, object] = {}
+
+    def _bump(self):
+        self.version += 1
+        self._memo.clear()
+
+    @staticmethod
+    def _stat_key(path: Path) -> tuple[int, int]:
+        st = path.stat()
+        return st.st_mtime_ns, st.st_size
+
+    def _read(self, path: Path) -> str:
+        key = self._stat_key(path)
+        hit = self._texts.get(path)
+        if hit is not None and hit[0] == key:
+            return hit[1]
+        text = path.read_text(encoding="utf-8")
+        if hit is not None:
+            self._bump()  # edited outside refine
+        self._texts[path] = (key, text)
+        return text
+
+    def op_path(self, op: str) -> Path:
+        return self.ops_dir / f"{op}.md"
+
+    def global_md(self) -> str:
+        return self._read(self.global_path)
+
+    def op_md(self, op: str) -> str:
+        return self._read(self.op_path(op))
+
+    def memo(self, name: str, op: str | None, build):
+        """build() once per (name, op, version)."""
+        key = (name, op, self.version)
+        if key in self._memo:
+            return self._memo[key]
+        value = build()  # may notice an on-disk change and bump the version
+        self._memo[(name, op, self.version)] = value
+        return value
+
+    def commit(self, op: str, new_op: str, new_global: str):
+        """Record docs just written by refine; bumps the version."""
+        for path, text in ((self.op_path(op), new_op), (self.global_path, new_global)):
+            self._texts[path] = (self._stat_key(path), text)
+        self._bump()
+
+    # --- Derived (memoized per version) ---
+
+    def defs(self) -> dict:
+        return self.memo("defs", None, lambda: schema_diff.load_defs(self.global_md()))
+
+    def response_schema(self, op: str):
+        return self.memo("response_schema", op,
+                         lambda: schema_diff.section_json(self.op_md(op), "### Response Schema"))
+
+    def sections(self, op: str) -> list[tuple[str, int, int]]:
+        return self.memo("sections", op, lambda: doc_patch.sections(self.op_md(op)))
+
+    def prefix(self, name: str, op: str, head: Template) -> str:
+        """A template head rendered with this version's docs (the part shared by every pair of the op)."""
+        return self.memo(f"prefix:{name}", op, lambda: head.render(
+            global_md=self.global_md(), op_md=self.op_md(op), operation=op,
+        ))
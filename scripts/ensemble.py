@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Notes ensemble for refine.py --ensemble: a cheap and a strong model on each notes prompt.
+
+Both get the same rendered prompt; the strong call starts in a worker thread
+(after strong_delay_s, default 0) while the cheap one runs. The cheap model also
+returns a confidence (high / medium / low). Its answer is accepted right away,
+and the strong call dropped, when it is "No changes needed." and either
+  - confidence is high, or
+  - the local schema diff found nothing (it agrees) and confidence is not low.
+A strong call that has not been sent yet is cancelled. One already in flight
+cannot be aborted: its result is not waited for, but it is still cached and
+logged when it lands ("late"), which measures how often early accepts were wrong.
+
+Otherwise the strong answer is waited for and the two are merged:
+  - union (default): the strong notes plus the cheap items they do not already
+    contain (near-identical items count as the same, as in apply_batcher.py)
+  - strong: the strong notes only; the cheap model just short-circuits
+If one of the two calls fails, the other's notes are used.
+
+Every pair is a line in logs/refine/<run_id>/ensemble.jsonl: each model's verdict
+(none / changes), confidence, latency and item count, the outcome (accepted /
+merged / cheap / strong), whether the verdicts agree and how many of the strong
+items the cheap model also raised (recall). The run log ends with per-model
+latency and agreement; the CLI totals recent runs, to tell whether a cheaper
+pair of models holds up.
+
+Run: python scripts/ensemble.py [--runs 10]
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from apply_batcher import item_norms, novel_items, split_items
+from improved.governor import BudgetExceeded
+
+ROOT = Path(__file__).parent.parent
+LOGS = ROOT / "logs" / "refine"
+
+DEFAULTS = {"cheap": "claude-haiku-4-5", "strong": None, "strong_delay_s": 0.0, "merge": "union"}
+CONFIDENCE = ("high", "medium", "low")
+# Strong calls in flight at once: the current pair's, and one still landing from an early accept.
+# Beyond that, a new strong call queues and an early accept cancels it before it is sent.
+STRONG_WORKERS = 2
+NO_CHANGES = "No changes needed."
+
+
+def no_changes(notes: str) -> bool:
+    return notes.strip().lower() in ("no changes needed.", "no changes needed")
+
+
+def merge(strong: str, cheap: str, mode: str = "union") -> str:
+    """Strong notes plus (union) the cheap items they lack."""
+    if mode == "strong" or no_changes(cheap):
+        return strong
+    base = [] if no_changes(strong) else split_items(strong)
+    extra, _ = novel_items(cheap, item_norms("\n\n".join(base)))
+    return "\n\n".join(base + extra) if base or extra else NO_CHANGES
+
+
+def recall(strong: str, cheap: str) -> float | None:
+    """Share of the strong items the cheap notes also contain (None if strong has none)."""
+    if no_changes(strong):
+        return None
+    total = len(item_norms(strong))
+    if not total:
+        return None
+    if no_changes(cheap):
+        return 0.0
+    missed, _ = novel_items(strong, item_norms(cheap))
+    return round(1 - len(missed) / total, 3)
+
+
+def _side(model: str, result: dict | None, seconds: float, error: str | None = None) -> dict:
+    out = {"model": model, "s": round(seconds, 3)}
+    if error:
+        out["error"] = error
+    elif result is not None:
+        notes = result.get("notes", NO_CHANGES)
+        out["verdict"] = "none" if no_changes(notes) else "changes"
+        out["items"] = 0 if no_changes(notes) else len(split_items(notes))
+        if result.get("confidence"):
+            out["confidence"] = result["confidence"]
+    return out
+
+
+def describe(record: dict) -> str:
+    """One line for the run log: each model's verdict and latency."""
+    parts = []
+    for role in ("cheap", "strong"):
+        side = record.get(role) or {}
+        if side.get("cancelled"):
+            state = "cancelled"
+        elif side.get("pending"):
+            state = "in flight, not waited for"
+        elif "error" in side:
+            state = "failed"
+        else:
+            state = side.get("verdict", "?")
+            if side.get("confidence"):
+                state += f" ({side['confidence']})"
+            state += f" {side.get('s', 0):.1f}s"
+        parts.append(f"{side.get('model', role)} {state}")
+    if "agree" in record:
+        parts.append("agree" if record["agree"] else "disagree")
+    return ", ".join(parts)
+
+
+class NotesEnsemble:
+    """Runs one notes prompt on two models; cheap_call/strong_call(prompt) -> {"notes", ...}."""
+
+    def __init__(self, cheap_call, strong_call, cheap: str, strong: str, strong_delay_s: float = 0.0,
+                 mode: str = "union", path: Path | None = None, log=None):
+        self.cheap_call = cheap_call
+        self.strong_call = strong_call
+        self.cheap = cheap
+        self.strong = strong
+        self.strong_delay_s = strong_delay_s
+        self.mode = mode
+        self.path = path
+        self.log = log
+        self.records: list[dict] = []
+        self._pool = ThreadPoolExecutor(max_workers=STRONG_WORKERS, thread_name_prefix="strong")
+        self._lock = threading.Lock()
+
+    def _write(self, record: dict):
+        with self._lock:
+            self.records.append(record)
+            if self.path is not None:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _run_strong(self, prompt: str, cancel: threading.Event, sent: list):
+        """(result, seconds), or None if cancelled before it was sent."""
+        if self.strong_delay_s:
+            cancel.wait(self.strong_delay_s)
+        with self._lock:
+            if cancel.is_set():
+                return None
+            sent.append(True)
+        t0 = time.perf_counter()
+        return self.strong_call(prompt), time.perf_counter() - t0
+
+    def notes(self, pair: str, prompt: str, local_clean: bool | None = None) -> dict:
+        """Notes for one pair (result["ensemble"] is its record). local_clean: the local schema
+        diff found nothing (None: not run).
+
+        Raises BudgetExceeded from either call, and the strong call's error if both fail.
+        """
+        cancel = threading.Event()
+        sent: list = []  # non-empty once the strong call is past the point of cancelling
+        strong = self._pool.submit(self._run_strong, prompt, cancel, sent)
+        record = {"pair": pair, "local": None if local_clean is None else ("clean" if local_clean else "findings")}
+
+        t0 = time.perf_counter()
+        cheap_result = cheap_error = None
+        try:
+            cheap_result = self.cheap_call(prompt)
+        except BudgetExceeded:
+            cancel.set()
+            strong.cancel()
+            raise
+        except Exception as e:
+            cheap_error = str(e)
+            if self.log:
+                self.log.warning(f"    Ensemble: {self.cheap} failed ({e}); waiting for {self.strong}")
+        record["cheap"] = _side(self.cheap, cheap_result, time.perf_counter() - t0, cheap_error)
+
+        if cheap_result is not None:
+            cheap_notes = cheap_result.get("notes", NO_CHANGES)
+            confidence = cheap_result.get("confidence")
+            if no_changes(cheap_notes) and (confidence == "high" or (local_clean and confidence != "low")):
+                with self._lock:
+                    cancel.set()
+                    in_flight = bool(sent)
+                record["outcome"] = "accepted"
+                if not in_flight:
+                    strong.cancel()
+                    record["strong"] = {"model": self.strong, "cancelled": True}
+                else:
+                    strong.add_done_callback(lambda f: self._late(pair, cheap_notes, f))
+                    record["strong"] = {"model": self.strong, "pending": True}
+                self._write(record)
+                return {**cheap_result, "ensemble": record}
+
+        try:
+            strong_result, strong_s = strong.result()
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            record["strong"] = _side(self.strong, None, 0.0, str(e))
+            if cheap_result is None:
+                raise
+            if self.log:
+                self.log.warning(f"    Ensemble: {self.strong} failed ({e}); using {self.cheap}")
+            record["outcome"] = "cheap"
+            self._write(record)
+            return {**cheap_result, "ensemble": record}
+        record["strong"] = _side(self.strong, strong_result, strong_s)
+        strong_notes = strong_result.get("notes", NO_CHANGES)
+        if cheap_result is None:
+            record["outcome"] = "strong"
+            self._write(record)
+            return {**strong_result, "ensemble": record}
+
+        cheap_notes = cheap_result.get("notes", NO_CHANGES)
+        record["outcome"] = "merged"
+        record["agree"] = no_changes(cheap_notes) == no_changes(strong_notes)
+        record["recall"] = recall(strong_notes, cheap_notes)
+        self._write(record)
+        return {"notes": merge(strong_notes, cheap_notes, self.mode), "ensemble": record,
+                "cheap_notes": cheap_notes, "strong_notes": strong_notes}
+
+    def _late(self, pair: str, cheap_notes: str, future):
+        """Log the result of a strong call that was still in flight when the cheap answer was accepted."""
+        try:
+            done = future.result()
+        except Exception as e:
+            self._write({"pair": pair, "late": True, "strong": _side(self.strong, None, 0.0, str(e))})
+            return
+        result, seconds = done
+        notes = result.get("notes", NO_CHANGES)
+        self._write({"pair": pair, "late": True, "strong": _side(self.strong, result, seconds),
+                     "agree": no_changes(notes), "recall": recall(notes, cheap_notes)})
+        if not no_changes(notes) and self.log:
+            self.log.info(f"    Ensemble: {self.strong} had notes for early-accepted {pair} (not applied)")
+
+    def close(self):
+        """Wait for strong calls still in flight (their results are cached and logged)."""
+        self._pool.shutdown(wait=True)
+
+    def summary(self) -> list[str]:
+        with self._lock:
+            return summarize(self.records)
+
+
+def _pct(values: list[float], pct: float) -> str:
+    if not values:
+        return "-"
+    values = sorted(values)
+    return f"{values[min(len(values) - 1, int(pct * len(values)))]:.1f}s"
+
+
+def summarize(records: list[dict]) -> list[str]:
+    """Outcomes, per-model latency and agreement over ensemble.jsonl records."""
+    pairs = [r for r in records if not r.get("late")]
+    late = [r for r in records if r.get("late") and "verdict" in r.get("strong", {})]
+    if not pairs:
+        return []
+    outcomes: dict[str, int] = {}
+    for r in pairs:
+        outcomes[r.get("outcome", "?")] = outcomes.get(r.get("outcome", "?"), 0) + 1
+    lines = [f"{len(pairs)} pairs: " + ", ".join(f"{n} {k}" for k, n in sorted(outcomes.items()))]
+
+    by_model: dict[str, dict] = {}
+    for r in pairs + late:
+        for role in ("cheap", "strong"):
+            side = r.get(role)
+            if not side or "s" not in side:
+                continue
+            m = by_model.setdefault(f"{role} {side['model']}", {"s": [], "errors": 0, "changes": 0, "n": 0})
+            if "error" in side:
+                m["errors"] += 1
+                continue
+            m["n"] += 1
+            m["s"].append(side["s"])
+            m["changes"] += side.get("verdict") == "changes"
+    for name, m in sorted(by_model.items()):
+        lines.append(f"{name}: {m['n']} calls, p50 {_pct(m['s'], 0.5)}, p95 {_pct(m['s'], 0.95)}, "
+                     f"{m['changes']} with notes, {m['errors']} errors")
+
+    both = [r for r in pairs if "agree" in r]
+    if both:
+        agree = sum(r["agree"] for r in both)
+        recalls = [r["recall"] for r in both if r.get("recall") is not None]
+        lines.append(f"verdict agreement {agree}/{len(both)} ({agree / len(both):.0%})"
+                     + (f", cheap recall of strong items {sum(recalls) / len(recalls):.0%}" if recalls else ""))
+    accepted = [r for r in pairs if r.get("outcome") == "accepted"]
+    if accepted:
+        cancelled = sum(bool(r.get("strong", {}).get("cancelled")) for r in accepted)
+        wrong = sum(not r["agree"] for r in late)
+        lines.append(f"early accepts {len(accepted)}: strong cancelled {cancelled}, "
+                     f"{len(late)} checked by the late strong result, {wrong} of them with notes")
+    local = [r for r in pairs if r.get("local") and "verdict" in r.get("cheap", {})]
+    if local:
+        agree = sum((r["local"] == "clean") == (r["cheap"]["verdict"] == "none") for r in local)
+        lines.append(f"cheap vs local schema diff agreement {agree}/{len(local)}")
+    return lines
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Agreement and latency of refine --ensemble runs.")
+    parser.add_argument("--runs", type=int, default=10, help="Recent refine runs with an ensemble.jsonl")
+    args = parser.parse_args(argv)
+
+    paths = sorted(LOGS.glob("*/ensemble.jsonl"))[-args.runs:]
+    if not paths:
+        print(f"No ensemble runs under {LOGS.relative_to(ROOT)} (refine.py --ensemble)", file=sys.stderr)
+        return 1
+    records = []
+    for path in paths:
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                records.append(json.loads(line))
+    print(f"{len(paths)} runs ({paths[0].parent.name} .. {paths[-1].parent.name})")
+    print("\n".join(summarize(records)))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
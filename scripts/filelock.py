@@ -0,0 +1,28 @@
+"""
+Advisory inter-process file lock for shared files under collected/.
+
+POSIX only (fcntl); elsewhere the lock is a no-op, so concurrent collect runs
+should be kept to one process per corpus on those platforms.
+"""
+
+import contextlib
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+@contextlib.contextmanager
+def locked(path: Path, shared: bool = False):
+    """Hold an exclusive (or shared) lock on `path` (created if missing) for the with-block."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Inverted ID index over collected/ (collected/ids.sqlite).
+
+Maps entity IDs to where they occur: (operation, req_NNN, side, JSON path),
+side = "req" | "resp", path with arrays collapsed ("$.Items[].Id"). IDs are
+  - UUID strings anywhere in a request or response (stored lowercase)
+  - integers under "Id"-like keys (Id, MaterialId, ...), except code fields
+    (*TypeId, *StatusId, LanguageId), which are enums rather than entities
+
+Updated incrementally: per-op max_nnn like corpus_index.py, and collect.py adds
+each pair as it lands. collect.py --seed-from-index fills stage stores (e.g.
+sittingId from GetAllSittings $.Items[].Id) from here instead of re-calling
+listing endpoints.
+
+Run:
+  python scripts/id_index.py [--rebuild]                 # update + stats
+  python scripts/id_index.py find 353f002b-7dad-...      # where does this ID occur
+  python scripts/id_index.py ids GetAllSittings '$.Items[].Id'
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import jsonio
+
+ROOT = Path(__file__).parent.parent
+COLLECTED = ROOT / "collected"
+INDEX_PATH = COLLECTED / "ids.sqlite"
+
+INDEX_VERSION = "1"
+UUID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+CODE_SUFFIXES = ("typeid", "statusid", "languageid")
+MAX_DEPTH = 16
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS ops (op TEXT PRIMARY KEY, max_nnn INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS refs (
+    id TEXT NOT NULL, op TEXT NOT NULL, nnn INTEGER NOT NULL, side TEXT NOT NULL,
+    path TEXT NOT NULL, is_int INTEGER NOT NULL,
+    PRIMARY KEY (id, op, nnn, side, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS refs_op_path ON refs (op, path);
+"""
+
+
+# --- Open ---
+
+def connect(path: Path = INDEX_PATH, rebuild: bool = False) -> sqlite3.Connection:
+    """Open (creating or, on version change / rebuild, resetting) the index."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    if rebuild or (row and row[0] != INDEX_VERSION):
+        conn.executescript("DELETE FROM refs; DELETE FROM ops;")
+    conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (INDEX_VERSION,))
+    conn.commit()
+    return conn
+
+
+# --- Extraction ---
+
+def _int_id_key(key: str) -> bool:
+    k = key.lower()
+    return (k == "id" or k.endswith("id")) and not k.endswith(CODE_SUFFIXES)
+
+
+def iter_ids(value, path: str = "$", key: str | None = None, depth: int = 0):
+    """(id, path, is_int) for every ID in value."""
+    if isinstance(value, str):
+        if UUID_RE.match(value):
+            yield value.lower(), path, False
+    elif isinstance(value, int) and not isinstance(value, bool):
+        if key is not None and _int_id_key(key):
+            yield str(value), path, True
+    elif depth < MAX_DEPTH:
+        if isinstance(value, dict):
+            for k, v in value.items():
+                yield from iter_ids(v, f"{path}.{k}", k, depth + 1)
+        elif isinstance(value, list):
+            for v in value:
+                yield from iter_ids(v, f"{path}[]", key, depth + 1)
+
+
+def add_pair(conn: sqlite3.Connection, op: str, nnn: int, body, resp):
+    """Index one pair (idempotent). The caller commits."""
+    rows = {(i, op, nnn, "req", p, n) for i, p, n in iter_ids(body)}
+    rows |= {(i, op, nnn, "resp", p, n) for i, p, n in iter_ids(resp)}
+    conn.executemany("INSERT OR IGNORE INTO refs VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.execute(
+        "INSERT INTO ops VALUES (?, ?) ON CONFLICT(op) DO UPDATE SET max_nnn = max(max_nnn, excluded.max_nnn)",
+        (op, nnn),
+    )
+
+
+def update(conn: sqlite3.Connection, collected_dir: Path = COLLECTED) -> int:
+    """Index pairs newer than each op's max_nnn. Returns the number of pairs added."""
+    if not collected_dir.exists():
+        return 0
+    known = dict(conn.execute("SELECT op, max_nnn FROM ops"))
+    added = 0
+    for op_dir in sorted(p for p in collected_dir.iterdir() if p.is_dir()):
+        since = known.get(op_dir.name, 0)
+        for req_path in op_dir.glob("req_*.json"):
+            num = req_path.stem.split("_")[-1]
+            try:
+                nnn = int(num)
+            except ValueError:
+                continue
+            resp_path = op_dir / f"resp_{num}.json"
+            if nnn <= since or not resp_path.exists():
+                continue
+            try:
+                body = jsonio.read(req_path)
+                resp = jsonio.read(resp_path)
+            except (json.JSONDecodeError, OSError):
+                continue
+            add_pair(conn, op_dir.name, nnn, body, resp)
+            added += 1
+    conn.commit()
+    return added
+
+
+# --- Queries ---
+
+def find(conn: sqlite3.Connection, entity_id) -> list[dict]:
+    """Every occurrence of an ID: [{"op", "nnn", "side", "path"}]."""
+    key = str(entity_id).lower()
+    rows = conn.execute("SELECT op, nnn, side, path FROM refs WHERE id = ? ORDER BY op, nnn, side, path", (key,))
+    return [{"op": op, "nnn": nnn, "side": side, "path": path} for op, nnn, side, path in rows]
+
+
+def ids_at(conn: sqlite3.Connection, op: str, path: str, side: str = "resp") -> list:
+    """Distinct IDs seen at (op, path), ints restored, in first-seen order."""
+    rows = conn.execute(
+        "SELECT id, is_int, min(nnn) AS first FROM refs WHERE op = ? AND path = ? AND side = ? "
+        "GROUP BY id ORDER BY first, id",
+        (op, path, side),
+    )
+    return [int(i) if is_int else i for i, is_int, _ in rows]
+
+
+def pairs_of(conn: sqlite3.Connection, op: str) -> list[int]:
+    """req_NNN numbers indexed for an operation."""
+    return [n for (n,) in conn.execute("SELECT DISTINCT nnn FROM refs WHERE op = ? ORDER BY nnn", (op,))]
+
+
+def index_path(jsonpath: str) -> str | None:
+    """collect's extract jsonpath ("$.Items[*].Id") as an index path ("$.Items[].Id"); None if not plain."""
+    path = jsonpath.replace("[*]", "[]")
+    if not path.startswith("$") or any(c in path for c in "?()*'\"") or ".." in path:
+        return None
+    return path
+
+
+def stats(conn: sqlite3.Connection) -> list[tuple[str, int, int, int]]:
+    """(op, pairs, distinct ids, refs) per op."""
+    return list(conn.execute(
+        "SELECT op, count(DISTINCT nnn), count(DISTINCT id), count(*) FROM refs GROUP BY op ORDER BY op"
+    ))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build, update or query collected/ids.sqlite.")
+    parser.add_argument("command", nargs="?", choices=("update", "find", "ids"), default="update")
+    parser.add_argument("args", nargs="*", help="find: ID...; ids: OPERATION PATH")
+    parser.add_argument("--rebuild", action="store_true", help="Re-index everything from scratch")
+    parser.add_argument("--collected", type=Path, default=COLLECTED)
+    args = parser.parse_args(argv)
+
+    conn = connect(args.collected / "ids.sqlite", rebuild=args.rebuild)
+    t0 = time.perf_counter()
+    added = update(conn, args.collected)
+
+    if args.command == "find":
+        for entity_id in args.args:
+            hits = find(conn, entity_id)
+            print(f"{entity_id}: {len(hits)} occurrence(s)")
+            for h in hits:
+                print(f"  {h['op']}/{h['side']}_{h['nnn']:03d}.json  {h['path']}")
+        return 0
+    if args.command == "ids":
+        if len(args.args) != 2:
+            print("usage: id_index.py ids OPERATION PATH", file=sys.stderr)
+            return 2
+        for value in ids_at(conn, args.args[0], args.args[1]):
+            print(value)
+        return 0
+
+    print(f"Indexed {added} new pair(s) in {time.perf_counter() - t0:.2f}s -> {args.collected / 'ids.sqlite'}")
+    for op, pairs, ids, refs in stats(conn):
+        print(f"  {op}: {pairs} pairs, {ids} IDs, {refs} refs")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
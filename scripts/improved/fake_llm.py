@@ -0,0 +1,118 @@
+"""
+Deterministic stand-in for the Anthropic backend, used by benchmarks and offline runs.
+
+Enable with LLM_BACKEND=fake. Outputs depend only on the prompt text:
+  - notes-style schemas ("notes" property): either "No changes needed." or a short
+    numbered note, chosen by prompt hash (FAKE_LLM_CHANGE_RATE, default 0.5).
+  - apply-style schemas ("newOperationMd"/"newGlobalMd"): the current docs found in
+    the apply prompt, returned unchanged, so validation and writes still run.
+  - enum properties (e.g. the ensemble's "confidence"): a value chosen by prompt hash.
+  - any other string property: empty string.
+
+FAKE_LLM_PER_MODEL=1 makes the notes choice depend on the model as well, so the
+models of refine --ensemble disagree now and then.
+
+Latency is simulated as FAKE_LLM_LATENCY_MS + FAKE_LLM_MS_PER_1K_OUT per 1000 output chars.
+FAKE_LLM_RATE_LIMIT_EVERY=N makes every Nth call raise governor.RateLimited
+(retry-after FAKE_LLM_RETRY_AFTER seconds, default 0.1) to exercise throttling;
+FAKE_LLM_ERROR_EVERY=N raises a 500 instead. Structured output longer than
+max_tokens (~3 chars per token) comes back with stop reason "max_tokens"; llm.py
+records its usage and then raises TruncatedOutput, like the real API.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+log = logging.getLogger("llm")
+
+_APPLY_GLOBAL_RE = re.compile(r"## Current global\.md\n\n(.*?)\n\n---\n\n## Current per-operation doc: ", re.S)
+_APPLY_OP_RE = re.compile(r"## Current per-operation doc: [^\n]*\n\n(.*?)\n\n---\n\n## Notes to apply", re.S)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _digest(prompt: str) -> int:
+    return int(hashlib.sha256(prompt.encode()).hexdigest()[:8], 16)
+
+
+def _notes_for(prompt: str, model: str | None = None) -> str:
+    rate = _env_float("FAKE_LLM_CHANGE_RATE", 0.5)
+    h = _digest(prompt + (model or "") if os.environ.get("FAKE_LLM_PER_MODEL") == "1" else prompt)
+    if (h % 1000) / 1000.0 >= rate:
+        return "No changes needed."
+    return f"1. (fake) Review response field coverage; marker {h % 997}."
+
+
+_calls = 0
+
+
+class FakeServerError(Exception):
+    status_code = 500
+
+
+def _maybe_rate_limit():
+    global _calls
+    _calls += 1
+    every = int(_env_float("FAKE_LLM_RATE_LIMIT_EVERY", 0))
+    if every and _calls % every == 0:
+        from improved.governor import RateLimited
+        raise RateLimited(_env_float("FAKE_LLM_RETRY_AFTER", 0.1))
+    every = int(_env_float("FAKE_LLM_ERROR_EVERY", 0))
+    if every and _calls % every == 0:
+        raise FakeServerError("fake 500")
+
+
+def _simulate_latency(out_chars: int):
+    ms = _env_float("FAKE_LLM_LATENCY_MS", 0.0) + _env_float("FAKE_LLM_MS_PER_1K_OUT", 0.0) * out_chars / 1000.0
+    if ms > 0:
+        time.sleep(ms / 1000.0)
+
+
+def complete(prompt: str, system: str | None, model: str | None, max_tokens: int | None) -> str:
+    _maybe_rate_limit()
+    text = _notes_for(prompt)
+    _simulate_latency(len(text))
+    log.info("complete done (fake): in~%d out~%d", len(prompt) // 3, len(text) // 3)
+    return text
+
+
+def complete_structured(
+    prompt: str,
+    schema: dict,
+    system: str | None,
+    model: str | None,
+    max_tokens: int | None,
+) -> tuple[dict, str]:
+    """(output, stop reason); "max_tokens" when the output would not fit, like a real message."""
+    _maybe_rate_limit()
+    out: dict = {}
+    for name, spec in (schema.get("properties") or {}).items():
+        if name == "notes":
+            out[name] = _notes_for(prompt, model)
+        elif spec.get("enum"):
+            out[name] = spec["enum"][_digest(name + prompt) % len(spec["enum"])]
+        elif name == "newGlobalMd":
+            m = _APPLY_GLOBAL_RE.search(prompt)
+            out[name] = m.group(1) if m else ""
+        elif name == "newOperationMd":
+            m = _APPLY_OP_RE.search(prompt)
+            out[name] = m.group(1) if m else ""
+        elif spec.get("type") == "string":
+            out[name] = ""
+    out_chars = len(json.dumps(out, ensure_ascii=False))
+    _simulate_latency(out_chars)
+    stop = "max_tokens" if max_tokens and out_chars // 3 > max_tokens else "end_turn"
+    log.info(
+        "complete_structured done (fake): model=%s, in~%d out~%d, stop=%s",
+        model, len(prompt) // 3, out_chars // 3, stop,
+    )
+    return out, stop
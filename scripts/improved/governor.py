@@ -0,0 +1,292 @@
+"""
+Token, cost and rate governor for LLM calls (improved/llm.py).
+
+Tracks input, output and cache tokens per model and enforces, from
+config/refine.json "limits":
+  - run_tokens / run_cost_usd:  hard caps for this process; a call whose prompt
+                                alone would cross a cap raises BudgetExceeded
+                                (the caller saves state and stops)
+  - tokens_per_minute / requests_per_minute:  sliding 60 s window; acquire()
+                                sleeps until the call fits. Per-model overrides
+                                under "models": {"<model>": {...}}.
+
+The window lives in a small JSON file shared by every refine process using the
+same logs dir (guarded by filelock.py), so concurrent workers throttle against
+one allowance; calls from several threads (refine --ensemble) are safe too. A
+429/529 (or the fake backend's RateLimited) halves the usable rate and pauses
+everyone until retry-after; successful calls restore the rate gradually.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+log = logging.getLogger("llm")
+
+WINDOW_S = 60.0
+# Usable share of the per-minute limits after a rate limit; recovers per successful call.
+MIN_FACTOR = 0.25
+RECOVER_STEP = 0.05
+DEFAULT_RETRY_AFTER_S = 5.0
+MAX_PAUSE_S = 120.0
+
+# USD per million tokens: (input, output, cache write, cache read); matched by model prefix.
+PRICES = {
+    "claude-opus-4": (5.0, 25.0, 6.25, 0.50),
+    "claude-sonnet-4": (3.0, 15.0, 3.75, 0.30),
+    "claude-haiku-4": (1.0, 5.0, 1.25, 0.10),
+    "claude-3-5-haiku": (0.8, 4.0, 1.0, 0.08),
+}
+DEFAULT_PRICE = PRICES["claude-sonnet-4"]
+
+USAGE_FIELDS = ("input", "output", "cache_write", "cache_read")
+
+
+class BudgetExceeded(RuntimeError):
+    """The run's token or cost cap would be crossed by the next call."""
+
+
+class RateLimited(Exception):
+    """Backend-neutral rate limit signal (raised by the fake backend; 429/529 map to it)."""
+
+    def __init__(self, retry_after: float | None = None):
+        super().__init__(f"rate limited (retry-after {retry_after})")
+        self.retry_after = retry_after
+
+
+def _estimate_tokens(s: str) -> int:
+    # Same heuristic as refine._estimate_tokens (~3 chars per token).
+    return max(1, len(s) // 3)
+
+
+class Governor:
+    def __init__(self, limits: dict | None = None, shared_path: Path | None = None):
+        limits = limits or {}
+        self.run_tokens = limits.get("run_tokens")
+        self.run_cost = limits.get("run_cost_usd")
+        self.default_rate = {k: limits.get(k) for k in ("tokens_per_minute", "requests_per_minute")}
+        self.model_rates = limits.get("models") or {}
+        self.prices = {**PRICES, **{k: tuple(v) for k, v in (limits.get("prices") or {}).items()}}
+        self.shared_path = shared_path
+        self.factor = 1.0
+        self.totals: dict[str, dict] = {}
+        # Local window when not shared: [[t, model, tokens, requests]]
+        self._window: list[list] = []
+        self._pause_until = 0.0
+        self._inflight: dict[str, int] = {}  # estimated input tokens of calls acquired but not yet recorded
+        self._lock = threading.RLock()  # totals, in-flight, factor, pause and the local window, for worker threads
+
+    # --- Accounting ---
+
+    def price(self, model: str) -> tuple:
+        best = max((p for p in self.prices if model.startswith(p)), key=len, default=None)
+        return self.prices[best] if best else DEFAULT_PRICE
+
+    def cost(self, model: str, usage: dict) -> float:
+        return sum(usage.get(f, 0) * p for f, p in zip(USAGE_FIELDS, self.price(model))) / 1e6
+
+    def _totals(self) -> list[tuple[str, dict]]:
+        """Snapshot of the per-model totals; record() may add a model from another thread."""
+        with self._lock:
+            return [(model, dict(t)) for model, t in self.totals.items()]
+
+    def spent_tokens(self) -> int:
+        return sum(sum(t[f] for f in USAGE_FIELDS) for _, t in self._totals())
+
+    def spent_cost(self) -> float:
+        return sum(t["cost"] for _, t in self._totals())
+
+    def requests(self) -> int:
+        return sum(t["requests"] for _, t in self._totals())
+
+    def record(self, model: str, usage: dict, estimated: int = 0):
+        """Count a finished call. usage: {"input", "output", "cache_write", "cache_read"}."""
+        with self._lock:
+            self._settle(model, estimated)
+            t = self.totals.setdefault(model, {"requests": 0, "cost": 0.0, **{f: 0 for f in USAGE_FIELDS}})
+            t["requests"] += 1
+            for f in USAGE_FIELDS:
+                t[f] += usage.get(f, 0) or 0
+            t["cost"] += self.cost(model, usage)
+            if any(self._rate(model)):
+                # Replace the reservation made in acquire() with the real figure.
+                actual = sum(usage.get(f, 0) or 0 for f in ("input", "output", "cache_write"))
+                self._update_window(lambda w: w.append([time.time(), model, actual - estimated, 0]))
+            self.factor = min(1.0, self.factor + RECOVER_STEP)
+
+    def release(self, model: str, reserved: int):
+        """Give back the tokens acquire() reserved for a call that failed.
+
+        The request itself stays counted: the API saw it, and a retry reserves again.
+        """
+        with self._lock:
+            self._settle(model, reserved)
+        if reserved and any(self._rate(model)):
+            self._update_window(lambda w: w.append([time.time(), model, -reserved, 0]))
+
+    def _settle(self, model: str, estimated: int):
+        left = self._inflight.get(model, 0) - estimated
+        if left > 0:
+            self._inflight[model] = left
+        else:
+            self._inflight.pop(model, None)
+
+    # --- Limits ---
+
+    def _rate(self, model: str) -> tuple[float | None, float | None]:
+        rate = {**self.default_rate, **(self.model_rates.get(model) or {})}
+        tpm, rpm = rate.get("tokens_per_minute"), rate.get("requests_per_minute")
+        return (tpm * self.factor if tpm else None), (rpm * self.factor if rpm else None)
+
+    def _check_budget(self, model: str, est_input: int):
+        """Raise unless spent + in-flight + this call fits the caps; the caller holds self._lock."""
+        if self.run_tokens:
+            spent = self.spent_tokens()
+            if spent + sum(self._inflight.values()) + est_input > self.run_tokens:
+                raise BudgetExceeded(f"token budget: {spent} spent (+ calls in flight) of {self.run_tokens}")
+        if self.run_cost:
+            spent = self.spent_cost()
+            inflight = sum(self.cost(m, {"input": n}) for m, n in self._inflight.items())
+            if spent + inflight + self.cost(model, {"input": est_input}) > self.run_cost:
+                raise BudgetExceeded(f"cost budget: ${spent:.2f} spent (+ calls in flight) of ${self.run_cost:.2f}")
+
+    def acquire(self, model: str, prompt: str) -> int:
+        """Block until a call of this size fits the rate limits. Returns the token reservation.
+
+        The budget check and the in-flight reservation are one step under the lock,
+        so two threads can't both pass on the same remaining budget. Pass the
+        returned figure to record() or release().
+        """
+        est = _estimate_tokens(prompt)
+        with self._lock:
+            self._check_budget(model, est)
+            self._inflight[model] = self._inflight.get(model, 0) + est
+        tpm, rpm = self._rate(model)
+        while True:
+            wait = 0.0
+
+            def reserve(window: list) -> None:
+                nonlocal wait
+                now = time.time()
+                pause = next((e[0] for e in window if e[1] == "_pause"), 0.0)
+                pause = max(pause, self._pause_until)
+                if pause > now:
+                    wait = pause - now
+                    return
+                mine = [e for e in window if e[1] == model]
+                used_tok = sum(e[2] for e in mine)
+                used_req = sum(e[3] for e in mine)
+                # An empty window always admits one call, however large.
+                if mine and ((tpm and used_tok + est > tpm) or (rpm and used_req + 1 > rpm)):
+                    wait = max(0.05, mine[0][0] + WINDOW_S - now)
+                    return
+                window.append([now, model, est, 1])
+
+            if not (tpm or rpm):
+                break
+            self._update_window(reserve)
+            if not wait:
+                break
+            log.info(f"governor: throttling {model} for {wait:.1f}s")
+            time.sleep(min(wait, MAX_PAUSE_S))
+        return est
+
+    def rate_limited(self, retry_after: float | None):
+        """A 429/529 came back: pause all workers and halve the usable rate."""
+        delay = min(retry_after if retry_after else DEFAULT_RETRY_AFTER_S, MAX_PAUSE_S)
+        until = time.time() + delay
+        with self._lock:
+            self.factor = max(MIN_FACTOR, self.factor / 2)
+            self._pause_until = max(self._pause_until, until)
+            factor = self.factor
+
+        def pause(window: list):
+            latest = max([until] + [e[0] for e in window if e[1] == "_pause"])
+            window[:] = [e for e in window if e[1] != "_pause"] + [[latest, "_pause", 0, 0]]
+
+        self._update_window(pause)
+        log.warning(f"governor: rate limited; pausing {delay:.1f}s, rate x{factor:.2f}")
+        time.sleep(delay)
+
+    # --- Shared window ---
+
+    def _update_window(self, fn):
+        """Run fn(window) on the pruned window, persisted to shared_path under a lock."""
+        if self.shared_path is None:
+            with self._lock:
+                self._window = _prune(self._window)
+                fn(self._window)
+            return
+        from filelock import locked
+
+        with locked(self.shared_path.with_suffix(".lock")):
+            try:
+                window = json.loads(self.shared_path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                window = []
+            window = _prune(window)
+            fn(window)
+            tmp = self.shared_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(window), encoding="utf-8")
+            os.replace(tmp, self.shared_path)
+
+    # --- Progress ---
+
+    def status(self) -> str:
+        """One-line live figures for progress output."""
+        s = f"{self.spent_tokens() / 1000:.1f}k tok, ${self.spent_cost():.2f}"
+        caps = []
+        if self.run_tokens:
+            caps.append(f"{self.run_tokens / 1000:.0f}k tok")
+        if self.run_cost:
+            caps.append(f"${self.run_cost:.2f}")
+        if caps:
+            s += f" of {' / '.join(caps)}"
+        if self.factor < 1.0:
+            s += f", throttled x{self.factor:.2f}"
+        return s
+
+    def summary(self) -> str:
+        """Per-model totals for the end-of-run log."""
+        parts = []
+        for model, t in sorted(self._totals()):
+            parts.append(
+                f"{model}: {t['requests']} calls, in={t['input']} out={t['output']} "
+                f"cache_w={t['cache_write']} cache_r={t['cache_read']}, ${t['cost']:.2f}"
+            )
+        return "; ".join(parts) or "no LLM calls"
+
+
+def _prune(window: list) -> list:
+    cutoff = time.time() - WINDOW_S
+    return [e for e in window if e[0] >= cutoff]  # pause entries are stamped with their end time
+
+
+def usage_of(msg) -> dict:
+    """Usage dict from an Anthropic Message."""
+    u = getattr(msg, "usage", None)
+    if u is None:
+        return {}
+    return {
+        "input": getattr(u, "input_tokens", 0) or 0,
+        "output": getattr(u, "output_tokens", 0) or 0,
+        "cache_write": getattr(u, "cache_creation_input_tokens", 0) or 0,
+        "cache_read": getattr(u, "cache_read_input_tokens", 0) or 0,
+    }
+
+
+def retry_after_of(exc: Exception) -> float | None:
+    """retry-after seconds if exc is a rate limit (429 / 529 overloaded); None if it is not one."""
+    if isinstance(exc, RateLimited):
+        return exc.retry_after or DEFAULT_RETRY_AFTER_S
+    if getattr(exc, "status_code", None) not in (429, 529):
+        return None
+    response = getattr(exc, "response", None)
+    header = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(header) if header else DEFAULT_RETRY_AFTER_S
+    except ValueError:
+        return DEFAULT_RETRY_AFTER_S
@@ -1,22 +1,108 @@
 """
 LLM client for Anthropic Claude. Supports structured JSON output.
+
+Set LLM_BACKEND=fake to use the deterministic offline backend in fake_llm.py
+(benchmarks, dry experiments); no API key is needed then.
+
+With set_governor(Governor(...)) every call goes through improved/governor.py:
+budget check and rate-limit wait before, usage accounting after, throttle on
+429/529.
+
+Retries live here (the SDK's own are off): rate limits wait for retry-after,
+5xx and connection errors back off exponentially with jitter. Structured
+output cut off at max_tokens raises TruncatedOutput, which callers can retry
+with a larger budget or model (see refine's apply cascade).
 """
 
 import json
 import logging
 import os
+import random
 import time
 from pathlib import Path
 
+from improved.governor import retry_after_of, usage_of
+
 log = logging.getLogger("llm")
 
-# Load .env from project root so ANTHROPIC_API_KEY is available
-try:
-    from dotenv import load_dotenv
-    root = Path(__file__).resolve().parent.parent.parent
-    load_dotenv(root / ".env")
-except ImportError:
-    pass
+# Retries per call: rate limits (429/529) and transient errors (5xx, connection, timeout).
+RATE_LIMIT_RETRIES = 6
+TRANSIENT_RETRIES = 3
+BACKOFF_BASE_S = 1.0
+BACKOFF_MAX_S = 30.0
+
+_governor = None
+# One Anthropic client per timeout, created on first use: importing anthropic costs
+# about a second and each client owns a connection pool.
+_clients: dict[float | None, object] = {}
+
+
+class TruncatedOutput(RuntimeError):
+    """Structured output hit max_tokens; the response is incomplete."""
+
+    def __init__(self, model: str, max_tokens: int | None):
+        super().__init__(
+            f"Structured output truncated (stop_reason=max_tokens, model={model}, max_tokens={max_tokens}). "
+            f"Response may be incomplete; skipping to avoid data corruption."
+        )
+        self.model = model
+        self.max_tokens = max_tokens
+
+
+def _backend() -> str:
+    return os.environ.get("LLM_BACKEND", "anthropic").strip().lower()
+
+
+def set_governor(governor):
+    """Route all calls through `governor` (improved.governor.Governor); None to disable."""
+    global _governor
+    _governor = governor
+
+
+def get_governor():
+    return _governor
+
+
+def _is_transient(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status >= 500
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def _governed(model: str, prompt: str, send):
+    """Run send() -> (result, usage) with retries, under the governor if one is set."""
+    rate_limits = transient = 0
+    while True:
+        reserved = _governor.acquire(model, prompt) if _governor else 0
+        try:
+            result, usage = send()
+        except Exception as e:
+            if _governor:
+                _governor.release(model, reserved)  # each attempt reserves again
+            delay = retry_after_of(e)
+            if delay is not None and rate_limits < RATE_LIMIT_RETRIES:
+                rate_limits += 1
+                if _governor:
+                    _governor.rate_limited(delay)
+                else:
+                    log.warning(f"rate limited; retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                continue
+            if delay is None and _is_transient(e) and transient < TRANSIENT_RETRIES:
+                wait = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** transient) * random.uniform(0.5, 1.5)
+                transient += 1
+                log.warning(f"{type(e).__name__}: {e}; retry {transient}/{TRANSIENT_RETRIES} in {wait:.1f}s")
+                time.sleep(wait)
+                continue
+            raise
+        if _governor:
+            _governor.record(model, usage, reserved)
+        return result
+
+
+def _fake_usage(prompt: str, out: str) -> dict:
+    return {"input": len(prompt) // 3, "output": len(out) // 3}
 
 
 def _strip_markdown_json(text: str) -> str:
@@ -43,6 +129,13 @@ def complete(
     Requires ANTHROPIC_API_KEY.
     max_tokens: override default; use 8192 for Haiku (e.g. claude-3-5-haiku).
     """
+    if _backend() == "fake":
+        from improved import fake_llm
+
+        def send():
+            text = fake_llm.complete(prompt, system, model, max_tokens)
+            return text, _fake_usage(prompt, text)
+        return _governed(model or "fake", prompt, send)
     if not os.environ.get("ANTHROPIC_API_KEY"):
         raise RuntimeError("Set ANTHROPIC_API_KEY")
     return _anthropic_complete(prompt, system, model, max_tokens)
@@ -73,6 +166,20 @@ def complete_structured(
     Returns parsed JSON matching schema. Requires models with structured output support
     (claude-sonnet-4-5, claude-haiku-4-5, claude-opus-4-5, claude-opus-4-6).
     """
+    if _backend() == "fake":
+        from improved import fake_llm
+
+        def send():
+            out, stop = fake_llm.complete_structured(prompt, schema, system, model, max_tokens)
+            usage = _fake_usage(prompt, json.dumps(out, ensure_ascii=False))
+            if stop == "max_tokens":
+                usage["output"] = max_tokens  # generation stopped there
+            return (out, stop), usage
+        # Recorded like a real call before TruncatedOutput is raised, as in _anthropic_complete_structured.
+        out, stop = _governed(model or "fake", prompt, send)
+        if stop == "max_tokens":
+            raise TruncatedOutput(model or "fake", max_tokens)
+        return out
     if not os.environ.get("ANTHROPIC_API_KEY"):
         raise RuntimeError("Set ANTHROPIC_API_KEY")
     return _anthropic_complete_structured(
@@ -80,15 +187,34 @@ def complete_structured(
     )
 
 
+def _client(timeout: float | None = None):
+    client = _clients.get(timeout)
+    if client is None:
+        # Load .env from project root so ANTHROPIC_API_KEY is available
+        try:
+            from dotenv import load_dotenv
+            load_dotenv(Path(__file__).resolve().parent.parent.parent / ".env")
+        except ImportError:
+            pass
+        from anthropic import Anthropic
+
+        kwargs = {"max_retries": 0} if timeout is None else {"timeout": timeout, "max_retries": 0}
+        client = _clients[timeout] = Anthropic(**kwargs)
+    return client
+
+
+def _send(client, kwargs: dict):
+    msg = client.messages.create(**kwargs)
+    return msg, usage_of(msg)
+
+
 def _anthropic_complete(
     prompt: str,
     system: str | None,
     model: str | None,
     max_tokens: int | None,
 ) -> str:
-    from anthropic import Anthropic
-
-    client = Anthropic()
+    client = _client()
     m = model or "claude-sonnet-4-20250514"
     log.debug("complete: model=%s", m)
     t0 = time.perf_counter()
@@ -99,7 +225,7 @@ def _anthropic_complete(
     }
     if system:
         kwargs["system"] = system
-    msg = client.messages.create(**kwargs)
+    msg = _governed(m, prompt, lambda: _send(client, kwargs))
     elapsed = time.perf_counter() - t0
     usage = getattr(msg, "usage", None)
     tok = f", in={usage.input_tokens} out={usage.output_tokens}" if usage else ""
@@ -117,10 +243,8 @@ def _anthropic_complete_structured(
     model: str | None,
     max_tokens: int | None,
 ) -> dict:
-    from anthropic import Anthropic
-
     # Structured output can be large; use 20min timeout to avoid "Streaming is required" error
-    client = Anthropic(timeout=1200.0)
+    client = _client(timeout=1200.0)
     m = model or "claude-haiku-4-5"
     log.debug("complete_structured: model=%s", m)
     t0 = time.perf_counter()
@@ -134,17 +258,13 @@ def _anthropic_complete_structured(
     }
     if system:
         kwargs["system"] = system
-    msg = client.messages.create(**kwargs)
+    msg = _governed(m, prompt, lambda: _send(client, kwargs))
     elapsed = time.perf_counter() - t0
     usage = getattr(msg, "usage", None)
     tok = f", in={usage.input_tokens} out={usage.output_tokens}" if usage else ""
     stop = getattr(msg, "stop_reason", None)
     log.info("complete_structured done: %.1fs%s, stop=%s", elapsed, tok, stop)
     if stop == "max_tokens":
-        raise RuntimeError(
-            f"Structured output truncated (stop_reason=max_tokens, "
-            f"max_tokens={kwargs.get('max_tokens')}). "
-            f"Response may be incomplete; skipping to avoid data corruption."
-        )
+        raise TruncatedOutput(m, kwargs.get("max_tokens"))
     text = msg.content[0].text if msg.content else "{}"
     return json.loads(text)
@@ -0,0 +1,110 @@
+"""
+JSON encode/decode through orjson when it is installed, stdlib json otherwise.
+
+Results match the stdlib exactly, whichever backend runs:
+  - loads / read:  orjson parses; input it would change (NaN/Infinity, integers past
+                   64 bits, which orjson turns into floats; str with a lone surrogate,
+                   which can't be UTF-8) goes through json.loads, and errors are
+                   json.JSONDecodeError either way
+  - dumps:         text of json.dumps(obj, ensure_ascii=False, indent=2), used for
+                   collected/ files and prompt text (so _llm_cache_key is unchanged);
+                   documents with floats (formatted differently by orjson), NaN or
+                   Infinity (orjson writes null) or anything orjson can't encode
+                   take the stdlib path
+  - dump_bytes:    compact UTF-8 for the caches (.api_cache/, .llm_cache/, index.json);
+                   not meant to match the stdlib, readers accept either form
+
+The fallback checks scan the bytes with digits folded to "0", so they stay literal
+searches; a false alarm (e.g. a 19-digit string) only costs the stdlib path.
+
+JSONIO_BACKEND=stdlib forces the fallback (bench.py --scenario json compares both).
+"""
+
+import json
+import math
+import os
+import re
+from pathlib import Path
+
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+if os.environ.get("JSONIO_BACKEND") == "stdlib":
+    _orjson = None
+
+BACKEND = "orjson" if _orjson else "stdlib"
+
+_DIGITS = bytes.maketrans(b"123456789", b"000000000")
+_LONG_INT = b"0" * 19
+# In indented output with spaces removed: a float is a member value or an array item line.
+_MEMBER_FLOAT_RE = re.compile(rb'":-?0+[.eE]')
+_ITEM_FLOAT_RE = re.compile(rb"\n-?0+[.eE]")
+
+
+class _NonFinite(float):
+    """NaN/Infinity from the stdlib parser; orjson refuses float subclasses, so encoding falls back too."""
+
+
+def loads(data: str | bytes):
+    if _orjson is not None:
+        try:
+            raw = data.encode("utf-8") if isinstance(data, str) else data
+        except UnicodeEncodeError:  # lone surrogate: only the stdlib takes it
+            raw = _LONG_INT
+        if _LONG_INT not in raw.translate(_DIGITS):
+            try:
+                return _orjson.loads(raw)
+            except _orjson.JSONDecodeError:
+                pass
+    return json.loads(data, parse_constant=_NonFinite)
+
+
+def read(path: Path):
+    return loads(path.read_bytes())
+
+
+def _has_float(indented: bytes) -> bool:
+    folded = indented.translate(_DIGITS, b" ")
+    return (folded[:1] in (b"-", b"0") or _MEMBER_FLOAT_RE.search(folded) is not None
+            or _ITEM_FLOAT_RE.search(folded) is not None)
+
+
+def _has_nonfinite(obj) -> bool:
+    """NaN or Infinity anywhere in obj (orjson writes them as null)."""
+    stack = [obj]
+    while stack:
+        x = stack.pop()
+        if isinstance(x, float):
+            if not math.isfinite(x):
+                return True
+        elif isinstance(x, dict):
+            stack.extend(x.values())
+        elif isinstance(x, (list, tuple)):
+            stack.extend(x)
+    return False
+
+
+def dumps(obj) -> str:
+    """json.dumps(obj, ensure_ascii=False, indent=2), byte for byte."""
+    if _orjson is not None:
+        try:
+            raw = _orjson.dumps(obj, option=_orjson.OPT_INDENT_2)
+        except TypeError:
+            raw = None
+        if raw is not None and not _has_float(raw) and not (b"null" in raw and _has_nonfinite(obj)):
+            return raw.decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, indent=2)
+
+
+def dump_bytes(obj) -> bytes:
+    """Compact UTF-8 JSON for cache files."""
+    if _orjson is not None:
+        try:
+            raw = _orjson.dumps(obj)
+        except TypeError:
+            raw = None
+        if raw is not None and not (b"null" in raw and _has_nonfinite(obj)):
+            return raw
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
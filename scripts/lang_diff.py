@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Structural diff of collect.py --languages variants against their primary pair.
+
+Each variant response (LanguageId 2 or 3) is walked in parallel with the
+LanguageId 1 response it is linked to ("group"), arrays item by item and
+collapsed to [] in paths. Per language and JSON path it records:
+  - keys present in only one of the two responses
+  - JSON type differences (e.g. string vs null)
+  - array length and non-text value differences (IDs incl. GUIDs, counts, flags)
+  - text fields: translated, or the same Cyrillic text as LanguageId 1
+    (the site falls back to Macedonian where a translation is missing)
+
+refine.py sends the rendered diff of all of an operation's variants to one notes
+call (prompts/notes_from_languages.txt) instead of a notes call per variant pair;
+an operation whose variants differ only by translated text needs no call at all.
+
+Run: python scripts/lang_diff.py GetAllSittings
+"""
+
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+
+import jsonio
+from schema_diff import json_type, load_defs
+
+ROOT = Path(__file__).parent.parent
+COLLECTED = ROOT / "collected"
+
+GLOBAL_MD = ROOT / "docs" / "global.md"
+
+# Used when global.md's $defs LanguageId has no "1=Macedonian, ..." description.
+DEFAULT_LANGUAGE_NAMES = {1: "Macedonian", 2: "Albanian", 3: "Turkish"}
+MAX_PATHS = 200
+MAX_DEPTH = 12
+MAX_EXAMPLE_CHARS = 60
+
+_ASPDATE_RE = re.compile(r"^/Date\((-?\d+)(?:[+-]\d{4})?\)/$")
+_GUID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+_CYRILLIC_RE = re.compile("[\u0400-\u04ff]")
+_LANGUAGE_NAME_RE = re.compile(r"(\d+)\s*=\s*([^,;\n]+)")
+
+
+def language_names(defs: dict | None) -> dict[int, str]:
+    """LanguageId -> name from the $defs LanguageId description ("1=Macedonian, 2=Albanian, ...")."""
+    entry = (defs or {}).get("LanguageId")
+    desc = entry.get("description", "") if isinstance(entry, dict) else ""
+    names = {int(k): v.strip().rstrip(".") for k, v in _LANGUAGE_NAME_RE.findall(desc)}
+    return names or dict(DEFAULT_LANGUAGE_NAMES)
+
+
+def _is_text(value: str) -> bool:
+    return not (_ASPDATE_RE.match(value) or _GUID_RE.match(value)) and any(c.isalpha() for c in value)
+
+
+def _short(value: str) -> str:
+    return json.dumps(value if len(value) <= MAX_EXAMPLE_CHARS else value[:MAX_EXAMPLE_CHARS] + "…",
+                      ensure_ascii=False)
+
+
+class _TextStat:
+    __slots__ = ("translated", "same", "fallback", "example")
+
+    def __init__(self):
+        self.translated = 0
+        self.same = 0  # identical non-Cyrillic text (names, codes)
+        self.fallback = 0  # identical Cyrillic text
+        self.example: tuple[str, str] | None = None  # (primary, variant) of a translation
+
+
+class LanguageDiff:
+    """Differences between primary responses and their variants in one language."""
+
+    def __init__(self, lang: int):
+        self.lang = lang
+        self.pairs = 0
+        self.only_primary: dict[str, int] = {}
+        self.only_variant: dict[str, int] = {}
+        self.types: dict[str, dict[tuple[str, str], int]] = {}
+        self.lengths: dict[str, int] = {}
+        self.values: dict[str, int] = {}
+        self.text: dict[str, _TextStat] = {}
+        self.fallback_examples: dict[str, str] = {}
+
+    def add(self, primary, variant):
+        self.pairs += 1
+        self._walk(primary, variant, "$", 0)
+
+    def _walk(self, a, b, path: str, depth: int):
+        ta, tb = json_type(a), json_type(b)
+        if ta != tb:
+            seen = self.types.setdefault(path, {})
+            seen[(ta, tb)] = seen.get((ta, tb), 0) + 1
+            return
+        if depth >= MAX_DEPTH:
+            return
+        if isinstance(a, dict):
+            for k, v in a.items():
+                if k in b:
+                    self._walk(v, b[k], f"{path}.{k}", depth + 1)
+                else:
+                    self.only_primary[f"{path}.{k}"] = self.only_primary.get(f"{path}.{k}", 0) + 1
+            for k in b.keys() - a.keys():
+                self.only_variant[f"{path}.{k}"] = self.only_variant.get(f"{path}.{k}", 0) + 1
+        elif isinstance(a, list):
+            if len(a) != len(b):
+                self.lengths[path] = self.lengths.get(path, 0) + 1
+            for x, y in zip(a, b):
+                self._walk(x, y, f"{path}[]", depth + 1)
+        elif isinstance(a, str) and _is_text(a):
+            stat = self.text.get(path)
+            if stat is None:
+                stat = self.text[path] = _TextStat()
+            if a != b:
+                stat.translated += 1
+                if stat.example is None:
+                    stat.example = (a, b)
+            elif _CYRILLIC_RE.search(a):
+                stat.fallback += 1
+                self.fallback_examples.setdefault(path, a)
+            else:
+                stat.same += 1
+        elif a != b:
+            self.values[path] = self.values.get(path, 0) + 1
+
+    def trivial(self) -> bool:
+        """True if the variants differ from LanguageId 1 only by translated text."""
+        return not (self.only_primary or self.only_variant or self.types or self.lengths or self.values
+                    or any(s.fallback for s in self.text.values()))
+
+    def render(self, names: dict[int, str] | None = None, max_paths: int = MAX_PATHS) -> str:
+        name = (names or DEFAULT_LANGUAGE_NAMES).get(self.lang, "?")
+        lines = [f"LanguageId {self.lang} ({name}), {self.pairs} pairs:"]
+        for path, n in self.only_primary.items():
+            lines.append(f"  {path}: only in LanguageId 1 (×{n})")
+        for path, n in self.only_variant.items():
+            lines.append(f"  {path}: only in LanguageId {self.lang} (×{n})")
+        for path, seen in self.types.items():
+            lines.append(f"  {path}: " + ", ".join(
+                f"{ta} in LanguageId 1 but {tb} in LanguageId {self.lang} (×{n})" for (ta, tb), n in seen.items()
+            ))
+        for path, n in self.lengths.items():
+            lines.append(f"  {path}: array length differs (×{n})")
+        for path, n in self.values.items():
+            lines.append(f"  {path}: value differs (×{n})")
+        for path, stat in self.text.items():
+            if stat.fallback:
+                kind = "mixed: " if stat.translated else ""
+                lines.append(
+                    f"  {path}: {kind}same Cyrillic text as LanguageId 1 ×{stat.fallback}"
+                    f" (e.g. {_short(self.fallback_examples[path])})"
+                    + (f", translated ×{stat.translated}" if stat.translated else "")
+                )
+            elif stat.translated:
+                a, b = stat.example
+                lines.append(f"  {path}: translated ×{stat.translated} (e.g. {_short(a)} -> {_short(b)})"
+                             + (f", same ×{stat.same}" if stat.same else ""))
+        if len(lines) == 1:
+            lines.append("  (identical to LanguageId 1)")
+        if len(lines) > max_paths + 1:
+            lines = lines[:max_paths + 1] + [f"  ({len(lines) - max_paths - 1} more paths omitted)"]
+        return "\n".join(lines)
+
+
+def primary_resp(variant: dict) -> str:
+    """Response path of the primary pair a variant is linked to."""
+    op, name = variant["group"].rsplit("/", 1)
+    return f"{op}/{name.replace('req_', 'resp_', 1)}"
+
+
+def diff_variants(variants: list[dict], collected: Path) -> dict[int, LanguageDiff]:
+    """LanguageDiff per language over variant pairs ({"resp", "lang", "group"}) of one operation.
+
+    Variants whose primary request failed (no primary response) are skipped.
+    """
+    diffs: dict[int, LanguageDiff] = {}
+    for v in variants:
+        try:
+            primary = jsonio.read(collected / primary_resp(v))
+            resp = jsonio.read(collected / v["resp"])
+        except (OSError, json.JSONDecodeError):
+            continue
+        lang = v.get("lang")
+        diff = diffs.get(lang)
+        if diff is None:
+            diff = diffs[lang] = LanguageDiff(lang)
+        diff.add(primary, resp)
+    return dict(sorted(diffs.items(), key=lambda kv: str(kv[0])))
+
+
+def render(diffs: dict[int, LanguageDiff], names: dict[int, str] | None = None) -> str:
+    return "\n\n".join(d.render(names) for d in diffs.values())
+
+
+def linked_variants(collected: Path, op: str) -> list[dict]:
+    """Variant pairs of op in the manifest and the active collect journals."""
+    from run_journal import pending_runs
+
+    runs = []
+    manifest = collected / "manifest.json"
+    if manifest.exists():
+        runs = jsonio.read(manifest).get("runs", [])
+    runs += pending_runs(collected)
+    seen: set[str] = set()
+    out = []
+    for run in runs:
+        for p in run.get("pairs", []):
+            if p.get("group") and p["req"].startswith(f"{op}/") and p["req"] not in seen:
+                seen.add(p["req"])
+                out.append(p)
+    return out
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Per-language differences of an operation's --languages pairs.")
+    parser.add_argument("operation", help="Operation name (directory under collected/)")
+    args = parser.parse_args(argv)
+
+    variants = linked_variants(COLLECTED, args.operation)
+    if not variants:
+        print(f"No language variants of {args.operation} (collect with --languages)", file=sys.stderr)
+        return 1
+    diffs = diff_variants(variants, COLLECTED)
+    defs = load_defs(GLOBAL_MD.read_text(encoding="utf-8")) if GLOBAL_MD.exists() else {}
+    print(render(diffs, language_names(defs)))
+    if all(d.trivial() for d in diffs.values()):
+        print("\nOnly translated text differs.")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
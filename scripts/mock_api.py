@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Sobranie API that replays collected req/res pairs.
+
+Serves the three routing styles used by collect.py:
+  - Standard:       POST /Routing/MakePostRequest (op from methodName/MethodName)
+  - ASMX:           POST /Moldova/services/<Service>.asmx/<Op>
+  - Infrastructure: POST /Infrastructure/<Op>
+
+Lookup is by operation + request body hash. A body never seen for a known
+operation gets a deterministic pick among that operation's responses, so random
+generator values (Page, Rows, ...) still hit real data. Recorded 4xx errors from
+errors/ are replayed with their status code.
+
+Run: python scripts/mock_api.py [--port 8765] [--latency-ms 50] [--error-rate 0.05]
+Then: python scripts/collect.py --base-url http://127.0.0.1:8765
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+COLLECTED = ROOT / "collected"
+ERRORS = ROOT / "errors"
+
+
+def _body_key(body) -> str:
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def load_corpus(collected_dir: Path = COLLECTED, errors_dir: Path = ERRORS) -> dict:
+    """Index collected pairs (and recorded client errors) by operation and body hash.
+
+    Returns {"ops": {op: {"by_hash": {hash: resp_path}, "all": [resp_path, ...]}},
+             "errors": {op: {hash: (status, body)}}, "pairs": N}.
+    Response files are read lazily on first hit and kept as raw bytes.
+    """
+    ops: dict[str, dict] = {}
+    errors: dict[str, dict] = {}
+    n = 0
+    if collected_dir.exists():
+        for op_dir in sorted(p for p in collected_dir.iterdir() if p.is_dir()):
+            entry = {"by_hash": {}, "all": []}
+            for req_path in sorted(op_dir.glob("req_*.json")):
+                nnn = req_path.stem.split("_", 1)[1]
+                resp_path = op_dir / f"resp_{nnn}.json"
+                err_path = errors_dir / op_dir.name / f"err_{nnn}.json"
+                try:
+                    body = json.loads(req_path.read_text(encoding="utf-8"))
+                except (json.JSONDecodeError, OSError):
+                    continue
+                if resp_path.exists():
+                    entry["by_hash"][_body_key(body)] = resp_path
+                    entry["all"].append(resp_path)
+                    n += 1
+                elif err_path.exists():
+                    try:
+                        err = json.loads(err_path.read_text(encoding="utf-8"))
+                    except (json.JSONDecodeError, OSError):
+                        continue
+                    code = err.get("_error")
+                    if isinstance(code, int) and 400 <= code < 500:
+                        errors.setdefault(op_dir.name, {})[_body_key(body)] = (code, err.get("_body", ""))
+            if entry["all"]:
+                ops[op_dir.name] = entry
+    return {"ops": ops, "errors": errors, "pairs": n}
+
+
+def operation_for(path: str, body) -> str | None:
+    """Resolve the operation name from the URL path and request body."""
+    path = path.split("?", 1)[0].rstrip("/")
+    if path.endswith("/Routing/MakePostRequest"):
+        if isinstance(body, dict):
+            return body.get("methodName") or body.get("MethodName")
+        return None
+    if ".asmx/" in path or "/Infrastructure/" in path:
+        return path.rsplit("/", 1)[-1] or None
+    return None
+
+
+def make_server(
+    corpus: dict,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    error_rate: float = 0.0,
+    error_status: int = 500,
+    seed: int = 0,
+) -> ThreadingHTTPServer:
+    """Build (but do not start) a replay server. port=0 picks a free port."""
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    body_cache: dict[Path, bytes] = {}
+    stats = {"requests": 0, "hits": 0, "fallbacks": 0, "misses": 0, "injected": 0, "replayed_errors": 0}
+    stats_lock = threading.Lock()
+
+    def _count(key: str):
+        with stats_lock:
+            stats[key] += 1
+
+    def _resp_bytes(path: Path) -> bytes:
+        data = body_cache.get(path)
+        if data is None:
+            data = path.read_bytes()
+            body_cache[path] = data
+        return data
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):  # noqa: A002 - stdlib signature
+            pass
+
+        def _send(self, status: int, payload: bytes):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            try:
+                body = json.loads(raw) if raw else {}
+            except json.JSONDecodeError:
+                body = None
+            _count("requests")
+
+            with rng_lock:
+                delay = latency_ms + (rng.uniform(0, jitter_ms) if jitter_ms else 0.0)
+                inject = error_rate > 0 and rng.random() < error_rate
+            if delay > 0:
+                time.sleep(delay / 1000.0)
+            if inject:
+                _count("injected")
+                self._send(error_status, b'{"Message":"Injected error"}')
+                return
+
+            op = operation_for(self.path, body)
+            entry = corpus["ops"].get(op) if op else None
+            key = _body_key(body)
+            recorded_err = corpus["errors"].get(op, {}).get(key) if op else None
+            if recorded_err is not None:
+                _count("replayed_errors")
+                status, text = recorded_err
+                self._send(status, str(text).encode("utf-8"))
+                return
+            if entry is None:
+                _count("misses")
+                self._send(404, json.dumps({"Message": f"Unknown operation: {op}"}).encode("utf-8"))
+                return
+            path = entry["by_hash"].get(key)
+            if path is not None:
+                _count("hits")
+            else:
+                _count("fallbacks")
+                path = entry["all"][int(key, 16) % len(entry["all"])]
+            self._send(200, _resp_bytes(path))
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.stats = stats
+    return server
+
+
+def serve_in_thread(server: ThreadingHTTPServer) -> str:
+    """Start server on a daemon thread; return its base URL (no trailing slash)."""
+    t = threading.Thread(target=server.serve_forever, name="mock-api", daemon=True)
+    t.start()
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay collected pairs as a local Sobranie API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--corpus", type=Path, default=COLLECTED, help="Collected pairs directory")
+    parser.add_argument("--errors", type=Path, default=ERRORS, help="Recorded errors directory")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fixed latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Extra uniform random latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an injected error")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status for injected errors")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus, args.errors)
+    if not corpus["ops"]:
+        print(f"ERROR: no pairs found in {args.corpus}")
+        return 1
+    server = make_server(
+        corpus, args.host, args.port,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, error_status=args.error_status, seed=args.seed,
+    )
+    print(f"Mock API on http://{args.host}:{server.server_address[1]} "
+          f"({corpus['pairs']} pairs, {len(corpus['ops'])} ops)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Stats: {server.stats}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
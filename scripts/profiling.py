@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+cProfile and tracemalloc for one collect.py or refine.py run (--profile, --trace-memory).
+
+Everything is written into the run's log directory (logs/<run_id>/ or
+logs/refine/<run_id>/):
+  - profile.pstats          cProfile stats of the whole run (pstats / snakeviz)
+  - memory_final.txt        top allocation sites at the end, traced current/peak
+  - profile_summary.txt     hot functions (own time, and cumulative time of the
+                            repo's own functions: _fit_response_to_budget,
+                            rebuild_api_md, jsonio.read, llm_call waiting on the
+                            API, ...) and the peak allocation sites
+With --profile-interval SECONDS the run also writes profile_NNN.pstats (the
+run so far) and memory_NNN.txt (allocations now, peak since the last sample)
+about every SECONDS, so a long or stuck run can be looked at while it goes.
+Samples are taken from the run's main loop (each recorded pair in collect,
+each scheduled pair in refine), never from another thread.
+
+cProfile sees the main thread only: in collect the concurrent fetches show up
+as time waiting on their futures. tracemalloc slows a run down noticeably;
+use it to find where memory goes, not to time things.
+
+Run: python scripts/profiling.py logs/refine/<run_id>/profile.pstats [--top 30]
+"""
+
+import argparse
+import cProfile
+import logging
+import pstats
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+TOP_N = 25  # lines per table in the files
+LOG_TOP_N = 8  # lines per table in the run log
+MEMORY_FRAMES = 1
+
+# Allocation sites left out of the tables: the tracing and sampling machinery itself
+_NOT_OURS = {tracemalloc.__file__, cProfile.__file__, pstats.__file__, "<unknown>"}
+
+
+def _mb(n: int) -> str:
+    return f"{n / (1 << 20):.1f} MB" if n >= 1 << 20 else f"{n / 1024:.1f} KB"
+
+
+def _where(filename: str, line: int, func: str) -> str:
+    path = Path(filename)
+    try:
+        filename = str(path.relative_to(ROOT))
+    except ValueError:
+        if path.is_absolute():
+            filename = path.name
+    if not line:
+        return func
+    return f"{filename}:{line}({func})" if func else f"{filename}:{line}"
+
+
+def hot_functions(stats: pstats.Stats, top: int = TOP_N) -> list[str]:
+    """Top functions by own time (all code) and by cumulative time (the repo's own code)."""
+    entries = [(where, cc, nc, tt, ct) for where, (cc, nc, tt, ct, _callers) in stats.stats.items()]
+    total = getattr(stats, "total_tt", 0) or 1e-9
+
+    def row(where, nc, tt, ct) -> str:
+        return f"  {ct:9.3f}s cum {tt:9.3f}s own {tt / total:6.1%} {nc:>9} calls  {_where(*where)}"
+
+    lines = [f"Total {total:.3f}s", "", "By own time:"]
+    for where, _cc, nc, tt, ct in sorted(entries, key=lambda e: -e[3])[:top]:
+        lines.append(row(where, nc, tt, ct))
+    lines += ["", "By cumulative time (repo code):"]
+    ours = [e for e in entries if e[0][0].startswith(str(ROOT))]
+    for where, _cc, nc, tt, ct in sorted(ours, key=lambda e: -e[4])[:top]:
+        lines.append(row(where, nc, tt, ct))
+    return lines
+
+
+def top_allocations(snapshot: tracemalloc.Snapshot, top: int = TOP_N) -> list[str]:
+    # Filtered after grouping: Snapshot.filter_traces matches every trace in Python
+    # and takes seconds on a large heap.
+    lines = []
+    for stat in snapshot.statistics("lineno"):
+        frame = stat.traceback[0]
+        if frame.filename in _NOT_OURS or frame.filename.startswith("<frozen importlib"):
+            continue
+        if len(lines) == top:
+            break
+        lines.append(f"  {_mb(stat.size):>10} {stat.count:>9} blocks  {_where(frame.filename, frame.lineno, '')}")
+    return lines
+
+
+class RunProfiler:
+    """Context manager around a run; does nothing unless profile or trace_memory is set.
+
+    tick() is called from the run's main loop and takes a sample once `interval`
+    seconds have passed since the last one.
+    """
+
+    def __init__(self, log_dir: Path, profile: bool = False, trace_memory: bool = False,
+                 interval: float | None = None, top: int = TOP_N, logger: str | None = None):
+        self.log_dir = log_dir
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.interval = interval
+        self.top = top
+        self.logger = logger
+        self.samples = 0
+        self._profiler: cProfile.Profile | None = None
+        self._tracing = False
+        self._last = 0.0
+        self._peak = 0  # highest traced memory over all samples
+        self._max_current = 0  # largest heap at a sample, whose sites are reported
+        self._peak_at = ""
+        self._peak_sites: list[str] = []
+
+    @property
+    def active(self) -> bool:
+        return self._profiler is not None or self._tracing
+
+    def __enter__(self):
+        if not (self.profile or self.trace_memory):
+            return self
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_FRAMES)
+            self._tracing = True
+        if self.profile:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:  # another profiler (or debugger) is active
+                print(f"WARN: --profile: {e}", file=sys.stderr)
+            else:
+                self._profiler = profiler
+        self._last = time.monotonic()
+        return self
+
+    def tick(self):
+        if self.interval is None or not self.active:
+            return
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            self.sample()
+
+    def sample(self):
+        """Write profile_NNN.pstats (the run so far) and memory_NNN.txt."""
+        self.samples += 1
+        name = f"{self.samples:03d}"
+        if self._profiler is not None:
+            self._profiler.disable()  # the sample itself stays out of the profile
+            self._profiler.dump_stats(self.log_dir / f"profile_{name}.pstats")
+        if self._tracing:
+            self._snapshot(self.log_dir / f"memory_{name}.txt", f"sample {name}")
+        if self._profiler is not None:
+            self._profiler.enable()
+
+    def _snapshot(self, path: Path, label: str):
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        snapshot = tracemalloc.take_snapshot()
+        sites = top_allocations(snapshot, self.top)
+        if current >= self._max_current:
+            self._max_current, self._peak_sites, self._peak_at = current, sites, label
+        self._peak = max(self._peak, peak)
+        path.write_text(f"Traced {_mb(current)}, peak since last sample {_mb(peak)}\n\n" + "\n".join(sites) + "\n",
+                        encoding="utf-8")
+
+    def __exit__(self, *exc):
+        if not self.active:
+            return False
+        lines = []
+        if self._profiler is not None:
+            self._profiler.disable()
+            path = self.log_dir / "profile.pstats"
+            self._profiler.dump_stats(path)
+            self._profiler = None
+            lines += ["# Hot functions", ""] + hot_functions(pstats.Stats(str(path)), self.top) + [""]
+        if self._tracing:
+            self._snapshot(self.log_dir / "memory_final.txt", "end")
+            tracemalloc.stop()
+            self._tracing = False
+            lines += [f"# Memory: peak {_mb(self._peak)}", "",
+                      f"Largest traced heap at {self._peak_at}:"] + self._peak_sites + [""]
+        (self.log_dir / "profile_summary.txt").write_text("\n".join(lines), encoding="utf-8")
+        self._log(lines)
+        return False
+
+    def _log(self, lines: list[str]):
+        """The first LOG_TOP_N rows of each table, into the run log."""
+        log = logging.getLogger(self.logger) if self.logger else None
+        out, rows = [], 0
+        for line in lines:
+            if line.startswith("  "):
+                rows += 1
+                if rows > LOG_TOP_N:
+                    continue
+            elif line:
+                rows = 0
+            else:
+                continue
+            out.append(line)
+        out.append(f"Profile written to {self.log_dir} ({self.samples} interval samples)")
+        for line in out:
+            if log is not None and log.handlers:
+                log.info(line if line.startswith("  ") else f"  {line}")
+            else:
+                print(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Hot functions of a --profile run.")
+    parser.add_argument("pstats", type=Path, help="profile.pstats or profile_NNN.pstats from a run's log directory")
+    parser.add_argument("--top", type=int, default=TOP_N, help=f"Rows per table (default {TOP_N})")
+    args = parser.parse_args(argv)
+
+    if not args.pstats.exists():
+        print(f"No such file: {args.pstats}", file=sys.stderr)
+        return 1
+    print("\n".join(hot_functions(pstats.Stats(str(args.pstats)), args.top)))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -4,18 +4,33 @@ Refine docs from collected req/res pairs.
 
 Pipeline:
   1. Load pairs from collected/manifest.json
-  2. For each pair: LLM notes step (what should change)
-  3. Every batch_size notes: LLM apply step (produce new docs)
+     (--aggregate: one notes call per op on a merged shape summary of all its
+     pending pairs plus a few exemplars, shape_summary.py, instead of step 2)
+  2. For each pair: LLM notes step (what should change); pairs whose differences
+     are purely mechanical schema widenings get local notes instead (schema_diff.py),
+     patched straight into the JSON blocks where possible (doc_patch.py).
+     Other-language variants from collect.py --languages are not notes pairs of
+     their own: after the LanguageId 1 pairs, one notes call per op covers the
+     structural diff of all its variants (lang_diff.py), none if only text differs
+  3. Batched LLM apply step (produce new docs); batches sized against the apply
+     output budget with duplicate notes coalesced (apply_batcher.py)
   4. Write updated docs, rebuild API.md
 
-Resumable via logs/refine/<run_id>/state.json.
-LLM calls cached in .llm_cache/ (skip with --no-llm-cache).
+Resumable via logs/refine/<run_id>/state.json. With --watch the run does not end
+when the pending pairs are done: it tails collect's run journals (run_journal.JournalTail)
+and feeds newly landed pairs into the same loop until interrupted or idle.
+LLM calls cached in .llm_cache/ (skip with --no-llm-cache). Token/cost caps and
+rate limits ("limits" in config/refine.json) are enforced by improved/governor.py.
 
 Usage:
   python scripts/refine.py
   python scripts/refine.py --batch-size 5 --op GetAllSittings
   python scripts/refine.py --resume 2026-02-09_18-00-00
   python scripts/refine.py --dry-run
+  python scripts/refine.py --max-tokens-budget 2000000 --deadline 06:00
+  python scripts/refine.py --max-cost 5
+  python scripts/refine.py --aggregate --op GetAllSittings
+  python scripts/refine.py --watch 10      # keep consuming pairs as collect journals them
 """
 
 import argparse
@@ -25,12 +40,27 @@ import logging
 import os
 import sys
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 
 ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(ROOT / "scripts"))
 
+import doc_patch
+import ensemble
+import jsonio
+import lang_diff
+import schema_diff
+from apply_batcher import ApplyBatcher
+from doc_history import History
+from docmodel import DocModel, Template
+from improved.governor import BudgetExceeded, Governor
+from improved.llm import TruncatedOutput, complete_structured, set_governor
+from run_journal import JournalTail
+from sampling import is_marker, sample
+from shape_summary import summarize
+from scheduler import prioritize
+
 DOCS = ROOT / "docs"
 GLOBAL_MD = DOCS / "global.md"
 OPS_DIR = DOCS / "ops"
@@ -54,6 +84,22 @@ NOTES_SCHEMA = {
     "additionalProperties": False,
 }
 
+# The cheap model's notes schema under --ensemble: the notes plus how sure it is (ensemble.py).
+NOTES_CONFIDENCE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        **NOTES_SCHEMA["properties"],
+        "confidence": {
+            "type": "string",
+            "enum": list(ensemble.CONFIDENCE),
+            "description": "How sure you are that the notes are complete: 'high' only if every field, "
+                           "value and behavior in the pair is certainly covered (or certainly noted).",
+        },
+    },
+    "required": ["notes", "confidence"],
+    "additionalProperties": False,
+}
+
 APPLY_SCHEMA = {
     "type": "object",
     "properties": {
@@ -79,6 +125,18 @@ SYSTEM_NOTES = (
     "for the Sobranie.mk parliament API. Be precise and concise."
 )
 
+# Appended to the notes prompt in --local-notes hint mode (only when the diff found something).
+LOCAL_DIFF_HINT = """
+
+---
+
+## Local schema diff
+
+A deterministic comparison of this response against the Response Schema and global $defs found these widenings. Include them in your notes (correct any the pair contradicts) and focus your analysis on what a schema diff cannot see: descriptions, enum meanings, behavior.
+
+<<<local_notes>>>
+"""
+
 SYSTEM_APPLY = (
     "You produce updated Sobranie.mk API documentation by applying analyst notes. "
     "Preserve all existing information; only refine and improve accuracy."
@@ -90,6 +148,17 @@ NOTES_INPUT_BUDGET = 15_000
 MAX_STR_LENGTH = 200
 # Max tokens for request body so huge requests don't blow total prompt size.
 REQUEST_MAX_TOKENS = 2000
+# --aggregate: exemplar pairs (distinct response shapes) shown next to the summary.
+AGGREGATE_EXEMPLARS = 3
+# Apply output budget: the whole op .md + global.md are regenerated per call.
+APPLY_MAX_TOKENS = 32000
+# Retried in order when the apply output is truncated (config "apply_cascade" overrides);
+# a step without "model" keeps the previous one.
+DEFAULT_APPLY_CASCADE = [{"max_tokens": 64000}]
+# --watch: new pairs taken per poll (the rest stay unread in the journals), and at most
+# one API.md rebuild per debounce interval while pairs keep coming.
+WATCH_QUEUE_MAX = 200
+WATCH_API_DEBOUNCE_S = 60.0
 
 # --- Helpers ---
 
@@ -99,6 +168,10 @@ def _estimate_tokens(s: str) -> int:
     return max(1, len(s) // 3)
 
 
+def _json_tokens(data) -> int:
+    return _estimate_tokens(json.dumps(data, ensure_ascii=False))
+
+
 def _truncate_values(data, max_str: int = MAX_STR_LENGTH):
     """Truncate string (and other value) lengths only; do not cap array sizes."""
     if isinstance(data, list):
@@ -117,7 +190,7 @@ def _find_largest_lists(data, path=()):
         out.append((path, len(data)))
         for i, item in enumerate(data):
             out.extend(_find_largest_lists(item, path + (i,)))
-    elif isinstance(data, dict):
+    elif isinstance(data, dict) and not is_marker(data):
         for k, v in data.items():
             out.extend(_find_largest_lists(v, path + (k,)))
     return out
@@ -150,7 +223,7 @@ def _replace_at_path(data, path, value):
 
 
 def _shrink_largest_array(data):
-    """Shrink the largest array (by item count) by half; add _truncated for the rest. Return new data."""
+    """Halve the largest array (by item count), keeping one item per distinct shape (sampling.py)."""
     candidates = _find_largest_lists(data)
     if not candidates:
         return data
@@ -158,21 +231,22 @@ def _shrink_largest_array(data):
     if length <= 1:
         return data
     lst = _get_at_path(data, path)
-    n = (length + 1) // 2
-    new_list = list(lst[:n]) + [{"_truncated": length - n}]
-    return _replace_at_path(data, path, new_list)
+    if is_marker(lst[-1]):
+        length -= 1  # already sampled: halve the real items
+        if length <= 1:
+            return data
+    return _replace_at_path(data, path, sample(lst, (length + 1) // 2))
 
 
 def _fit_response_to_budget(data, budget_tokens: int) -> object:
     """Cap arrays so that json.dumps(data) fits in budget_tokens (value truncation already applied)."""
-    while True:
-        current_tokens = _estimate_tokens(json.dumps(data, ensure_ascii=False))
-        if current_tokens <= budget_tokens:
-            break
+    current_tokens = _json_tokens(data)
+    while current_tokens > budget_tokens:
         new_data = _shrink_largest_array(data)
-        if _estimate_tokens(json.dumps(new_data, ensure_ascii=False)) >= current_tokens:
+        new_tokens = _json_tokens(new_data)
+        if new_tokens >= current_tokens:
             break  # no progress (e.g. all arrays length <= 1)
-        data = new_data
+        data, current_tokens = new_data, new_tokens
     return data
 
 
@@ -221,7 +295,7 @@ def _llm_cache_key(prompt: str, schema: dict, system: str, model: str = "") -> s
 def _read_llm_cache(cache_file: Path, model: str | None, max_tokens: int | None, log=None):
     """Return cached result when metadata matches current call parameters."""
     try:
-        cached = json.loads(cache_file.read_text(encoding="utf-8"))
+        cached = jsonio.read(cache_file)
     except (json.JSONDecodeError, OSError):
         return None
 
@@ -242,21 +316,35 @@ def _read_llm_cache(cache_file: Path, model: str | None, max_tokens: int | None,
     return None
 
 
-def _write_llm_cache(cache_file: Path, result, model: str | None, max_tokens: int | None):
+def _write_llm_cache(cache_file: Path, result, model: str | None, max_tokens: int | None,
+                     served_by: list | None = None):
+    meta = {
+        "model": model,
+        "max_tokens": max_tokens,
+    }
+    if served_by:
+        meta["served_by"] = served_by  # cascade step that produced the result
     payload = {
-        "_meta": {
-            "model": model,
-            "max_tokens": max_tokens,
-        },
+        "_meta": meta,
         "result": result,
     }
-    cache_file.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    cache_file.write_bytes(jsonio.dump_bytes(payload))
 
 
-def llm_call(prompt, schema, system, model, max_tokens, *, use_cache=True, log=None):
-    """Call LLM with optional file-based caching."""
-    from improved.llm import complete_structured
+def _cascade_steps(model: str, max_tokens: int, cascade: list[dict] | None) -> list[tuple[str, int]]:
+    """[(model, max_tokens)]: the call itself, then each cascade step (missing fields inherited)."""
+    steps = [(model, max_tokens)]
+    for step in cascade or []:
+        steps.append((step.get("model") or steps[-1][0], step.get("max_tokens") or steps[-1][1]))
+    return steps
 
+
+def llm_call(prompt, schema, system, model, max_tokens, *, use_cache=True, log=None, cascade=None):
+    """Call LLM with optional file-based caching (cache hits never reach the governor).
+
+    cascade: [{"model", "max_tokens"}] tried in order when the output is truncated. The result
+    is cached under the original (model, max_tokens), so a resumed run hits it directly.
+    """
     key = _llm_cache_key(prompt, schema, system, model or "")
     cache_file = LLM_CACHE_DIR / f"{key}.json"
 
@@ -265,12 +353,23 @@ def llm_call(prompt, schema, system, model, max_tokens, *, use_cache=True, log=N
         if cached is not None:
             return cached
 
-    result = complete_structured(
-        prompt, schema=schema, system=system, model=model, max_tokens=max_tokens,
-    )
+    steps = _cascade_steps(model, max_tokens, cascade)
+    for n, (step_model, step_max) in enumerate(steps):
+        try:
+            result = complete_structured(
+                prompt, schema=schema, system=system, model=step_model, max_tokens=step_max,
+            )
+            break
+        except TruncatedOutput:
+            if n == len(steps) - 1:
+                raise
+            if log:
+                log.warning(f"  Output truncated ({step_model}, max_tokens={step_max}); "
+                            f"retrying with {steps[n + 1][0]}, max_tokens={steps[n + 1][1]}")
 
     LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    _write_llm_cache(cache_file, result, model=model, max_tokens=max_tokens)
+    _write_llm_cache(cache_file, result, model=model, max_tokens=max_tokens,
+                     served_by=list(steps[n]) if n else None)
     return result
 
 
@@ -288,12 +387,24 @@ def save_state(path: Path, state: dict):
 
 
 def load_pairs_from_manifest(run_id: str | None = None) -> list[dict]:
-    """Load successful pairs from manifest. If run_id given, only that run."""
+    """Load successful pairs from manifest. If run_id given, only that run.
+
+    Pairs still only in a collect run journal (run in progress or crashed) are
+    included too.
+    """
+    from run_journal import pending_runs
+
     manifest_path = COLLECTED / "manifest.json"
-    if not manifest_path.exists():
-        return []
-    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
-    runs = manifest.get("runs", [])
+    runs = []
+    if manifest_path.exists():
+        runs = jsonio.read(manifest_path).get("runs", [])
+    by_id = {r.get("run_id"): r for r in runs}
+    for pending in pending_runs(COLLECTED):
+        if pending["run_id"] in by_id:
+            by_id[pending["run_id"]]["pairs"] = by_id[pending["run_id"]].get("pairs", []) + pending["pairs"]
+        else:
+            runs.append(pending)
+    runs.sort(key=lambda r: r.get("run_id", ""))
     if run_id == "latest" and runs:
         runs = [runs[-1]]
     elif run_id:
@@ -310,6 +421,8 @@ def load_pairs_from_manifest(run_id: str | None = None) -> list[dict]:
             op = req_rel.split("/")[0] if "/" in req_rel else ""
             if (COLLECTED / req_rel).exists() and (COLLECTED / resp_rel).exists():
                 pairs.append({"operation": op, "req": req_rel, "resp": resp_rel})
+                if p.get("group"):
+                    pairs[-1].update(lang=p.get("lang"), group=p["group"])
     return pairs
 
 
@@ -387,16 +500,19 @@ def _write_docs_transactional(
     global_path: Path,
     new_op: str,
     new_global: str,
-    backup_dir: Path,
-):
-    """Backup current docs and atomically replace both files."""
+    history: History,
+    run_id: str,
+    seq: int,
+    kind: str,
+) -> int:
+    """Record both versions in the docs history, then atomically replace both files. Returns the history id."""
     old_op = op_path.read_text(encoding="utf-8")
     old_global = global_path.read_text(encoding="utf-8")
 
-    backup_dir.mkdir(parents=True, exist_ok=True)
-    (backup_dir / op_path.name).write_text(old_op, encoding="utf-8")
-    (backup_dir / global_path.name).write_text(old_global, encoding="utf-8")
-
+    apply_id = history.record(
+        run_id=run_id, seq=seq, kind=kind, op=op_path.stem,
+        old_op=old_op, new_op=new_op, old_global=old_global, new_global=new_global,
+    )
     try:
         _atomic_write_text(op_path, new_op)
         _atomic_write_text(global_path, new_global)
@@ -410,27 +526,78 @@ def _write_docs_transactional(
             _atomic_write_text(global_path, old_global)
         except Exception:
             pass
+        history.discard(apply_id)
         raise
+    return apply_id
+
+
+def _parse_deadline(value: str, now: datetime) -> datetime:
+    """Deadline from "90m" / "2h" / "600s" (from now), "HH:MM" (next occurrence) or an ISO datetime."""
+    units = {"s": 1, "m": 60, "h": 3600}
+    if value[-1:] in units and value[:-1].replace(".", "", 1).isdigit():
+        return now + timedelta(seconds=float(value[:-1]) * units[value[-1]])
+    if len(value) <= 5 and ":" in value:
+        hh, mm = value.split(":")
+        at = now.replace(hour=int(hh), minute=int(mm), second=0, microsecond=0)
+        return at if at > now else at + timedelta(days=1)
+    return datetime.fromisoformat(value)
 
 
 # --- Main ---
 
 
-def main() -> int:
+def main(argv=None) -> int:
     parser = argparse.ArgumentParser(description="Refine docs from collected req/res pairs.")
-    parser.add_argument("--batch-size", type=int, default=None, help="Notes per apply call (default from config or 5)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Fixed notes per apply call (default: config, else adaptive)")
     parser.add_argument("--resume", type=str, default=None, metavar="RUN_ID", help="Resume a previous run")
     parser.add_argument("--model", default=None, help="Model override (both notes and apply)")
     parser.add_argument("--op", default=None, help="Process only this operation")
-    parser.add_argument("--limit", type=int, default=None, help="Process at most N pairs total")
+    parser.add_argument("--limit", type=int, default=None, help="Process at most N pairs total (first N in --order)")
+    parser.add_argument("--order", choices=("priority", "alpha"), default="priority",
+                        help="priority: most informative pairs first across ops (default); alpha: op by op")
+    parser.add_argument("--max-tokens-budget", type=int, default=None, metavar="N",
+                        help="Stop taking new pairs after N LLM tokens (input + output + cache, cache hits free)")
+    parser.add_argument("--max-cost", type=float, default=None, metavar="USD",
+                        help="Hard cost cap for this run (overrides limits.run_cost_usd in config)")
+    parser.add_argument("--deadline", default=None,
+                        help="Stop taking new pairs at this time: 90m, 2h, 23:30 or ISO datetime")
+    parser.add_argument("--local-notes", choices=("off", "replace", "hint"), default=None,
+                        help="Local schema diff: use as notes for mechanical pairs (replace, default), "
+                             "append to the notes prompt (hint), or off")
+    parser.add_argument("--no-local-apply", action="store_true",
+                        help="Send local notes to the LLM apply step instead of patching docs locally")
+    parser.add_argument("--aggregate", action="store_true",
+                        help="One notes call per op on a merged shape summary of its pending pairs")
+    parser.add_argument("--ensemble", action="store_true",
+                        help="Notes from a cheap and a strong model concurrently, merged (config: ensemble)")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be processed")
     parser.add_argument("--no-llm-cache", action="store_true", help="Skip LLM response cache")
     parser.add_argument("--save-prompts", action="store_true",
                         help="Write prompt and full LLM response per pair to logs/refine/<run_id>/notes/")
     parser.add_argument("--collect-run", type=str, default="latest", metavar="RUN_ID",
                         help="Which collect run to use: 'latest' (default), 'all', or a specific run ID")
-    args = parser.parse_args()
+    parser.add_argument("--watch", type=float, nargs="?", const=10.0, default=None, metavar="SECONDS",
+                        help="After the pending pairs, keep polling collect journals for new pairs (default every 10s)")
+    parser.add_argument("--watch-idle-exit", type=float, default=None, metavar="SECONDS",
+                        help="--watch: stop after this long without new pairs (default: run until interrupted)")
+    parser.add_argument("--profile", action="store_true",
+                        help="cProfile the run into logs/refine/<run_id>/profile.pstats, hot functions logged at the end")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="tracemalloc: top allocation sites and peak into logs/refine/<run_id>/memory_*.txt")
+    parser.add_argument("--profile-interval", type=float, default=None, metavar="SECONDS",
+                        help="--profile/--trace-memory: also write a sample about every SECONDS")
+    args = parser.parse_args(argv)
+
+    import profiling
+
+    run_id = args.resume or datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    with profiling.RunProfiler(LOGS / run_id, profile=args.profile, trace_memory=args.trace_memory,
+                               interval=args.profile_interval, logger="refine") as prof:
+        return run(args, run_id, prof)
 
+
+def run(args, run_id: str, prof) -> int:
+    """One refine run; main() parses the arguments and wraps it in the profiler (profiling.py)."""
     # Config
     cfg = {}
     cfg_path = CONFIG / "refine.json"
@@ -439,11 +606,19 @@ def main() -> int:
 
     model_notes = args.model or cfg.get("model_notes") or cfg.get("model_apply") or "claude-haiku-4-5"
     model_apply = args.model or cfg.get("model_apply") or "claude-haiku-4-5"
-    batch_size = args.batch_size or cfg.get("batch_size") or 5
+    # Fixed notes-per-apply count, or None for adaptive batching ("auto", the default).
+    fixed_batch_size = args.batch_size or (cfg.get("batch_size") if isinstance(cfg.get("batch_size"), int) else None)
     use_llm_cache = not args.no_llm_cache
+    local_notes = args.local_notes or cfg.get("local_notes") or "replace"
+    local_apply = not args.no_local_apply and cfg.get("local_apply", True)
+    apply_cascade = cfg.get("apply_cascade", DEFAULT_APPLY_CASCADE)
+    limits = dict(cfg.get("limits") or {})
+    ensemble_cfg = {**ensemble.DEFAULTS, **(cfg.get("ensemble") or {})}
+    ensemble_cfg["strong"] = args.model or ensemble_cfg["strong"] or model_notes
+    if args.max_cost is not None:
+        limits["run_cost_usd"] = args.max_cost
 
     # Run ID and logging
-    run_id = args.resume or datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     log_dir = LOGS / run_id
     notes_dir = log_dir / "notes"
     notes_dir.mkdir(parents=True, exist_ok=True)
@@ -452,217 +627,650 @@ def main() -> int:
     state_path = log_dir / "state.json"
     state = load_state(state_path)
     processed = set(state.get("processed", []))
+    # Notes of pairs whose apply failed or was cut off: reused instead of a new notes step.
+    requeued: dict[str, str] = state.setdefault("requeued", {})
     concerns_path = log_dir / "concerns.md"
 
     # Load prompts
     notes_prompt_path = PROMPTS / "notes_from_pair.txt"
     apply_prompt_path = PROMPTS / "apply_notes.txt"
-    if not notes_prompt_path.exists() or not apply_prompt_path.exists():
+    summary_prompt_path = PROMPTS / "notes_from_summary.txt"
+    languages_prompt_path = PROMPTS / "notes_from_languages.txt"
+    if not notes_prompt_path.exists() or not apply_prompt_path.exists() or not languages_prompt_path.exists() or (
+        args.aggregate and not summary_prompt_path.exists()
+    ):
         log.error("Missing prompt files in prompts/")
         return 1
-    notes_template = notes_prompt_path.read_text(encoding="utf-8")
-    apply_template = apply_prompt_path.read_text(encoding="utf-8")
-
-    # Load and filter pairs
+    # Compiled once; the notes head (everything before the request) is rendered once per docs version.
+    notes_head, notes_tail = Template(notes_prompt_path.read_text(encoding="utf-8")).split_at("request_json")
+    apply_template = Template(apply_prompt_path.read_text(encoding="utf-8"))
+    summary_template = Template(summary_prompt_path.read_text(encoding="utf-8")) if args.aggregate else None
+    languages_template = Template(languages_prompt_path.read_text(encoding="utf-8"))
+
+    # Load and filter pairs (--watch: journal offsets taken first, so nothing lands unseen in between)
+    tail = JournalTail(COLLECTED) if args.watch else None
     collect_run = None if args.collect_run == "all" else args.collect_run
     all_pairs = load_pairs_from_manifest(collect_run)
-    if not all_pairs:
+    if not all_pairs and not args.watch:
         log.error("No pairs found. Run collect.py first.")
         return 1
 
     ops_pairs: dict[str, list[dict]] = {}
+    # --languages variants, per op: diffed against their LanguageId 1 pairs, not scheduled.
+    ops_variants: dict[str, list[dict]] = {}
     for p in all_pairs:
         if args.op and p["operation"] != args.op:
             continue
         if p["req"] not in processed:
-            ops_pairs.setdefault(p["operation"], []).append(p)
+            (ops_variants if p.get("group") else ops_pairs).setdefault(p["operation"], []).append(p)
+
+    if not GLOBAL_MD.exists():
+        log.error("docs/global.md not found")
+        return 1
+    for op in sorted(ops_pairs):
+        if not (OPS_DIR / f"{op}.md").exists():
+            log.warning(f"Skip {op}: no docs/ops/{op}.md")
+            del ops_pairs[op]
+    for op in sorted(ops_variants):
+        if not (OPS_DIR / f"{op}.md").exists():
+            del ops_variants[op]
+
+    try:
+        deadline = _parse_deadline(args.deadline, datetime.now()) if args.deadline else None
+    except ValueError:
+        log.error(f"Bad --deadline: {args.deadline}")
+        return 1
 
-    # Apply --limit
+    # Schedule: alphabetical op by op, or by expected information gain across ops (scheduler.py)
+    docs = DocModel(GLOBAL_MD, OPS_DIR)
+    alpha = [p for op in sorted(ops_pairs) for p in ops_pairs[op]]
+    scores: dict[str, tuple[float, dict]] = {}
+    if args.order == "priority":
+        t0 = time.perf_counter()
+        ranked = prioritize(alpha, COLLECTED, docs)
+        schedule = [p for _, p, _ in ranked]
+        scores = {p["req"]: (score, signals) for score, p, signals in ranked}
+        log.debug(f"Scheduled {len(schedule)} pairs by priority in {time.perf_counter() - t0:.2f}s")
+    else:
+        schedule = alpha
     if args.limit:
-        remaining = args.limit
-        trimmed: dict[str, list[dict]] = {}
-        for op in sorted(ops_pairs):
-            take = min(len(ops_pairs[op]), remaining)
-            if take > 0:
-                trimmed[op] = ops_pairs[op][:take]
-                remaining -= take
-            if remaining <= 0:
-                break
-        ops_pairs = trimmed
+        schedule = schedule[:args.limit]
 
-    total_pending = sum(len(v) for v in ops_pairs.values())
-    log.info(f"Run {run_id} | models: {model_notes}/{model_apply} | batch: {batch_size}")
-    log.info(f"Pairs: {len(all_pairs)} total, {total_pending} pending, {len(processed)} done")
+    if args.ensemble and ensemble_cfg["cheap"] == ensemble_cfg["strong"]:
+        log.warning(f"--ensemble: cheap and strong model are both {ensemble_cfg['strong']}; using it alone")
+        args.ensemble = False
+    notes_models = f"{ensemble_cfg['cheap']}+{ensemble_cfg['strong']}" if args.ensemble else model_notes
+    log.info(f"Run {run_id} | models: {notes_models}/{model_apply} | batch: {fixed_batch_size or 'auto'} | order: {args.order}")
+    log.info(f"Pairs: {len(all_pairs)} total, {len(schedule)} pending, {len(processed)} done"
+             + (f", {sum(map(len, ops_variants.values()))} language variants pending" if ops_variants else ""))
 
     if args.dry_run:
-        for op, pairs in sorted(ops_pairs.items()):
-            log.info(f"  {op}: {len(pairs)} pairs")
+        if args.order == "priority":
+            for p in schedule[:30]:
+                score, signals = scores[p["req"]]
+                log.info(f"  {score:6.2f}  {p['req']}  {signals}")
+        counts: dict[str, int] = {}
+        for p in schedule:
+            counts[p["operation"]] = counts.get(p["operation"], 0) + 1
+        for op, n in sorted(counts.items()):
+            log.info(f"  {op}: {n} pairs")
+        for op, variants in sorted(ops_variants.items()):
+            log.info(f"  {op}: {len(variants)} language variants (one diff notes call)")
         return 0
 
-    if not GLOBAL_MD.exists():
-        log.error("docs/global.md not found")
-        return 1
-
     start_time = time.perf_counter()
     pairs_done = 0
     applies_done = 0
+    local_done = 0
+    local_applies = 0
+    # Budget and rate limits for every LLM call; the per-minute window is shared by concurrent runs.
+    gov = Governor(limits, shared_path=LOGS / "governor.json")
+    set_governor(gov)
+    # Before/after versions and schema changes of every doc write, shared by all runs (doc_history.py).
+    history = History(LOGS / "history.sqlite")
+    exhausted = None  # BudgetExceeded message once the hard cap is hit
+    # --ensemble: per-pair notes from a cheap and a strong model (aggregate and language notes use model_notes).
+    notes_ensemble = None
+    if args.ensemble:
+        notes_ensemble = ensemble.NotesEnsemble(
+            lambda prompt: llm_call(prompt, NOTES_CONFIDENCE_SCHEMA, SYSTEM_NOTES, ensemble_cfg["cheap"], 4096,
+                                    use_cache=use_llm_cache, log=log),
+            lambda prompt: llm_call(prompt, NOTES_SCHEMA, SYSTEM_NOTES, ensemble_cfg["strong"], 4096,
+                                    use_cache=use_llm_cache, log=log),
+            ensemble_cfg["cheap"], ensemble_cfg["strong"], strong_delay_s=ensemble_cfg["strong_delay_s"],
+            mode=ensemble_cfg["merge"], path=log_dir / "ensemble.jsonl", log=log,
+        )
+
+    api_md_dirty = False
+    api_md_built = 0.0
+
+    def api_md_changed(now: bool = False):
+        """Rebuild API.md after a docs write; under --watch at most once per WATCH_API_DEBOUNCE_S."""
+        nonlocal api_md_dirty, api_md_built
+        api_md_dirty = True
+        if now or not args.watch or time.monotonic() - api_md_built >= WATCH_API_DEBOUNCE_S:
+            rebuild_api_md(log)
+            api_md_dirty = False
+            api_md_built = time.monotonic()
+
+    def write_local(op, op_path, op_md, global_md, new_op, new_global) -> bool:
+        """Write locally patched docs (same checks and history as an LLM apply). False = abort the run."""
+        nonlocal local_applies
+
+        validation_errors = _validate_apply_output(
+            operation=op, new_op=new_op, new_global=new_global, old_op=op_md, old_global=global_md,
+        )
+        if validation_errors:
+            for err in validation_errors:
+                log.error(f"  Local apply output invalid: {err}")
+            state["processed"] = sorted(processed)
+            save_state(state_path, state)
+            return False
+        try:
+            _write_docs_transactional(
+                op_path=op_path, global_path=GLOBAL_MD, new_op=new_op, new_global=new_global,
+                history=history, run_id=run_id, seq=local_applies + 1, kind="local",
+            )
+            docs.commit(op, new_op, new_global)
+        except Exception as e:
+            log.error(f"  Failed to write docs transactionally: {e}")
+            state["processed"] = sorted(processed)
+            save_state(state_path, state)
+            return False
+        api_md_changed()
+        local_applies += 1
+        return True
+
+    def requeue(batcher):
+        """Keep the batch's notes in state for the next run; its pairs stay pending."""
+        requeued.update(zip(batcher.keys, batcher.texts))
+        log.warning(f"  Requeued {len(batcher)} notes for the next run")
+        batcher.clear()
+        state["processed"] = sorted(processed)
+        save_state(state_path, state)
+
+    def apply_batch(op, op_path, batcher, reason) -> bool:
+        """Apply the op's pending notes and write docs. False = abort the run."""
+        nonlocal applies_done, pairs_done, exhausted
+
+        global_md = docs.global_md()
+        op_md = docs.op_md(op)
+        notes_text = batcher.render()
+
+        log.info(
+            f"  Apply: {len(batcher)} notes ({reason}; ~{batcher.estimate_output(op_md, global_md)} output tokens"
+            f", {batcher.dropped} duplicate items dropped)"
+        )
+        prompt = apply_template.render(
+            global_md=global_md, op_md=op_md,
+            operation=op, notes=notes_text,
+        )
+        try:
+            result = llm_call(
+                prompt, APPLY_SCHEMA, SYSTEM_APPLY, model_apply, APPLY_MAX_TOKENS,
+                use_cache=use_llm_cache, log=log, cascade=apply_cascade,
+            )
+        except BudgetExceeded as e:
+            exhausted = str(e)
+            requeue(batcher)
+            return True
+        except TruncatedOutput as e:
+            log.error(f"  Apply failed: {e}")
+            if len(batcher) < 2:
+                requeue(batcher)
+                return True
+            # Less to write per call: apply each half on its own (docs are re-read in between).
+            first, second = batcher.split()
+            batcher.clear()
+            log.info(f"  Splitting batch: {len(first)} + {len(second)} notes")
+            return apply_batch(op, op_path, first, "split") and apply_batch(op, op_path, second, "split")
+        except Exception as e:
+            log.error(f"  Apply failed: {e}")
+            requeue(batcher)
+            return True
+
+        # Write updated docs
+        new_op = result.get("newOperationMd", op_md)
+        new_global = result.get("newGlobalMd", global_md)
+        concerns = result.get("seriousConcerns", "")
+
+        validation_errors = _validate_apply_output(
+            operation=op,
+            new_op=new_op,
+            new_global=new_global,
+            old_op=op_md,
+            old_global=global_md,
+        )
+        if validation_errors:
+            for err in validation_errors:
+                log.error(f"  Apply output invalid: {err}")
+            log.error("  Aborting run to protect docs from invalid apply output.")
+            state["processed"] = sorted(processed)
+            save_state(state_path, state)
+            return False
 
-    for op, pairs in sorted(ops_pairs.items()):
-        op_path = OPS_DIR / f"{op}.md"
-        if not op_path.exists():
-            log.warning(f"Skip {op}: no docs/ops/{op}.md")
-            continue
-
-        log.info(f"--- {op} ({len(pairs)} pairs) ---")
-
-        notes_batch: list[str] = []
-        batch_keys: list[str] = []
-
-        for i, pair in enumerate(pairs):
-            # Read current docs (re-read each time; previous apply may have updated them)
-            global_md = GLOBAL_MD.read_text(encoding="utf-8")
-            op_md = op_path.read_text(encoding="utf-8")
-
-            # Load pair; truncate request and response for notes step budget
-            req_data = json.loads((COLLECTED / pair["req"]).read_text(encoding="utf-8"))
-            resp_data = json.loads((COLLECTED / pair["resp"]).read_text(encoding="utf-8"))
-            req_truncated = _truncate_values(req_data, max_str=MAX_STR_LENGTH)
-            req_json = _cap_request_json(json.dumps(req_truncated, ensure_ascii=False, indent=2))
-            prefix = _substitute(
-                notes_template,
-                global_md=global_md, op_md=op_md, operation=op,
-                request_json=req_json, response_json="",
+        try:
+            history_id = _write_docs_transactional(
+                op_path=op_path,
+                global_path=GLOBAL_MD,
+                new_op=new_op,
+                new_global=new_global,
+                history=history,
+                run_id=run_id,
+                seq=applies_done + 1,
+                kind="apply",
             )
-            response_budget = max(500, NOTES_INPUT_BUDGET - _estimate_tokens(prefix))
-            value_truncated = _truncate_values(resp_data, max_str=MAX_STR_LENGTH)
-            resp_truncated = _fit_response_to_budget(value_truncated, response_budget)
-            resp_json = json.dumps(resp_truncated, ensure_ascii=False, indent=2)
-
-            # --- Notes step ---
-            log.info(f"  [{i+1}/{len(pairs)}] Notes: {pair['req']}")
-            prompt = _substitute(
-                notes_template,
-                global_md=global_md, op_md=op_md, operation=op,
-                request_json=req_json, response_json=resp_json,
+            docs.commit(op, new_op, new_global)
+        except Exception as e:
+            log.error(f"  Failed to write docs transactionally: {e}")
+            state["processed"] = sorted(processed)
+            save_state(state_path, state)
+            return False
+
+        log.info(f"  Wrote {op}.md + global.md (history #{history_id})")
+
+        api_md_changed()
+        applies_done += 1
+
+        # Log concerns
+        if concerns and concerns.strip():
+            log.warning(f"  CONCERNS: {concerns[:200]}")
+            with open(concerns_path, "a", encoding="utf-8") as f:
+                f.write(f"## {op} (apply {applies_done})\n\n{concerns.strip()}\n\n")
+
+        # Mark batch pairs as processed
+        processed.update(batcher.keys)
+        for key in batcher.keys:
+            requeued.pop(key, None)
+        pairs_done += len(batcher.keys)
+        batcher.clear()
+        return True
+
+    # Notes batches pending apply, per op (priority order interleaves ops)
+    batchers: dict[str, ApplyBatcher] = {}
+    left_per_op: dict[str, int] = {}
+    for p in schedule:
+        left_per_op[p["operation"]] = left_per_op.get(p["operation"], 0) + 1
+    stop_reason = None
+    prev_op = None
+
+    def exemplar_text(pairs: list[dict], budget: int) -> str:
+        """Exemplar pairs for the summary prompt, each response fitted to budget/len(pairs)."""
+        parts = []
+        for j, p in enumerate(pairs, 1):
+            req = _truncate_values(jsonio.read(COLLECTED / p["req"]))
+            resp = _truncate_values(jsonio.read(COLLECTED / p["resp"]))
+            resp = _fit_response_to_budget(resp, max(500, budget // len(pairs)))
+            parts.append(
+                f"### Exemplar {j}: {p['req']}\n\nRequest:\n```json\n"
+                f"{_cap_request_json(jsonio.dumps(req))}\n```\n\n"
+                f"Response:\n```json\n{jsonio.dumps(resp)}\n```"
             )
-            try:
-                result = llm_call(
-                    prompt, NOTES_SCHEMA, SYSTEM_NOTES, model_notes, 4096,
-                    use_cache=use_llm_cache, log=log,
+        return "\n\n".join(parts)
+
+    def language_notes(op: str, variants: list[dict]) -> bool:
+        """One notes call on the structural diff of op's language variants. False = abort the run."""
+        nonlocal pairs_done, exhausted
+        keys = [p["req"] for p in variants]
+        if keys[0] in requeued:
+            log.info(f"  Notes (requeued, languages): {op}")
+            notes = requeued[keys[0]]
+        else:
+            diffs = lang_diff.diff_variants(variants, COLLECTED)
+            if all(d.trivial() for d in diffs.values()):
+                log.info(f"  Languages: {op}, {len(keys)} variants differ only by translated text")
+                notes = "No changes needed."
+            else:
+                prompt = languages_template.render(
+                    global_md=docs.global_md(), op_md=docs.op_md(op), operation=op,
+                    language_diff=lang_diff.render(diffs, lang_diff.language_names(docs.defs())),
                 )
-                notes = result.get("notes", "No changes needed.")
-            except Exception as e:
-                log.error(f"  Notes failed: {e}")
-                continue
-
-            # Save notes to log
-            safe_name = pair["req"].replace("/", "_").replace(".json", "")
-            (notes_dir / f"{safe_name}.txt").write_text(notes, encoding="utf-8")
-            if getattr(args, "save_prompts", False):
-                (notes_dir / f"{safe_name}_prompt.txt").write_text(prompt, encoding="utf-8")
-                (notes_dir / f"{safe_name}_response.json").write_text(
-                    json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8"
+                log.info(
+                    f"  Notes (languages): {op}, {len(keys)} variants in {len(diffs)} language(s), "
+                    f"~{_estimate_tokens(prompt)} tokens ({gov.status()})"
                 )
-
-            is_last = (i == len(pairs) - 1)
-            no_changes = notes.strip().lower() in ("no changes needed.", "no changes needed")
-
-            if no_changes:
-                log.info(f"    -> No changes")
-                processed.add(pair["req"])
-                pairs_done += 1
+                try:
+                    result = llm_call(
+                        prompt, NOTES_SCHEMA, SYSTEM_NOTES, model_notes, 4096,
+                        use_cache=use_llm_cache, log=log,
+                    )
+                    notes = result.get("notes", "No changes needed.")
+                except BudgetExceeded as e:
+                    exhausted = str(e)
+                    return True
+                except Exception as e:
+                    log.error(f"  Notes failed: {e}")
+                    return True
+                (notes_dir / f"{op}_languages.txt").write_text(notes, encoding="utf-8")
+                if getattr(args, "save_prompts", False):
+                    (notes_dir / f"{op}_languages_prompt.txt").write_text(prompt, encoding="utf-8")
+
+        if notes.strip().lower() in ("no changes needed.", "no changes needed"):
+            processed.update(keys)
+            pairs_done += len(keys)
+        else:
+            log.info(f"    -> {len(notes)} chars of notes")
+            # Keyed by the first variant, like --aggregate; the rest follow once the apply lands.
+            batcher = ApplyBatcher(APPLY_MAX_TOKENS, fixed_size=fixed_batch_size)
+            batcher.add(keys[0], notes)
+            if not apply_batch(op, docs.op_path(op), batcher, "languages"):
+                return False
+            if keys[0] in processed:
+                processed.update(keys)
+                pairs_done += len(keys) - 1
+        state["processed"] = sorted(processed)
+        save_state(state_path, state)
+        return True
+
+    def flush_languages() -> bool:
+        """language_notes for every op with pending variants, within the run's limits. False = abort."""
+        nonlocal stop_reason
+        for op in sorted(ops_variants):
+            if exhausted:
+                return True
+            if args.max_tokens_budget and gov.spent_tokens() >= args.max_tokens_budget:
+                stop_reason = f"token budget ({gov.spent_tokens()} >= {args.max_tokens_budget})"
+                return True
+            if deadline and datetime.now() >= deadline:
+                stop_reason = f"deadline {deadline.isoformat(timespec='minutes')}"
+                return True
+            # Primary notes of this op still batched: apply them first, so the diff is read against them.
+            if op in batchers and len(batchers[op]) and not apply_batch(op, docs.op_path(op), batchers[op], "languages"):
+                return False
+            if not language_notes(op, ops_variants.pop(op)):
+                return False
+        return True
+
+    aborted = False
+
+    if args.aggregate:
+        # One notes call per op over all its pending pairs; the per-pair loop below is skipped.
+        by_op: dict[str, list[dict]] = {}
+        for p in schedule:
+            by_op.setdefault(p["operation"], []).append(p)
+        for n, (op, op_pairs) in enumerate(by_op.items(), 1):
+            prof.tick()
+            if exhausted:
+                break
+            if args.max_tokens_budget and gov.spent_tokens() >= args.max_tokens_budget:
+                stop_reason = f"token budget ({gov.spent_tokens()} >= {args.max_tokens_budget})"
+                break
+            if deadline and datetime.now() >= deadline:
+                stop_reason = f"deadline {deadline.isoformat(timespec='minutes')}"
+                break
+            keys = [p["req"] for p in op_pairs]
+            if keys[0] in requeued:
+                log.info(f"  [{n}/{len(by_op)}] Notes (requeued, aggregate): {op}")
+                notes = requeued[keys[0]]
             else:
-                log.info(f"    -> {len(notes)} chars of notes")
-                notes_batch.append(notes)
-                batch_keys.append(pair["req"])
-
-            # --- Apply step (when batch full or last pair for this op) ---
-            should_apply = notes_batch and (len(notes_batch) >= batch_size or is_last)
-            if should_apply:
-                global_md = GLOBAL_MD.read_text(encoding="utf-8")
-                op_md = op_path.read_text(encoding="utf-8")
-                notes_text = "\n\n".join(
-                    f"### Note {j+1}\n{n}" for j, n in enumerate(notes_batch)
+                t0 = time.perf_counter()
+                req_sum, resp_sum, picked = summarize(op_pairs, COLLECTED, AGGREGATE_EXEMPLARS)
+                values = dict(
+                    global_md=docs.global_md(), op_md=docs.op_md(op), operation=op,
+                    pair_count=resp_sum.docs, request_summary=req_sum.render(),
+                    response_summary=resp_sum.render(),
                 )
-
-                log.info(f"  Apply: {len(notes_batch)} notes")
-                prompt = _substitute(
-                    apply_template,
-                    global_md=global_md, op_md=op_md,
-                    operation=op, notes=notes_text,
+                budget = NOTES_INPUT_BUDGET - _estimate_tokens(summary_template.render(**values, exemplars=""))
+                prompt = summary_template.render(**values, exemplars=exemplar_text(picked, budget))
+                log.info(
+                    f"  [{n}/{len(by_op)}] Notes (aggregate): {op}, {resp_sum.docs} pairs, "
+                    f"{len(resp_sum.paths)} paths, {len(picked)} exemplars, ~{_estimate_tokens(prompt)} tokens "
+                    f"({time.perf_counter() - t0:.1f}s; {gov.status()})"
                 )
                 try:
                     result = llm_call(
-                        prompt, APPLY_SCHEMA, SYSTEM_APPLY, model_apply, 32000,
+                        prompt, NOTES_SCHEMA, SYSTEM_NOTES, model_notes, 4096,
                         use_cache=use_llm_cache, log=log,
                     )
+                    notes = result.get("notes", "No changes needed.")
+                except BudgetExceeded as e:
+                    exhausted = str(e)
+                    break
                 except Exception as e:
-                    log.error(f"  Apply failed: {e}")
-                    notes_batch.clear()
-                    batch_keys.clear()
+                    log.error(f"  Notes failed: {e}")
                     continue
+                (notes_dir / f"{op}_aggregate.txt").write_text(notes, encoding="utf-8")
+                if getattr(args, "save_prompts", False):
+                    (notes_dir / f"{op}_aggregate_prompt.txt").write_text(prompt, encoding="utf-8")
 
-                # Write updated docs
-                new_op = result.get("newOperationMd", op_md)
-                new_global = result.get("newGlobalMd", global_md)
-                concerns = result.get("seriousConcerns", "")
-
-                validation_errors = _validate_apply_output(
-                    operation=op,
-                    new_op=new_op,
-                    new_global=new_global,
-                    old_op=op_md,
-                    old_global=global_md,
-                )
-                if validation_errors:
-                    for err in validation_errors:
-                        log.error(f"  Apply output invalid: {err}")
-                    log.error("  Aborting run to protect docs from invalid apply output.")
-                    state["processed"] = sorted(processed)
-                    save_state(state_path, state)
+            if notes.strip().lower() in ("no changes needed.", "no changes needed"):
+                log.info(f"    -> No changes")
+                processed.update(keys)
+                pairs_done += len(keys)
+            else:
+                log.info(f"    -> {len(notes)} chars of notes")
+                # Keyed by the op's first pair; the rest follow it once the apply lands.
+                batcher = ApplyBatcher(APPLY_MAX_TOKENS, fixed_size=fixed_batch_size)
+                batcher.add(keys[0], notes)
+                if not apply_batch(op, docs.op_path(op), batcher, "aggregate"):
                     return 1
-
-                backup_dir = log_dir / "backups" / (
-                    f"apply_{applies_done + 1:04d}_{op}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
-                )
+                if keys[0] in processed:
+                    processed.update(keys)
+                    pairs_done += len(keys) - 1
+            state["processed"] = sorted(processed)
+            save_state(state_path, state)
+        schedule = []
+
+    total = len(schedule)
+    seen = {p["req"] for p in all_pairs}
+
+    def pending():
+        """The schedule, then (--watch) pairs journaled by collect since, as they land.
+
+        Language variants are diffed once the schedule is done, and under --watch
+        whenever the journals go quiet.
+        """
+        nonlocal total, stop_reason, aborted
+        yield from schedule
+        if not stop_reason and not flush_languages():
+            aborted = True
+            return
+        if not args.watch:
+            return
+        log.info(f"Watching collected/journal/ every {args.watch:g}s")
+        idle_since = time.monotonic()
+        while not exhausted:
+            if deadline and datetime.now() >= deadline:
+                stop_reason = f"deadline {deadline.isoformat(timespec='minutes')}"
+                return
+            new = []
+            for p in tail.poll(limit=WATCH_QUEUE_MAX):
+                op = p["req"].split("/")[0]
+                if p["req"] in seen or p["req"] in processed or (args.op and op != args.op):
+                    continue
+                seen.add(p["req"])
+                if not docs.op_path(op).exists():
+                    log.warning(f"Skip {p['req']}: no docs/ops/{op}.md")
+                    continue
+                if p.get("group"):
+                    ops_variants.setdefault(op, []).append({"operation": op, **p})
+                    continue
+                new.append({"operation": op, **p})
+            if not new:
+                if ops_variants and not flush_languages():
+                    aborted = True
+                    return
+                if stop_reason or exhausted:
+                    return
+                if api_md_dirty:
+                    api_md_changed(now=True)
+                if args.watch_idle_exit is not None and time.monotonic() - idle_since >= args.watch_idle_exit:
+                    stop_reason = f"idle for {args.watch_idle_exit:g}s"
+                    return
+                prof.tick()
                 try:
-                    _write_docs_transactional(
-                        op_path=op_path,
-                        global_path=GLOBAL_MD,
-                        new_op=new_op,
-                        new_global=new_global,
-                        backup_dir=backup_dir,
+                    time.sleep(args.watch)
+                except KeyboardInterrupt:
+                    stop_reason = "interrupted"
+                    return
+                continue
+            idle_since = time.monotonic()
+            if args.order == "priority":
+                new = [p for _, p, _ in prioritize(new, COLLECTED, docs)]
+            for p in new:
+                left_per_op[p["operation"]] = left_per_op.get(p["operation"], 0) + 1
+            total += len(new)
+            log.info(f"Watch: {len(new)} new pair(s)")
+            yield from new
+
+    for i, pair in enumerate(pending()):
+        prof.tick()
+        if exhausted:
+            stop_reason = exhausted
+            break
+        if args.max_tokens_budget and gov.spent_tokens() >= args.max_tokens_budget:
+            stop_reason = f"token budget ({gov.spent_tokens()} >= {args.max_tokens_budget})"
+            break
+        if deadline and datetime.now() >= deadline:
+            stop_reason = f"deadline {deadline.isoformat(timespec='minutes')}"
+            break
+
+        op = pair["operation"]
+        op_path = docs.op_path(op)
+        if op != prev_op:
+            log.info(f"--- {op} ({left_per_op[op]} pairs left) ---")
+            prev_op = op
+        batcher = batchers.setdefault(op, ApplyBatcher(APPLY_MAX_TOKENS, fixed_size=fixed_batch_size))
+        left_per_op[op] -= 1
+        is_last = left_per_op[op] == 0
+
+        # Current docs (in memory; reloaded only if changed on disk since the last commit)
+        global_md = docs.global_md()
+        op_md = docs.op_md(op)
+        notes_prefix = docs.prefix("notes", op, notes_head)
+
+        # Load pair; truncate request and response for notes step budget
+        req_data = jsonio.read(COLLECTED / pair["req"])
+        resp_data = jsonio.read(COLLECTED / pair["resp"])
+        req_truncated = _truncate_values(req_data, max_str=MAX_STR_LENGTH)
+        req_json = _cap_request_json(jsonio.dumps(req_truncated))
+        prefix = notes_prefix + notes_tail.render(
+            global_md=global_md, op_md=op_md, operation=op,
+            request_json=req_json, response_json="",
+        )
+        response_budget = max(500, NOTES_INPUT_BUDGET - _estimate_tokens(prefix))
+        value_truncated = _truncate_values(resp_data, max_str=MAX_STR_LENGTH)
+        resp_truncated = _fit_response_to_budget(value_truncated, response_budget)
+        resp_json = jsonio.dumps(resp_truncated)
+
+        # --- Local schema diff (mechanical widenings, no LLM) ---
+        findings = None
+        if local_notes != "off":
+            schema = docs.response_schema(op)
+            if isinstance(schema, dict):
+                findings = schema_diff.diff(resp_data, schema, docs.defs())
+
+        # --- Notes step ---
+        prompt = notes_prefix + notes_tail.render(
+            global_md=global_md, op_md=op_md, operation=op,
+            request_json=req_json, response_json=resp_json,
+        )
+        if pair["req"] in requeued:
+            log.info(f"  [{i+1}/{total}] Notes (requeued): {pair['req']}")
+            notes = requeued[pair["req"]]
+            result = {"notes": notes, "requeued": True}
+        elif local_notes == "replace" and schema_diff.is_mechanical(findings):
+            log.info(f"  [{i+1}/{total}] Notes (local, {len(findings)} widenings): {pair['req']}")
+            notes = schema_diff.render_notes(findings)
+            result = {"notes": notes, "local": True}
+            local_done += 1
+            if local_apply:
+                # Patch the JSON blocks directly; only what can't be patched goes to the LLM apply.
+                new_op, new_global, leftover = doc_patch.apply_findings(findings, op_md, global_md)
+                if (new_op, new_global) != (op_md, global_md):
+                    if not write_local(op, op_path, op_md, global_md, new_op, new_global):
+                        return 1
+                    log.info(f"    -> {len(findings) - len(leftover)} applied locally")
+                result["applied_locally"] = len(findings) - len(leftover)
+                notes = schema_diff.render_notes(leftover) if leftover else "No changes needed."
+        else:
+            log.info(f"  [{i+1}/{total}] Notes: {pair['req']} ({gov.status()})")
+            if local_notes == "hint" and findings:
+                prompt += _substitute(LOCAL_DIFF_HINT, local_notes=schema_diff.render_notes(findings))
+            try:
+                if notes_ensemble is not None:
+                    result = notes_ensemble.notes(pair["req"], prompt, None if findings is None else not findings)
+                    record = result["ensemble"]
+                    log.info(f"    Ensemble: {record['outcome']} ({ensemble.describe(record)})")
+                else:
+                    result = llm_call(
+                        prompt, NOTES_SCHEMA, SYSTEM_NOTES, model_notes, 4096,
+                        use_cache=use_llm_cache, log=log,
                     )
-                except Exception as e:
-                    log.error(f"  Failed to write docs transactionally: {e}")
-                    state["processed"] = sorted(processed)
-                    save_state(state_path, state)
-                    return 1
+                notes = result.get("notes", "No changes needed.")
+            except BudgetExceeded as e:
+                exhausted = str(e)
+                continue
+            except Exception as e:
+                log.error(f"  Notes failed: {e}")
+                continue
 
-                log.info(f"  Wrote {op}.md + global.md (backup: {backup_dir})")
+        # Save notes to log
+        safe_name = pair["req"].replace("/", "_").replace(".json", "")
+        (notes_dir / f"{safe_name}.txt").write_text(result.get("notes", notes), encoding="utf-8")
+        if getattr(args, "save_prompts", False):
+            (notes_dir / f"{safe_name}_prompt.txt").write_text(prompt, encoding="utf-8")
+            (notes_dir / f"{safe_name}_response.json").write_text(
+                json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8"
+            )
 
-                rebuild_api_md(log)
-                applies_done += 1
+        no_changes = notes.strip().lower() in ("no changes needed.", "no changes needed")
 
-                # Log concerns
-                if concerns and concerns.strip():
-                    log.warning(f"  CONCERNS: {concerns[:200]}")
-                    with open(concerns_path, "a", encoding="utf-8") as f:
-                        f.write(f"## {op} (apply {applies_done})\n\n{concerns.strip()}\n\n")
+        if no_changes:
+            log.info(f"    -> No changes")
+            processed.add(pair["req"])
+            pairs_done += 1
+        else:
+            log.info(f"    -> {len(notes)} chars of notes")
+            if batcher.would_overflow(notes, op_md, global_md):
+                if not apply_batch(op, op_path, batcher, "budget"):
+                    return 1
+            batcher.add(pair["req"], notes)
 
-                # Mark batch pairs as processed
-                for k in batch_keys:
-                    processed.add(k)
-                pairs_done += len(batch_keys)
-                notes_batch.clear()
-                batch_keys.clear()
+        # --- Apply step (when the batcher says so, or last pair for this op) ---
+        reason = batcher.flush_reason(op_md, global_md)
+        if reason is None and is_last and len(batcher):
+            reason = "op end"
+        if reason and not apply_batch(op, op_path, batcher, reason):
+            return 1
 
-            # Save state after every pair
-            state["processed"] = sorted(processed)
-            save_state(state_path, state)
+        # Save state after every pair
+        state["processed"] = sorted(processed)
+        save_state(state_path, state)
+
+    if aborted:
+        return 1
+    stop_reason = stop_reason or exhausted
+    if stop_reason:
+        log.info(f"Stopping: {stop_reason}")
+    # Notes already paid for are applied (budget stop, or a failed notes call on an op's last
+    # pair); unscheduled pairs stay pending for the next run. Past the hard cap nothing more is
+    # sent: pending batches are requeued in state.
+    for op, batcher in sorted(batchers.items()):
+        if not len(batcher):
+            continue
+        if exhausted:
+            requeue(batcher)
+        elif not apply_batch(op, docs.op_path(op), batcher, "stop" if stop_reason else "end"):
+            return 1
+    if api_md_dirty:
+        api_md_changed(now=True)
+    if requeued:
+        log.warning(f"{len(requeued)} pairs have requeued notes; continue with --resume {run_id}")
+    state["processed"] = sorted(processed)
+    save_state(state_path, state)
+
+    if notes_ensemble is not None:
+        notes_ensemble.close()
+        for line in notes_ensemble.summary():
+            log.info(f"  Ensemble: {line}")
 
     elapsed = time.perf_counter() - start_time
-    log.info(f"Done: {pairs_done} pairs, {applies_done} applies, {elapsed:.1f}s")
+    log.info(
+        f"Done: {pairs_done} pairs, {applies_done} applies, {local_done} local notes, {local_applies} local applies, "
+        f"{gov.requests()} LLM calls ({gov.status()}), {elapsed:.1f}s"
+    )
+    log.info(f"LLM usage: {gov.summary()}")
     return 0
 
 
@@ -0,0 +1,279 @@
+"""
+Append-only collect run journal (collected/journal/<run_id>.jsonl).
+
+Every request outcome is appended and fsynced as it lands, so a crashed or
+killed run loses nothing: compact() folds journals into manifest.json and
+errors_manifest.json under a lock, and moves finished journals to
+journal/done/. run_ids carry the pid, and the writer locks its journal, so
+collect processes started in the same second never share one. The journal also carries the run plan and per-stage progress
+used by collect.py --resume.
+
+Pairs from collect.py --languages carry "lang" (the LanguageId sent) and, for
+the other-language variants, "group" (the req path of the primary pair); both
+are kept in the manifest.
+
+Events (one JSON object per line):
+  {"t": "start", "run_id", "plan": [{"name", "calls": [per-stage calls]}]}
+  {"t": "pair", "pipeline", "stage", "req", "resp"[, "lang", "group"]}
+  {"t": "error", "pipeline", "stage", "req", "error"}
+  {"t": "stage_done", "pipeline", "stage"}
+  {"t": "pipeline_done", "pipeline"}
+  {"t": "end"}
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+from filelock import locked
+
+try:
+    import fcntl
+except ImportError:  # Windows: no writer lock, see filelock.py
+    fcntl = None
+
+JOURNAL_DIR = "journal"
+LOCK_NAME = ".manifest.lock"
+
+
+def journal_path(collected_dir: Path, run_id: str) -> Path:
+    return collected_dir / JOURNAL_DIR / f"{run_id}.jsonl"
+
+
+def lock_path(collected_dir: Path) -> Path:
+    return collected_dir / LOCK_NAME
+
+
+def new_run_id() -> str:
+    """Timestamp plus pid: collect processes started in the same second get their own run."""
+    return f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_{os.getpid()}"
+
+
+class JournalBusy(RuntimeError):
+    """Another process is still writing this run's journal."""
+
+
+def _try_lock(fh) -> bool:
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+class RunJournal:
+    """Durable event log for one collect run.
+
+    The writer holds an exclusive lock on the journal until close(): a second
+    writer on the same run raises JournalBusy, and compact() leaves a held
+    journal in place.
+    """
+
+    def __init__(self, collected_dir: Path, run_id: str):
+        self.path = journal_path(collected_dir, run_id)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, "a", encoding="utf-8")
+        if not _try_lock(self._fh):
+            self._fh.close()
+            raise JournalBusy(f"run {run_id} is being written by another process")
+
+    def write(self, event: dict):
+        self._fh.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def close(self):
+        self._fh.close()
+
+
+def read_events(path: Path) -> list[dict]:
+    """Events from a journal; a torn last line (crash mid-write) is ignored."""
+    events = []
+    try:
+        lines = path.read_text(encoding="utf-8").splitlines()
+    except OSError:
+        return events
+    for line in lines:
+        try:
+            events.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return events
+
+
+def progress(events: list[dict]) -> dict:
+    """Summarize a run for resume: plan, requests sent and pairs per (pipeline, stage)."""
+    out = {
+        "plan": [], "sent": {}, "pairs": {}, "stage_done": set(),
+        "pipeline_done": set(), "ended": False,
+    }
+    for ev in events:
+        t = ev.get("t")
+        key = (ev.get("pipeline"), ev.get("stage"))
+        if t == "start":
+            out["plan"] = ev.get("plan", [])
+        elif t in ("pair", "error"):
+            out["sent"][key] = out["sent"].get(key, 0) + 1
+            if t == "pair":
+                out["pairs"].setdefault(key, []).append(ev)
+        elif t == "stage_done":
+            out["stage_done"].add(key)
+        elif t == "pipeline_done":
+            out["pipeline_done"].add(ev.get("pipeline"))
+        elif t == "end":
+            out["ended"] = True
+    return out
+
+
+def _atomic_write_json(path: Path, data):
+    tmp = path.parent / f".{path.name}.tmp-{os.getpid()}-{time.time_ns()}"
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def pair_entry(ev: dict) -> dict:
+    """Manifest entry for a "pair" event: req/resp plus the language link, if any."""
+    entry = {"req": ev["req"], "resp": ev["resp"]}
+    for key in ("lang", "group"):
+        if key in ev:
+            entry[key] = ev[key]
+    return entry
+
+
+def _writer_active(path: Path) -> bool:
+    try:
+        with open(path, "rb") as fh:
+            return not _try_lock(fh)  # closing fh drops the probe lock
+    except OSError:
+        return False
+
+
+def _run_id(path: Path) -> str:
+    return path.name[: -len(".jsonl")]
+
+
+def active_journals(collected_dir: Path) -> list[Path]:
+    d = collected_dir / JOURNAL_DIR
+    return sorted(d.glob("*.jsonl")) if d.exists() else []
+
+
+def pending_runs(collected_dir: Path) -> list[dict]:
+    """Runs as they stand in active journals: [{"run_id", "pairs"}] (not yet compacted)."""
+    runs = []
+    for path in active_journals(collected_dir):
+        pairs = [
+            pair_entry(ev)
+            for ev in read_events(path) if ev.get("t") == "pair"
+        ]
+        runs.append({"run_id": _run_id(path), "pairs": pairs})
+    return runs
+
+
+class JournalTail:
+    """New "pair" events across journals since the last poll (refine --watch).
+
+    Keeps a byte offset per journal and only reads what was appended since; a line
+    without its newline yet is left for the next poll. A journal compacted into
+    journal/done/ between polls is finished from there. Journals present when the
+    tail is created start at their current end unless from_start.
+    """
+
+    def __init__(self, collected_dir: Path, from_start: bool = False):
+        self.collected_dir = collected_dir
+        self.offsets: dict[str, int] = {}
+        if not from_start:
+            for path in active_journals(collected_dir):
+                self.offsets[path.name] = path.stat().st_size
+
+    def poll(self, limit: int | None = None) -> list[dict]:
+        """Up to `limit` new pairs (pair_entry); the rest stay unread until the next poll."""
+        out: list[dict] = []
+        done_dir = self.collected_dir / JOURNAL_DIR / "done"
+        names = {p.name for p in active_journals(self.collected_dir)} | set(self.offsets)
+        for name in sorted(names):
+            if limit is not None and len(out) >= limit:
+                break
+            path = self.collected_dir / JOURNAL_DIR / name
+            if not path.exists():
+                path = done_dir / name
+            offset = self.offsets.get(name, 0)
+            try:
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    while limit is None or len(out) < limit:
+                        line = f.readline()
+                        if not line.endswith(b"\n"):
+                            break
+                        offset += len(line)
+                        try:
+                            ev = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        if ev.get("t") == "pair":
+                            out.append(pair_entry(ev))
+                    at_end = not f.read(1)
+            except OSError:
+                self.offsets.pop(name, None)
+                continue
+            if at_end and path.parent == done_dir:
+                self.offsets.pop(name, None)  # finished and fully read
+            else:
+                self.offsets[name] = offset
+        return out
+
+
+def compact(collected_dir: Path) -> int:
+    """Fold all active journals into manifest.json / errors_manifest.json.
+
+    Idempotent; finished journals move to journal/done/ once no writer holds them.
+    Returns entries added.
+    """
+    journals = active_journals(collected_dir)
+    if not journals:
+        return 0
+    added = 0
+    with locked(lock_path(collected_dir)):
+        manifest_path = collected_dir / "manifest.json"
+        errors_path = collected_dir / "errors_manifest.json"
+        manifest = {"runs": []}
+        if manifest_path.exists():
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        errors_manifest = {"errors": []}
+        if errors_path.exists():
+            errors_manifest = json.loads(errors_path.read_text(encoding="utf-8"))
+        runs_by_id = {r.get("run_id"): r for r in manifest["runs"]}
+        known_errors = {e.get("req") for e in errors_manifest["errors"]}
+
+        finished = []
+        for path in journals:
+            run_id = _run_id(path)
+            events = read_events(path)
+            run = runs_by_id.get(run_id)
+            if run is None:
+                run = {"run_id": run_id, "pairs": []}
+                manifest["runs"].append(run)
+                runs_by_id[run_id] = run
+            known_pairs = {p.get("req") for p in run["pairs"]}
+            for ev in events:
+                if ev.get("t") == "pair" and ev["req"] not in known_pairs:
+                    run["pairs"].append(pair_entry(ev))
+                    known_pairs.add(ev["req"])
+                    added += 1
+                elif ev.get("t") == "error" and ev["req"] not in known_errors:
+                    errors_manifest["errors"].append({"req": ev["req"], "error": ev["error"]})
+                    known_errors.add(ev["req"])
+                    added += 1
+            if events and events[-1].get("t") == "end" and not _writer_active(path):
+                finished.append(path)
+
+        _atomic_write_json(manifest_path, manifest)
+        _atomic_write_json(errors_path, errors_manifest)
+        done_dir = collected_dir / JOURNAL_DIR / "done"
+        for path in finished:
+            done_dir.mkdir(parents=True, exist_ok=True)
+            os.replace(path, done_dir / path.name)
+    return added
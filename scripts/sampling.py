@@ -0,0 +1,137 @@
+"""
+Representative sampling of response arrays for refine's notes prompt.
+
+When a response is over the notes budget, refine shrinks its largest array.
+Keeping the first half would mostly keep the common shape: the rare items
+(null CommitteeId, another StatusId, empty Authors) tend to be the ones dropped.
+Here items are clustered by structural signature instead:
+  - key set, JSON type per key, null and empty-array pattern (one level of
+    nested objects included)
+  - values of enum-ish keys: scalars with few distinct values that repeat
+    across the array (status/type codes, flags)
+and every cluster keeps an exemplar before any cluster gets a second item.
+Kept items stay in their original order, followed by the marker
+
+  {"_truncated": <omitted items>, "_represents": [<items each kept item stands for>, ...]}
+
+so the notes step sees every distinct shape with its frequency (_represents is
+left out when the array has a single shape). Re-sampling an already sampled
+array folds the old marker's counts in.
+"""
+
+from schema_diff import json_type
+
+# A scalar key is enum-ish if it has at most this many distinct values and they repeat.
+ENUM_MAX_DISTINCT = 6
+ENUM_MAX_STR = 40
+
+
+def is_marker(value) -> bool:
+    return isinstance(value, dict) and "_truncated" in value and set(value) <= {"_truncated", "_represents"}
+
+
+def _enumish(v) -> bool:
+    return v is None or isinstance(v, (bool, int)) or (isinstance(v, str) and len(v) <= ENUM_MAX_STR)
+
+
+def enum_keys(items: list) -> frozenset:
+    """Keys of dict items whose scalar values look like codes (few distinct values, repeated)."""
+    values: dict[str, set] = {}
+    bad: set[str] = set()
+    n = 0
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        n += 1
+        for k, v in item.items():
+            if k in bad:
+                continue
+            if not _enumish(v) or isinstance(v, float):
+                bad.add(k)
+                continue
+            seen = values.setdefault(k, set())
+            seen.add(v)
+            if len(seen) > ENUM_MAX_DISTINCT:
+                bad.add(k)
+    return frozenset(k for k, seen in values.items()
+                     if k not in bad and len(seen) > 1 and len(seen) * 2 <= n)
+
+
+def signature(item, enum: frozenset = frozenset(), depth: int = 0):
+    """Hashable structural signature of an array item."""
+    if isinstance(item, dict):
+        parts = []
+        for k in sorted(item):
+            v = item[k]
+            if isinstance(v, list):
+                t = "array" if v else "array:empty"
+            elif isinstance(v, dict) and depth < 1:
+                t = signature(v, frozenset(), depth + 1)
+            else:
+                t = json_type(v)
+            parts.append((k, t, v) if k in enum else (k, t))
+        return tuple(parts)
+    if isinstance(item, list):
+        return "array" if item else "array:empty"
+    return json_type(item)
+
+
+def sample(items: list, target: int) -> list:
+    """About `target` items plus a marker, one exemplar per shape first.
+
+    All shapes are kept even above `target` as long as that still drops an item; only when
+    every item is its own shape do shapes get dropped (in first-seen order).
+    """
+    weights = [1] * len(items)
+    total = len(items)
+    if items and is_marker(items[-1]):
+        marker, items = items[-1], items[:-1]
+        weights = [1] * len(items)
+        represents = marker.get("_represents")
+        if isinstance(represents, list) and len(represents) == len(items):
+            weights = list(represents)
+            total = sum(weights)
+        else:
+            total = len(items) + marker.get("_truncated", 0)
+    if len(items) <= 1:
+        return items + ([_marker(total - len(items), [total] if items else [])] if total > len(items) else [])
+
+    enum = enum_keys(items)
+    clusters: dict[object, list[int]] = {}
+    for i, item in enumerate(items):
+        clusters.setdefault(signature(item, enum), []).append(i)
+    groups = list(clusters.values())
+    if len(groups) < len(items):
+        target = max(target, len(groups))
+    target = min(target, len(items) - 1)
+
+    # Round-robin: every shape's first item, then second items, ...
+    kept: list[int] = []
+    rank = 0
+    while len(kept) < target:
+        for g in groups:
+            if rank < len(g) and len(kept) < target:
+                kept.append(g[rank])
+        rank += 1
+
+    kept.sort()
+    keep = set(kept)
+    represents = {}
+    for g in groups:
+        mine = [i for i in g if i in keep]
+        if not mine:
+            continue
+        omitted = sum(weights[i] for i in g if i not in keep)
+        base, extra = divmod(omitted, len(mine))
+        for j, i in enumerate(mine):
+            represents[i] = weights[i] + base + (1 if j < extra else 0)
+    out = [items[i] for i in kept]
+    # A single shape needs no per-item counts (_truncated says it all).
+    return out + [_marker(total - len(out), [represents[i] for i in kept] if len(groups) > 1 else [])]
+
+
+def _marker(omitted: int, represents: list) -> dict:
+    marker = {"_truncated": omitted}
+    if represents:
+        marker["_represents"] = represents
+    return marker
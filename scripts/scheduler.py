@@ -0,0 +1,104 @@
+"""
+Priority order for refine's pending pairs: expected doc improvement first.
+
+Each pair is scored from cheap local signals (no LLM):
+  - new shape:  first pair of its op with this response shape (key paths + JSON
+                types, arrays collapsed); later pairs of the same shape score 0 here
+  - findings:   schema_diff widenings against the current docs not already credited
+                to an earlier pair of the op (capped); an op doc without a parseable
+                Response Schema counts as NO_SCHEMA_FINDINGS
+  - enums:      new enum values among those findings, same rule (weighted extra)
+  - staleness:  days since the op doc last changed (mtime), saturating at STALE_DAYS
+
+Pairs are then processed in score order across ops, so a run stopped by
+--limit, --max-tokens-budget or --deadline has spent its budget on the pairs
+most likely to change the docs. Ties keep the alphabetical/manifest order.
+"""
+
+import json
+import time
+from pathlib import Path
+
+import jsonio
+import schema_diff
+
+W_NEW_SHAPE = 3.0
+W_FINDING = 1.0
+W_ENUM = 2.0
+W_STALE = 1.0
+MAX_FINDINGS = 10
+NO_SCHEMA_FINDINGS = 5
+STALE_DAYS = 30.0
+
+
+def shape(value, path: str = "$", out: set | None = None, depth: int = 0) -> frozenset:
+    """Set of "path:type" over the value, arrays collapsed to [] (depth-limited)."""
+    if out is None:
+        out = set()
+    out.add(f"{path}:{schema_diff.json_type(value)}")
+    if depth < 8:
+        if isinstance(value, dict):
+            for k, v in value.items():
+                shape(v, f"{path}.{k}", out, depth + 1)
+        elif isinstance(value, list):
+            for v in value[:50]:
+                shape(v, f"{path}[]", out, depth + 1)
+    return frozenset(out)
+
+
+def score_pairs(pairs: list[dict], collected: Path, docs) -> list[tuple[float, dict, dict]]:
+    """[(score, pair, signals)] in input order. `docs` is a docmodel.DocModel."""
+    now = time.time()
+    seen_shapes: dict[str, set] = {}
+    seen_findings: dict[str, set] = {}
+    stale: dict[str, float] = {}
+    out = []
+    for pair in pairs:
+        op = pair["operation"]
+        try:
+            resp = jsonio.read(collected / pair["resp"])
+        except (json.JSONDecodeError, OSError):
+            out.append((0.0, pair, {}))
+            continue
+
+        sig = shape(resp)
+        new_shape = sig not in seen_shapes.setdefault(op, set())
+        seen_shapes[op].add(sig)
+
+        schema = docs.response_schema(op)
+        if isinstance(schema, dict):
+            # Expected gain: a widening is worth something once per op, to the first pair that shows it.
+            seen = seen_findings.setdefault(op, set())
+            n_findings = n_enum = 0
+            for f in schema_diff.diff(resp, schema, docs.defs()):
+                if f["kind"] == "enum":
+                    new = [v for v in f["observed"] if ("enum", f["path"], f["def"], repr(v)) not in seen]
+                    seen.update(("enum", f["path"], f["def"], repr(v)) for v in new)
+                    n_enum += len(new)
+                    n_findings += bool(new)
+                elif (f["kind"], f["path"]) not in seen:
+                    seen.add((f["kind"], f["path"]))
+                    n_findings += 1
+            n_findings, n_enum = min(n_findings, MAX_FINDINGS), min(n_enum, MAX_FINDINGS)
+        else:
+            n_findings, n_enum = NO_SCHEMA_FINDINGS, 0
+
+        if op not in stale:
+            try:
+                age_days = (now - docs.op_path(op).stat().st_mtime) / 86400
+            except OSError:
+                age_days = STALE_DAYS
+            stale[op] = min(max(age_days, 0.0) / STALE_DAYS, 1.0)
+
+        signals = {"new_shape": new_shape, "findings": n_findings, "enum": n_enum, "stale": round(stale[op], 3)}
+        score = (
+            W_NEW_SHAPE * new_shape + W_FINDING * n_findings + W_ENUM * n_enum + W_STALE * stale[op]
+        )
+        out.append((round(score, 3), pair, signals))
+    return out
+
+
+def prioritize(pairs: list[dict], collected: Path, docs) -> list[tuple[float, dict, dict]]:
+    """Pairs by descending score (stable for ties)."""
+    scored = score_pairs(pairs, collected, docs)
+    return sorted(scored, key=lambda x: -x[0])
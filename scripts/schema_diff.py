@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Local schema-widening diff: compare a real response against the op's documented
+Response Schema (and global $defs) without an LLM.
+
+Reports only mechanical widenings, the same kinds the notes prompt asks for:
+  - new_property:  key present in the pair, absent from the schema's properties
+  - nullable:      null observed where the schema does not allow null
+  - type:          a non-null value whose type the schema does not allow
+  - enum:          a value missing from an enum / const (named $def when reached via $ref)
+  - optional:      a required property absent from the pair
+
+refine.py uses the findings as notes (skipping the notes LLM call) or as a hint
+appended to the notes prompt (`local_notes` in config/refine.json).
+
+Run: python scripts/schema_diff.py GetAllSittings/resp_001.json [...]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from doc_patch import find_json_block
+
+ROOT = Path(__file__).parent.parent
+DOCS = ROOT / "docs"
+GLOBAL_MD = DOCS / "global.md"
+OPS_DIR = DOCS / "ops"
+COLLECTED = ROOT / "collected"
+
+_JSON_TYPES = {dict: "object", list: "array", str: "string", bool: "boolean", type(None): "null"}
+# Findings per pair beyond this are summarized in rendered notes.
+MAX_FINDINGS = 40
+# More findings than this means the doc is off in bigger ways: leave the pair to the LLM.
+MECHANICAL_MAX_FINDINGS = 10
+
+
+# --- Docs parsing ---
+
+def section_json(md: str, heading: str):
+    """Parse the ```json block under `heading` (e.g. "### Response Schema"); None if absent/invalid."""
+    block = find_json_block(md, heading)
+    return block[2] if block else None
+
+
+def load_defs(global_md: str) -> dict:
+    defs = section_json(global_md, "## $defs")
+    return defs if isinstance(defs, dict) else {}
+
+
+# --- Diff ---
+
+def json_type(value) -> str:
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "number"
+    return _JSON_TYPES.get(type(value), "string")
+
+
+def _allowed_types(schema: dict) -> set[str] | None:
+    t = schema.get("type")
+    if t is None:
+        return None
+    return set(t) if isinstance(t, list) else {t}
+
+
+def _type_ok(value, allowed: set[str]) -> bool:
+    t = json_type(value)
+    return t in allowed or (t == "integer" and "number" in allowed)
+
+
+def _is_marker(value) -> bool:
+    # refine's array truncation marker (sampling.py); never a real API shape.
+    return isinstance(value, dict) and "_truncated" in value and set(value) <= {"_truncated", "_represents"}
+
+
+class _Diff:
+    def __init__(self, defs: dict):
+        self.defs = defs
+        self.findings: dict[tuple, dict] = {}
+
+    def add(self, kind: str, path: str, def_name: str | None = None, observed=None):
+        f = self.findings.setdefault((kind, path, def_name), {
+            "kind": kind, "path": path, "def": def_name, "observed": [],
+        })
+        if observed is not None and observed not in f["observed"] and len(f["observed"]) < 10:
+            f["observed"].append(observed)
+
+    def resolve(self, schema: dict, def_name: str | None) -> tuple[dict, str | None]:
+        seen = 0
+        while isinstance(schema, dict) and "$ref" in schema and seen < 10:
+            ref = schema["$ref"]
+            if not ref.startswith("#/$defs/"):
+                return {}, def_name
+            def_name = ref.split("/")[-1]
+            schema = self.defs.get(def_name, {})
+            seen += 1
+        return (schema if isinstance(schema, dict) else {}), def_name
+
+    def fits(self, value, schema: dict) -> bool:
+        """True if value needs no widening against schema."""
+        probe = _Diff(self.defs)
+        probe.walk(value, schema, "$", None)
+        return not probe.findings
+
+    def walk(self, value, schema, path: str, def_name: str | None):
+        schema, def_name = self.resolve(schema, def_name)
+        if not schema or _is_marker(value):
+            return
+
+        branches = schema.get("anyOf") or schema.get("oneOf")
+        if branches:
+            if any(self.fits(value, b) for b in branches):
+                return
+            resolved = [self.resolve(b, def_name)[0] for b in branches]
+            if value is None:
+                self.add("nullable", path, def_name)
+                return
+            # Descend into the first branch of the right JSON type; otherwise a type union.
+            for b in resolved:
+                allowed = _allowed_types(b)
+                if allowed is None or _type_ok(value, allowed):
+                    self.walk(value, b, path, def_name)
+                    return
+            self.add("type", path, def_name, json_type(value))
+            return
+
+        allowed = _allowed_types(schema)
+        if allowed is not None and not _type_ok(value, allowed):
+            if value is None:
+                self.add("nullable", path, def_name)
+            else:
+                self.add("type", path, def_name, json_type(value))
+            return
+
+        if "const" in schema and value != schema["const"]:
+            self.add("enum", path, def_name, value)
+        elif "enum" in schema and value not in schema["enum"]:
+            self.add("enum", path, def_name, value)
+
+        if isinstance(value, dict):
+            props = schema.get("properties")
+            if props is None:
+                return
+            for key in schema.get("required", []):
+                if key not in value:
+                    self.add("optional", f"{path}.{key}")
+            for key, sub in value.items():
+                if key in props:
+                    self.walk(sub, props[key], f"{path}.{key}", None)
+                elif schema.get("additionalProperties") is not True:
+                    self.add("new_property", f"{path}.{key}", None, json_type(sub))
+        elif isinstance(value, list):
+            items = schema.get("items")
+            if isinstance(items, dict):
+                for item in value:
+                    self.walk(item, items, f"{path}[]", None)
+
+
+def diff(value, schema: dict, defs: dict) -> list[dict]:
+    """Widening findings for `value` against `schema`: [{"kind", "path", "def", "observed"}]."""
+    d = _Diff(defs)
+    d.walk(value, schema, "$", None)
+    return list(d.findings.values())
+
+
+def diff_pair(resp, op_md: str, global_md: str) -> list[dict] | None:
+    """Findings for a response against the op doc; None if the doc has no parseable Response Schema."""
+    schema = section_json(op_md, "### Response Schema")
+    if not isinstance(schema, dict):
+        return None
+    return diff(resp, schema, load_defs(global_md))
+
+
+def is_mechanical(findings: list[dict] | None) -> bool:
+    """True if the pair's differences can be applied as local notes without a notes LLM call."""
+    return bool(findings) and len(findings) <= MECHANICAL_MAX_FINDINGS
+
+
+# --- Notes ---
+
+def _where(path: str) -> str:
+    return "response root" if path == "$" else f"`{path[1:].lstrip('.')}`"
+
+
+def _values(observed: list) -> str:
+    return ", ".join(json.dumps(v, ensure_ascii=False) for v in observed)
+
+
+def render_notes(findings: list[dict]) -> str:
+    """Findings as a numbered notes list (same shape as LLM notes)."""
+    lines = []
+    for f in findings[:MAX_FINDINGS]:
+        where, obs = _where(f["path"]), f["observed"]
+        if f["kind"] == "new_property":
+            lines.append(f"Response Schema: add optional property {where} (observed type: {_values(obs)}).")
+        elif f["kind"] == "nullable":
+            ref = f" (keep the $ref to {f['def']} as the other branch)" if f["def"] else ""
+            lines.append(f"Response Schema: {where} can be null; allow null with anyOf {{\"type\": \"null\"}}{ref}.")
+        elif f["kind"] == "type":
+            ref = f" (documented via $ref {f['def']})" if f["def"] else ""
+            lines.append(f"Response Schema: {where} observed as {_values(obs)}; widen to a union with the documented type{ref}.")
+        elif f["kind"] == "enum":
+            if f["def"]:
+                lines.append(f"In global $defs {f['def']} add enum value(s) {_values(obs)} (seen at {where}).")
+            else:
+                lines.append(f"Response Schema: {where} observed value(s) {_values(obs)} not in enum/const; widen.")
+        elif f["kind"] == "optional":
+            lines.append(f"Response Schema: {where} is required but absent in this pair; make it optional.")
+    if len(findings) > MAX_FINDINGS:
+        lines.append(f"({len(findings) - MAX_FINDINGS} more widening(s) of the same kinds omitted.)")
+    return "\n".join(f"{i}. {line}" for i, line in enumerate(lines, 1))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Local schema-widening diff of collected responses vs docs.")
+    parser.add_argument("resp", nargs="+", help="Response paths relative to collected/ (e.g. GetAllSittings/resp_001.json)")
+    args = parser.parse_args(argv)
+
+    global_md = GLOBAL_MD.read_text(encoding="utf-8")
+    for rel in args.resp:
+        op = rel.split("/")[0]
+        op_path = OPS_DIR / f"{op}.md"
+        if not op_path.exists():
+            print(f"{rel}: no docs/ops/{op}.md", file=sys.stderr)
+            continue
+        resp = json.loads((COLLECTED / rel).read_text(encoding="utf-8"))
+        findings = diff_pair(resp, op_path.read_text(encoding="utf-8"), global_md)
+        if findings is None:
+            print(f"{rel}: no parseable Response Schema")
+        elif not findings:
+            print(f"{rel}: no widenings")
+        else:
+            print(f"{rel}:\n{render_notes(findings)}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Merged shape summary over many req/resp pairs of one operation.
+
+Streams the pairs (one file in memory at a time) and records per JSON path
+("$.Items[].StatusId", arrays collapsed to []):
+  - observed JSON types and how often the key is present in its parent object
+  - null frequency
+  - distinct values with counts for low-cardinality fields (<= LOW_CARDINALITY),
+    even when each was seen once; only GUIDs and long strings collapse to
+    "all N values distinct"
+  - min/max for numbers (always), array lengths, and date ranges for AspDate strings
+
+refine.py --aggregate sends the rendered summary (requests and responses) plus a
+few exemplar responses of distinct shapes to one notes call per operation,
+instead of one notes call per pair.
+
+Run: python scripts/shape_summary.py GetAllSittings [--exemplars 3]
+"""
+
+import argparse
+import json
+import re
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import jsonio
+from scheduler import shape
+from schema_diff import json_type
+
+ROOT = Path(__file__).parent.parent
+COLLECTED = ROOT / "collected"
+
+LOW_CARDINALITY = 12
+MAX_VALUE_CHARS = 60
+MAX_PATHS = 200
+MAX_DEPTH = 12
+
+ID_LIKE_CHARS = 24  # distinct strings at least this long read as IDs, not enum values
+
+_ASPDATE_RE = re.compile(r"^/Date\((-?\d+)(?:[+-]\d{4})?\)/$")
+_GUID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+
+class _PathStat:
+    __slots__ = ("count", "types", "nulls", "values", "lo", "hi", "dates", "lengths")
+
+    def __init__(self):
+        self.count = 0
+        self.types: dict[str, int] = {}
+        self.nulls = 0
+        self.values: dict | None = {}  # None once past LOW_CARDINALITY
+        self.lo = self.hi = None
+        self.dates: list[int] | None = None  # [min_ms, max_ms]
+        self.lengths: list[int] | None = None  # array [min, max]
+
+    def add(self, value):
+        self.count += 1
+        t = json_type(value)
+        self.types[t] = self.types.get(t, 0) + 1
+        if value is None:
+            self.nulls += 1
+            return
+        if isinstance(value, list):
+            n = len(value)
+            self.lengths = [min(self.lengths[0], n), max(self.lengths[1], n)] if self.lengths else [n, n]
+            return
+        if isinstance(value, dict):
+            return
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.lo = value if self.lo is None else min(self.lo, value)
+            self.hi = value if self.hi is None else max(self.hi, value)
+        if isinstance(value, str):
+            m = _ASPDATE_RE.match(value)
+            if m:
+                ms = int(m.group(1))
+                self.dates = [min(self.dates[0], ms), max(self.dates[1], ms)] if self.dates else [ms, ms]
+                return
+            if len(value) > MAX_VALUE_CHARS:
+                self.values = None
+        if self.values is not None:
+            self.values[value] = self.values.get(value, 0) + 1
+            if len(self.values) > LOW_CARDINALITY:
+                self.values = None
+
+
+class Summary:
+    """Per-path statistics over many JSON documents."""
+
+    def __init__(self):
+        self.docs = 0
+        self.paths: dict[str, _PathStat] = {}
+        self.objects: dict[str, int] = {}  # dicts seen per path (presence denominator)
+
+    def add(self, value):
+        self.docs += 1
+        self._walk(value, "$", 0)
+
+    def _walk(self, value, path: str, depth: int):
+        stat = self.paths.get(path)
+        if stat is None:
+            stat = self.paths[path] = _PathStat()
+        stat.add(value)
+        if depth >= MAX_DEPTH:
+            return
+        if isinstance(value, dict):
+            self.objects[path] = self.objects.get(path, 0) + 1
+            for k, v in value.items():
+                self._walk(v, f"{path}.{k}", depth + 1)
+        elif isinstance(value, list):
+            for v in value:
+                self._walk(v, f"{path}[]", depth + 1)
+
+    def _presence(self, path: str, stat: _PathStat) -> str:
+        if path.endswith("[]") or "." not in path:
+            return ""
+        total = self.objects.get(path.rsplit(".", 1)[0])
+        if not total or stat.count >= total:
+            return ""
+        return f", present {100 * stat.count / total:.0f}%"
+
+    def render(self, max_paths: int = MAX_PATHS) -> str:
+        lines = []
+        for path, stat in list(self.paths.items())[:max_paths]:
+            types = "|".join(sorted(stat.types))
+            parts = [f"{path}: {types}{self._presence(path, stat)}"]
+            if stat.nulls and len(stat.types) > 1:
+                parts.append(f"null {100 * stat.nulls / stat.count:.0f}%")
+            if stat.lengths:
+                parts.append(f"len {stat.lengths[0]}..{stat.lengths[1]}")
+            if stat.dates:
+                lo, hi = (_fmt_date(ms) for ms in stat.dates)
+                parts.append(f"AspDate {lo}..{hi}")
+            elif stat.values and _id_like(stat.values) and len(stat.values) == stat.count - stat.nulls \
+                    and stat.count > 2:
+                parts.append(f"all {len(stat.values)} values distinct")
+            elif stat.values and not stat.lengths and "object" not in stat.types:
+                vals = sorted(stat.values.items(), key=lambda kv: -kv[1])
+                parts.append("values " + ", ".join(
+                    f"{json.dumps(v, ensure_ascii=False)}×{n}" for v, n in vals
+                ))
+            elif stat.values is None and "string" in stat.types:
+                parts.append(f"distinct > {LOW_CARDINALITY}")
+            if stat.lo is not None:
+                parts.append(f"range {stat.lo}..{stat.hi}")
+            lines.append(", ".join(parts))
+        if len(self.paths) > max_paths:
+            lines.append(f"({len(self.paths) - max_paths} more paths omitted)")
+        return "\n".join(lines)
+
+
+def _id_like(values: dict) -> bool:
+    """GUIDs or long strings: listing them says nothing about an enum."""
+    return all(isinstance(v, str) and (len(v) >= ID_LIKE_CHARS or _GUID_RE.match(v)) for v in values)
+
+
+def _fmt_date(ms: int) -> str:
+    try:
+        return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+    except (OverflowError, OSError, ValueError):
+        return str(ms)
+
+
+def summarize(pairs: list[dict], collected: Path, exemplars: int = 3) -> tuple[Summary, Summary, list[dict]]:
+    """(request summary, response summary, exemplar pairs of distinct response shapes)."""
+    req_sum, resp_sum = Summary(), Summary()
+    seen: set = set()
+    picked: list[dict] = []
+    for pair in pairs:
+        try:
+            req = jsonio.read(collected / pair["req"])
+            resp = jsonio.read(collected / pair["resp"])
+        except (OSError, json.JSONDecodeError):
+            continue
+        req_sum.add(req)
+        resp_sum.add(resp)
+        if len(picked) < exemplars:
+            sig = shape(resp)
+            if sig not in seen:
+                seen.add(sig)
+                picked.append(pair)
+    return req_sum, resp_sum, picked
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Merged shape summary of an operation's collected pairs.")
+    parser.add_argument("operation", help="Operation name (directory under collected/)")
+    parser.add_argument("--exemplars", type=int, default=3, help="Exemplar responses to list")
+    args = parser.parse_args(argv)
+
+    op_dir = COLLECTED / args.operation
+    pairs = [
+        {"req": f"{args.operation}/{p.name.replace('resp_', 'req_')}", "resp": f"{args.operation}/{p.name}"}
+        for p in sorted(op_dir.glob("resp_*.json"))
+    ]
+    if not pairs:
+        print(f"No pairs in {op_dir}", file=sys.stderr)
+        return 1
+    req_sum, resp_sum, picked = summarize(pairs, COLLECTED, args.exemplars)
+    print(f"## Requests ({req_sum.docs})\n{req_sum.render()}\n")
+    print(f"## Responses ({resp_sum.docs})\n{resp_sum.render()}\n")
+    print("## Exemplars\n" + "\n".join(p["resp"] for p in picked))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
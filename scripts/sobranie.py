@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the day-to-day commands.
+
+Only the chosen subcommand's module is imported, so `--help`, `cache stats`
+and `report` start in well under a second (bench.py --scenario startup
+measures this). collect and refine take exactly the arguments of
+scripts/collect.py and scripts/refine.py.
+
+  collect ...            collect.py
+  refine ...             refine.py (e.g. refine --dry-run)
+  build [api|client]     build_api_md.py / build_client.py (default: api)
+  cache stats            entries and size of .api_cache/ and .llm_cache/
+  cache clear [--api] [--llm]
+  report                 pairs and errors per operation, latest refine runs
+
+Run: python scripts/sobranie.py <command> [args]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+COLLECTED = ROOT / "collected"
+ERRORS = ROOT / "errors"
+REFINE_LOGS = ROOT / "logs" / "refine"
+# Same directories as cache.CACHE_DIR and refine.LLM_CACHE_DIR, without importing them.
+CACHES = {"api": ROOT / ".api_cache", "llm": ROOT / ".llm_cache"}
+
+COMMANDS = ("collect", "refine", "build", "cache", "report")
+
+
+def _dir_stats(path: Path) -> tuple[int, int]:
+    """(files, bytes) under path and its subdirectories (.api_cache/blobs/), without reading them."""
+    files = size = 0
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_file():
+                    files += 1
+                    size += entry.stat().st_size
+                elif entry.is_dir():
+                    sub_files, sub_size = _dir_stats(Path(entry.path))
+                    files += sub_files
+                    size += sub_size
+    except FileNotFoundError:
+        pass
+    return files, size
+
+
+def _count(path: Path, pattern: str) -> int:
+    return sum(1 for _ in path.glob(pattern)) if path.is_dir() else 0
+
+
+# --- Commands ---
+
+def cmd_build(argv: list[str]) -> int:
+    target = argv[0] if argv and not argv[0].startswith("-") else "api"
+    rest = argv[1:] if argv and argv[0] == target else argv
+    if target == "api":
+        import build_api_md
+
+        return build_api_md.build()
+    if target == "client":
+        import build_client
+
+        return build_client.main(rest)
+    print(f"Unknown build target: {target} (api, client)", file=sys.stderr)
+    return 2
+
+
+def cmd_cache(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="sobranie.py cache", description="Inspect or clear the response caches.")
+    parser.add_argument("action", choices=("stats", "clear"))
+    parser.add_argument("--api", action="store_true", help="clear: only the API response cache")
+    parser.add_argument("--llm", action="store_true", help="clear: only the LLM cache")
+    args = parser.parse_args(argv)
+    if args.action == "stats":
+        for name, path in CACHES.items():
+            files, size = _dir_stats(path)
+            print(f"{name:4} {files:7} entries  {size / 1e6:9.1f} MB  {path.relative_to(ROOT)}/")
+        return 0
+    chosen = [n for n in CACHES if getattr(args, n)] or list(CACHES)
+    for name in chosen:
+        files, _ = _dir_stats(CACHES[name])
+        shutil.rmtree(CACHES[name], ignore_errors=True)
+        print(f"Cleared {name} cache ({files} entries)")
+    return 0
+
+
+def cmd_report(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="sobranie.py report", description="Corpus and refine progress at a glance.")
+    parser.add_argument("--runs", type=int, default=5, help="Latest refine runs to list")
+    args = parser.parse_args(argv)
+
+    ops = sorted({p.name for d in (COLLECTED, ERRORS) if d.is_dir() for p in d.iterdir() if p.is_dir()}
+                 - {"journal", ".incoming"})
+    total_pairs = total_errors = 0
+    print(f"{'Operation':45} {'pairs':>7} {'errors':>7}")
+    for op in ops:
+        pairs, errors = _count(COLLECTED / op, "resp_*.json"), _count(ERRORS / op, "err_*.json")
+        total_pairs += pairs
+        total_errors += errors
+        print(f"{op:45} {pairs:7} {errors:7}")
+    print(f"{'total':45} {total_pairs:7} {total_errors:7}")
+
+    runs = sorted((p for p in REFINE_LOGS.iterdir() if (p / "state.json").exists()), reverse=True) \
+        if REFINE_LOGS.is_dir() else []
+    if runs:
+        print("\nRefine runs:")
+    for run in runs[:args.runs]:
+        try:
+            state = json.loads((run / "state.json").read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            continue
+        requeued = len(state.get("requeued") or {})
+        print(f"  {run.name}: {len(state.get('processed', []))} processed"
+              + (f", {requeued} requeued" if requeued else ""))
+    return 0
+
+
+def main(argv=None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(__doc__.strip())
+        return 0
+    if argv[0] not in COMMANDS:
+        print(f"Unknown command: {argv[0]} ({', '.join(COMMANDS)})", file=sys.stderr)
+        return 2
+    command, rest = argv[0], argv[1:]
+    if command == "collect":
+        import collect
+
+        return collect.main(rest)
+    if command == "refine":
+        import refine
+
+        return refine.main(rest)
+    if command == "build":
+        return cmd_build(rest)
+    if command == "cache":
+        return cmd_cache(rest)
+    return cmd_report(rest)
+
+
+if __name__ == "__main__":
+    exit(main())